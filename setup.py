@@ -43,6 +43,7 @@ setup(
         "datacatalog.handlers": ["*.yml"],
         "datacatalog.plugins": ["*.yml"],
         "datacatalog.plugins.postgres": ["*.yml"],
+        "datacatalog.plugins.postgres.migrations": ["*.sql"],
         "datacatalog.plugins.swift": ["*.yml"],
     },
     # ┏━━━━━━━━━━━━━━┓
@@ -83,6 +84,7 @@ setup(
             "sphinx-rtd-theme==0.4.3",
         ],
         "dev": ["aiohttp-devtools==0.13.1"],
+        "fast-json": ["orjson==3.8.3"],  # fast jsonb codec for postgres plugin
         "test": [
             "mockito==1.2.1",
             "pytest==5.4.2",
@@ -1,7 +1,9 @@
 import asyncio
 import importlib
+import json
 import urllib.parse
 import logging
+import typing as T
 
 from aiohttp import web
 import aiohttp_cors
@@ -43,6 +45,13 @@ class Application(web.Application):
 
         self._pool = None
 
+        # Called with every change to the datasets, see subscribe().
+        self._subscribers = [lambda change: clear_open_api_cache()]
+        self._last_change_number = None
+
+        # Runs the startup actions in the background, see _on_startup().
+        self._startup_actions_task = None
+
         # set app properties
         path = urllib.parse.urlparse(self._config['web']['baseurl']).path
         if len(path) == 0 or path[-1] != '/':
@@ -53,17 +62,23 @@ class Application(web.Application):
         # set routes
         self.router.add_get(path + 'datasets', handlers.datasets.get_collection)
         self.router.add_post(path + 'datasets', handlers.datasets.post_collection)
+        self.router.add_post(path + 'datasets/_bulk', handlers.datasets.post_bulk)
+        self.router.add_post(path + 'datasets/_batch', handlers.datasets.post_batch)
 
         self.router.add_get(path + 'datasets/{dataset}', handlers.datasets.get)
         self.router.add_put(path + 'datasets/{dataset}', handlers.datasets.put)
+        self.router.add_patch(path + 'datasets/{dataset}', handlers.datasets.patch)
         self.router.add_delete(path + 'datasets/{dataset}', handlers.datasets.delete)
         self.router.add_get(path + 'datasets/{dataset}/purls/{distribution}', handlers.datasets.link_redirect)
 
         self.router.add_get(path + 'harvest', handlers.harvest.get_collection)
+        self.router.add_get(path + 'changes', handlers.changes.get_collection)
 
         self.router.add_get(path + 'openapi', handlers.openapi.get)
 
         self.router.add_get(path + 'system/health', handlers.systemhealth.get)
+        self.router.add_get(path + 'system/stats', handlers.systemstats.get)
+        self.router.add_get(path + 'system/startup', handlers.systemstartup.get)
 
         # Load and initialize plugins:
         self._pm = aiopluggy.PluginManager('datacatalog')
@@ -119,11 +134,57 @@ class Application(web.Application):
                 "There are no implementations for the following required hooks: %s" % missing
             )
 
-    @staticmethod
-    def notify_callback(conn, pid, channel, payload):
+    def subscribe(self, callback: T.Callable[[T.Optional[dict]], None]) -> None:
+        # language=rst
+        """Call ``callback`` with every change to the datasets, made by any
+        instance of the catalog.
+
+        A change is a dict with the ``operation`` (``create``, ``update`` or
+        ``delete``), the ``id`` of the dataset, its ``old_etag`` and
+        ``new_etag`` (None if not applicable or unknown), and the
+        ``change_number``, which increases by one with every change.
+
+        If changes may have been missed, e.g. because the connection with the
+        database was lost or because there's a gap in the change numbers, the
+        callback is called with None, so that caches can drop everything.
+
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: T.Callable[[T.Optional[dict]], None]) -> None:
+        self._subscribers.remove(callback)
+
+    def notify_callback(self, conn, pid, channel, payload):
         logger.debug(f'Notification from {pid} on channel {channel} : {payload}')
-        if channel == 'channel' and payload == 'data_changed':
-            clear_open_api_cache()
+        if channel != 'channel':
+            return
+        try:
+            change = json.loads(payload)
+            change_number = change['change_number']
+        except (ValueError, TypeError, KeyError):
+            # e.g. 'data_changed' from an instance running an older version
+            self.changes_missed()
+            return
+        last_change_number = self._last_change_number
+        if last_change_number is not None and change_number > last_change_number + 1:
+            # Notifications of concurrent changes may arrive out of order, in
+            # which case we drop everything needlessly, but safely.
+            self._publish(None)
+        if last_change_number is None or change_number > last_change_number:
+            self._last_change_number = change_number
+        self._publish(change)
+
+    def changes_missed(self) -> None:
+        """Tell all subscribers that changes may have been missed."""
+        self._last_change_number = None
+        self._publish(None)
+
+    def _publish(self, change: T.Optional[dict]) -> None:
+        for callback in self._subscribers:
+            try:
+                callback(change)
+            except Exception:
+                logger.exception('Subscriber %r failed', callback)
 
 
 class NotificationHandler:
@@ -147,12 +208,12 @@ class NotificationHandler:
         # log if is_closed is changed
         if self.previous_is_closed is not None and self.previous_is_closed != is_closed:
             logger.warning(f'Database connection changed from {self.previous_is_closed} to {is_closed}')
-            if not is_closed:  # If changed back to False clear cache to if notification is missed
-                clear_open_api_cache()
+            if not is_closed:  # If changed back to False clear caches as notifications may be missed
+                self.app.changes_missed()
         self.previous_is_closed = is_closed
 
         if is_closed:
-            asyncio.create_task(self.listen_notifications_assign())
+            asyncio.create_task(self._listen_notifications_assign())
 
         self.loop_counter += 1
         loop.call_later(self.DB_CONNECTION_CHECK_PERIOD, self._callback, self.loop_counter, loop)
@@ -172,12 +233,22 @@ async def _on_startup(app):
     for r in results:
         if r.exception is not None:
             raise r.exception
-    await startup_actions.run_startup_actions(app)
     if app.config['storage_postgres'].get("mode", '') != "READONLY":
         await NotificationHandler(app).setup_notification_handling()
+        # Don't keep the server from accepting requests while the actions
+        # rewrite all datasets; see /system/startup for their progress.
+        app._startup_actions_task = asyncio.ensure_future(
+            startup_actions.run_startup_actions(app)
+        )
 
 
 async def _on_cleanup(app):
+    if app._startup_actions_task is not None:
+        app._startup_actions_task.cancel()
+        try:
+            await app._startup_actions_task
+        except asyncio.CancelledError:
+            pass
     await app.hooks.deinitialize(app=app)
 
 
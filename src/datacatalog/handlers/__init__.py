@@ -1 +1 @@
-from . import datasets, harvest, openapi, systemhealth
+from . import changes, datasets, harvest, openapi, streaming, systemhealth, systemstartup, systemstats
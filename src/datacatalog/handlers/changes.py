@@ -0,0 +1,95 @@
+import json
+import urllib.parse
+
+from aiohttp import web
+
+from aiohttp_extras.content_negotiation import produces_content_types
+
+from . import streaming
+
+# Datasets with other statuses are only visible with extra read access, and
+# are reported as deleted to others.
+_PUBLIC_STATUSES = ('beschikbaar', 'in_onderzoek')
+
+
+@produces_content_types('application/ld+json', 'application/json')
+async def get_collection(request: web.Request) -> web.StreamResponse:
+    # language=rst
+    """Handler for ``/changes``.
+
+    Streams the datasets created, updated or deleted since sequence number
+    ``since`` (and dataset ``since_id``, if given), in order, and the URL to
+    get the changes after those under ``ams:next``.
+
+    """
+    hooks = request.app.hooks
+    scopes = request.authz_scopes if hasattr(request, "authz_scopes") else {}
+    extra_read_access = 'CAT/R' in scopes
+
+    since = request.query.get('since', '0')
+    since_id = request.query.get('since_id', None)
+    limit = request.query.get('limit', None)
+    try:
+        since = int(since)
+        if since < 0:
+            raise ValueError()
+    except ValueError:
+        raise web.HTTPBadRequest(
+            text="Invalid since value %s" % since
+        )
+    if since_id is not None and 'since' not in request.query:
+        raise web.HTTPBadRequest(
+            text="since_id requires since"
+        )
+    if limit is not None:
+        try:
+            limit = int(limit)
+            if limit < 0:
+                raise ValueError()
+        except ValueError:
+            raise web.HTTPBadRequest(
+                text="Invalid limit value %s" % limit
+            )
+
+    change_iterator = await hooks.storage_changes(
+        app=request.app, since=since, limit=limit, since_id=since_id
+    )
+
+    ctx = await hooks.mds_context()
+    ctx_json = json.dumps(ctx)
+
+    response = web.StreamResponse()
+    response.content_type = request['best_content_type']
+    response.enable_compression()
+    await response.prepare(request)
+    async with streaming.Stream(request, response, change_iterator) as stream:
+        await stream.write(b'{"@context":')
+        await stream.write(ctx_json.encode())
+        await stream.write(b',"ams:changes":[')
+
+        separator = b''
+        async for seq, docid, doc, etag in change_iterator:
+            since, since_id = seq, docid
+            change = {'seq': seq, 'id': docid}
+            if doc is None or not (extra_read_access or doc.get('ams:status') in _PUBLIC_STATUSES):
+                change['operation'] = 'delete'
+            else:
+                canonical_doc = await hooks.mds_canonicalize(app=request.app, data=doc)
+                canonical_doc = await hooks.mds_after_storage(app=request.app, data=canonical_doc, doc_id=docid)
+                del canonical_doc['@context']
+                change.update(operation='upsert', etag=etag, dataset=canonical_doc)
+            await stream.write(separator + json.dumps(change).encode())
+            separator = b','
+
+        next_query = {key: value for key, value in request.query.items()
+                      if key not in ('since', 'since_id')}
+        next_query['since'] = since
+        if since_id is not None:
+            next_query['since_id'] = since_id
+        await stream.write(b'],"ams:next":')
+        await stream.write(json.dumps(
+            request.app.config['web']['baseurl'] + 'changes?' + urllib.parse.urlencode(next_query)
+        ).encode())
+        await stream.write(b'}')
+        await response.write_eof()
+    return response
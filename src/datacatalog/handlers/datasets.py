@@ -1,14 +1,19 @@
+import asyncio
 import csv
 import json.decoder
 import logging
 import re
 import typing as T
+import urllib.parse
 
 from aiohttp import web
 
 from aiohttp_extras import conditional
 from aiohttp_extras.content_negotiation import produces_content_types
 
+from .. import json_patch
+from . import streaming
+
 
 _logger = logging.getLogger(__name__)
 
@@ -19,6 +24,31 @@ _FACET_QUERY_VALUE = re.compile(
     r'(in|eq|gt|lt|ge|le)=(.+)', flags=re.S
 )
 
+# Version of the read representation of datasets stored by
+# storage_store_rendered(). Increase this whenever the representation changes,
+# e.g. when mds_canonicalize() or mds_after_storage() change, so the stored
+# representations are ignored. Datasets are rendered on every read until they
+# are written again.
+_RENDER_VERSION = '1'
+
+# Only representations of datasets with these statuses, which are visible
+# without extra read access, are stored.
+_PUBLIC_STATUSES = ('beschikbaar', 'in_onderzoek')
+
+# The properties of datasets and distributions in the summaries shown in
+# listings. ams:status is only shown with extra read access.
+_SUMMARY_KEEPERS = {'@id', 'dct:identifier', 'dct:title', 'dct:description',
+                    'dcat:keyword', 'foaf:isPrimaryTopicOf', 'dcat:distribution',
+                    'dcat:theme', 'ams:owner', 'ams:sort_modified', 'ams:status'}
+_SUMMARY_DISTRIBUTION_KEEPERS = {'dcat:mediaType', 'ams:resourceType', 'ams:distributionType',
+                                 'ams:serviceType', 'dc:identifier'}
+
+# Number of datasets stored per transaction by import_datasets().
+_IMPORT_BATCH_SIZE = 500
+
+# Maximum number of datasets updated by a single request to post_batch().
+_BATCH_MAX_SIZE = 1000
+
 
 @produces_content_types('application/ld+json', 'application/json')
 async def get(request: web.Request):
@@ -32,24 +62,38 @@ async def get(request: web.Request):
             body='Endpoint does not support * in the If-None-Match header.'
         )
     # Now we know etag_if_none_match is either None or a set.
+    version = _render_version(request.app)
     try:
-        doc, etag = await hooks.storage_retrieve(
-            app=request.app, docid=docid, etags=etag_if_none_match
+        rendered, etag = await hooks.storage_retrieve_rendered(
+            app=request.app, docid=docid, version=version,
+            etags=etag_if_none_match
         )
     except KeyError:
         raise web.HTTPNotFound()
-    if doc is None:
+    if etag_if_none_match and conditional.match_etags(etag, etag_if_none_match, True):
         return web.Response(status=304, headers={'Etag': etag})
-    canonical_doc = await hooks.mds_canonicalize(app=request.app, data=doc)
-    canonical_doc = await hooks.mds_after_storage(app=request.app, data=canonical_doc, doc_id=docid)
-
-    if canonical_doc['ams:status'] not in ('beschikbaar', 'in_onderzoek'):
-        scopes = request.authz_scopes if hasattr(request, "authz_scopes") else {}
-        extra_read_access = 'CAT/R' in scopes
-        if not extra_read_access:
-            return web.HTTPForbidden()
 
-    return web.json_response(canonical_doc, headers={
+    if rendered is None:
+        # Not rendered yet, or not public. The rendered representation is
+        # only stored when the dataset is written, so that GET also works on
+        # a read-only instance.
+        try:
+            doc, etag = await hooks.storage_retrieve(
+                app=request.app, docid=docid, etags=etag_if_none_match
+            )
+        except KeyError:
+            raise web.HTTPNotFound()
+        if doc is None:
+            return web.Response(status=304, headers={'Etag': etag})
+        status, rendered = await _render(request.app, docid, doc)
+
+        if status not in _PUBLIC_STATUSES:
+            scopes = request.authz_scopes if hasattr(request, "authz_scopes") else {}
+            extra_read_access = 'CAT/R' in scopes
+            if not extra_read_access:
+                return web.HTTPForbidden()
+
+    return web.Response(body=rendered, content_type='application/json', charset='utf-8', headers={
         'Etag': etag, 'content_type': 'application/ld+json'
     })
 
@@ -65,11 +109,9 @@ async def put(request: web.Request):
         doc = await request.json()
     except json.decoder.JSONDecodeError:
         raise web.HTTPBadRequest(text='invalid json')
-    doc['ams:modifiedby'] = request.authz_subject
-    canonical_doc = await hooks.mds_canonicalize(app=request.app, data=doc)
-
-    if is_redact_only and canonical_doc['ams:status'] == 'beschikbaar':
-        raise web.HTTPForbidden()
+    canonical_doc = await _canonicalize_new(
+        request.app, doc, request.authz_subject, is_redact_only
+    )
 
     # Make sure the docid in the path corresponds to the ids given in the
     # document, if any. The assumption is that request.path (which corresponds
@@ -104,25 +146,29 @@ async def put(request: web.Request):
                      'or more Etags.'
             )
         try:
-            old_doc, _etag = await hooks.storage_retrieve(
-                app=request.app, docid=doc_id, etags=None
+            old_doc, old_etag = await hooks.storage_retrieve(
+                app=request.app, docid=doc_id, etags=None, primary=True
             )
         except KeyError:
             _logger.exception('precondition failed')
             raise web.HTTPPreconditionFailed()
+        if not conditional.match_etags(old_etag, etag_if_match, False):
+            raise web.HTTPPreconditionFailed()
         canonical_doc = await hooks.mds_before_storage(
             app=request.app, data=canonical_doc, old_data=old_doc
         )
+        # Only store it over the version that mds_before_storage() has seen.
         try:
             new_etag = await hooks.storage_update(
                 app=request.app, docid=doc_id, doc=canonical_doc,
-                searchable_text=searchable_text, etags=etag_if_match,
+                searchable_text=searchable_text, etags={old_etag},
                 iso_639_1_code="nl"
             )
-        except ValueError:
+        except (KeyError, ValueError):
             _logger.exception('precondition failed')
             raise web.HTTPPreconditionFailed()
-        await notify_data_changed(request.app)
+        await notify_data_changed(request.app, [('update', doc_id, old_etag, new_etag)])
+        await _store_rendered(request.app, doc_id, canonical_doc, new_etag)
         retval = web.Response(status=204, headers={'Etag': new_etag})
 
     else:
@@ -142,7 +188,8 @@ async def put(request: web.Request):
         except KeyError:
             _logger.exception('precondition failed')
             raise web.HTTPPreconditionFailed()
-        await notify_data_changed(request.app)
+        await notify_data_changed(request.app, [('create', doc_id, None, new_etag)])
+        await _store_rendered(request.app, doc_id, canonical_doc, new_etag)
         retval = web.Response(
             status=201, headers={'Etag': new_etag}, content_type='text/plain'
         )
@@ -150,6 +197,88 @@ async def put(request: web.Request):
     return retval
 
 
+async def patch(request: web.Request):
+    # language=rst
+    """Apply a JSON Patch (:rfc:`6902`) to a dataset.
+
+    The patch applies to the representation that :func:`get` returns. Like
+    an update with :func:`put`, but only the full-text search representation
+    of the properties that are changed is computed again.
+
+    """
+    hooks = request.app.hooks
+    scopes = request.authz_scopes
+
+    is_redact_only = 'CAT/W' not in scopes
+
+    doc_id = request.match_info['dataset']
+    etag_if_match = conditional.parse_if_header(request, conditional.HEADER_IF_MATCH)
+    if etag_if_match is None or etag_if_match == '*':
+        raise web.HTTPBadRequest(
+            text='Must provide a If-Match header containing one or more ETags.'
+        )
+    try:
+        patch_doc = await request.json()
+    except json.decoder.JSONDecodeError:
+        raise web.HTTPBadRequest(text='invalid json')
+
+    try:
+        old_doc, old_etag = await hooks.storage_retrieve(
+            app=request.app, docid=doc_id, etags=None, primary=True
+        )
+    except KeyError:
+        raise web.HTTPNotFound()
+    if not conditional.match_etags(old_etag, etag_if_match, False):
+        raise web.HTTPPreconditionFailed()
+
+    canonical_old_doc = await hooks.mds_canonicalize(app=request.app, data=old_doc)
+    visible_doc = await hooks.mds_after_storage(
+        app=request.app, data=canonical_old_doc, doc_id=doc_id
+    )
+    try:
+        # Only copies the objects and arrays that the patch changes.
+        patched_doc = json_patch.apply(visible_doc, patch_doc)
+    except json_patch.PatchConflict as e:
+        raise web.HTTPConflict(text=str(e))
+    except json_patch.PatchError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    if not isinstance(patched_doc, dict):
+        raise web.HTTPUnprocessableEntity(text='The patched dataset is not an object')
+    # Properties that only the representation adds, e.g. placeholders of
+    # missing required values, aren't stored unless the patch changes them.
+    # This makes a new top-level object, the only one that
+    # _canonicalize_new() changes.
+    added = visible_doc.keys() - canonical_old_doc.keys()
+    doc = {key: value for key, value in patched_doc.items()
+           if key not in added or value != visible_doc[key]}
+    try:
+        canonical_doc = await _canonicalize_new(
+            request.app, doc, request.authz_subject, is_redact_only
+        )
+    except (TypeError, ValueError) as e:
+        raise web.HTTPUnprocessableEntity(text=str(e))
+    new_doc = await hooks.mds_before_storage(
+        app=request.app, data=canonical_doc, old_data=old_doc
+    )
+    changed = {key for key in old_doc.keys() | new_doc.keys()
+               if old_doc.get(key) != new_doc.get(key)}
+    searchable_text = await hooks.mds_full_text_search_representation(
+        data=canonical_doc, properties=changed
+    )
+    try:
+        new_etag = await hooks.storage_update(
+            app=request.app, docid=doc_id, doc=new_doc,
+            searchable_text=searchable_text, etags={old_etag},
+            iso_639_1_code="nl"
+        )
+    except (KeyError, ValueError):
+        # changed or deleted since we retrieved it
+        raise web.HTTPPreconditionFailed()
+    await notify_data_changed(request.app, [('update', doc_id, old_etag, new_etag)])
+    await _store_rendered(request.app, doc_id, new_doc, new_etag)
+    return web.Response(status=204, headers={'Etag': new_etag})
+
+
 async def delete(request: web.Request):
     given_id = request.match_info['dataset']
     etag_if_match = conditional.parse_if_header(request, conditional.HEADER_IF_MATCH)
@@ -158,11 +287,13 @@ async def delete(request: web.Request):
             text='Must provide a If-Match header containing one or more ETags.'
         )
     try:
-        await request.app.hooks.storage_delete(
+        old_etag = await request.app.hooks.storage_delete(
             app=request.app, docid=given_id, etags=etag_if_match)
     except KeyError:
         raise web.HTTPNotFound()
-    await notify_data_changed(request.app)
+    except ValueError:
+        raise web.HTTPPreconditionFailed()
+    await notify_data_changed(request.app, [('delete', given_id, old_etag, None)])
     return web.Response(status=204, content_type='text/plain')
 
 
@@ -216,6 +347,8 @@ async def get_collection(request: web.Request) -> web.StreamResponse:
     if limit is not None:
         try:
             limit = int(limit)
+            if limit < 0:
+                raise ValueError()
         except ValueError:
             raise web.HTTPBadRequest(
                 text="Invalid limit value %s" % limit
@@ -224,10 +357,27 @@ async def get_collection(request: web.Request) -> web.StreamResponse:
     if offset is not None:
         try:
             offset = int(offset)
+            if offset < 0:
+                raise ValueError()
         except ValueError:
             raise web.HTTPBadRequest(
                 text="Invalid offset value %s" % offset
             )
+    cursor = query.get('cursor', None)
+    if cursor is not None and offset != 0:
+        raise web.HTTPBadRequest(
+            text="Query parameters cursor and offset can't be combined"
+        )
+    max_candidates = query.get('max_candidates', None)
+    if max_candidates is not None:
+        try:
+            max_candidates = int(max_candidates)
+            if max_candidates < 1:
+                raise ValueError()
+        except ValueError:
+            raise web.HTTPBadRequest(
+                text="Invalid max_candidates value %s" % max_candidates
+            )
 
     result_info = {}
     facets = [
@@ -248,8 +398,21 @@ async def get_collection(request: web.Request) -> web.StreamResponse:
         result_info=result_info,
         facets=facets,
         limit=limit, offset=offset,
-        filters=filters, iso_639_1_code='nl'
+        filters=filters, iso_639_1_code='nl',
+        cursor=cursor, max_candidates=max_candidates,
+        summary_version=_render_version(request.app)
     )
+    # Invalid parameters are reported when the first result is fetched, which
+    # must happen before we start responding.
+    try:
+        first_result = await resultiterator.__anext__()
+    except StopAsyncIteration:
+        first_result = None
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    except asyncio.TimeoutError:
+        streaming.aborted['statement_timeout'] += 1
+        raise web.HTTPServiceUnavailable(text="Search took too long")
 
     ctx = await hooks.mds_context()
     ctx_json = json.dumps(ctx)
@@ -259,41 +422,39 @@ async def get_collection(request: web.Request) -> web.StreamResponse:
     response.enable_compression()
     first = True
     await response.prepare(request)
-    await response.write(b'{"@context":')
-    await response.write(ctx_json.encode())
-    await response.write(b',"dcat:dataset":[')
-
-    async for docid, doc in resultiterator:
-        canonical_doc = await hooks.mds_canonicalize(app=request.app, data=doc)
-        canonical_doc = await hooks.mds_after_storage(app=request.app, data=canonical_doc, doc_id=docid)
-        keepers = {'@id', 'dct:identifier', 'dct:title', 'dct:description',
-                   'dcat:keyword', 'foaf:isPrimaryTopicOf', 'dcat:distribution',
-                   'dcat:theme', 'ams:owner', 'ams:sort_modified'}
-        if extra_read_access:
-            keepers.add('ams:status')
-        for key in list(canonical_doc.keys()):
-            if key not in keepers:
-                del canonical_doc[key]
-        keepers = {'dcat:mediaType', 'ams:resourceType', 'ams:distributionType',
-                   'ams:serviceType', 'dc:identifier'}
-        for d in canonical_doc.get('dcat:distribution', []):
-            for key in list(d.keys()):
-                if key not in keepers:
-                    del d[key]
-        if not first:
-            await response.write(b',')
-        else:
-            first = False
-        await response.write(json.dumps(canonical_doc).encode())
-
-    await response.write(b']')
-    await response.write(b', "void:documents": ')
-    await response.write(str(result_info['/']).encode())
-    del result_info['/']
-    await response.write(b', "ams:facet_info": ')
-    await response.write(json.dumps(result_info).encode())
-    await response.write(b'}')
-    await response.write_eof()
+    async with streaming.Stream(request, response, resultiterator) as stream:
+        await stream.write(b'{"@context":')
+        await stream.write(ctx_json.encode())
+        await stream.write(b',"dcat:dataset":[')
+
+        async for docid, summary, doc, etag in _chain(first_result, resultiterator):
+            if summary is None:
+                # Summaries are only stored when a dataset is written
+                summary = _summarize(await _canonicalize(request.app, docid, doc))
+            if not extra_read_access:
+                summary.pop('ams:status', None)
+            if not first:
+                await stream.write(b',')
+            else:
+                first = False
+            await stream.write(json.dumps(summary).encode())
+
+        await stream.write(b']')
+        await stream.write(b', "void:documents": ')
+        await stream.write(str(result_info['/']).encode())
+        del result_info['/']
+        next_cursor = result_info.pop('next', None)
+        if next_cursor is not None:
+            next_query = {key: value for key, value in query.items() if key != 'cursor'}
+            next_query['cursor'] = next_cursor
+            await stream.write(b', "ams:next": ')
+            await stream.write(json.dumps(
+                _datasets_url(request) + '?' + urllib.parse.urlencode(next_query)
+            ).encode())
+        await stream.write(b', "ams:facet_info": ')
+        await stream.write(json.dumps(result_info).encode())
+        await stream.write(b'}')
+        await response.write_eof()
     return response
 
 
@@ -339,11 +500,261 @@ async def post_collection(request: web.Request):
         doc = await request.json()
     except json.decoder.JSONDecodeError:
         raise web.HTTPBadRequest(text='invalid json')
-    doc['ams:modifiedby'] = request.authz_subject
-    canonical_doc = await hooks.mds_canonicalize(app=request.app, data=doc)
+    docid, canonical_doc, searchable_text = await _prepare_create(
+        request.app, doc, request.authz_subject, is_redact_only
+    )
+    try:
+        new_etag = await hooks.storage_create(
+            app=request.app, docid=docid, doc=canonical_doc,
+            searchable_text=searchable_text, iso_639_1_code="nl"
+        )
+    except KeyError:
+        raise web.HTTPBadRequest(
+            text='Document with dct:identifier {} already exists'.format(docid)
+        )
+    await notify_data_changed(request.app, [('create', docid, None, new_etag)])
+    await _store_rendered(request.app, docid, canonical_doc, new_etag)
+    return web.Response(
+        status=201, headers={
+            'Etag': new_etag,
+            'Location': datasets_url + f'/{docid}'
+        },
+        content_type='text/plain'
+    )
+
+
+async def post_bulk(request: web.Request) -> web.StreamResponse:
+    # language=rst
+    """Handler for ``POST /datasets/_bulk``.
+
+    Creates the datasets in the request body, one JSON document per line, and
+    streams the outcome per document, see :func:`import_datasets`.
+
+    """
+    scopes = request.authz_scopes
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+    async for result in import_datasets(
+            request.app, _ndjson_lines(request.content), request.authz_subject,
+            is_redact_only='CAT/W' not in scopes):
+        await response.write(json.dumps(result).encode() + b'\n')
+    await response.write_eof()
+    return response
+
+
+async def post_batch(request: web.Request) -> web.Response:
+    # language=rst
+    """Handler for ``POST /datasets/_batch``.
+
+    Updates the datasets in the request body, a list of objects with the
+    ``id``, current ``etag`` and new ``dataset`` of each, like :func:`put`
+    does with an If-Match header. All updates are stored in a single
+    transaction.
+
+    The response lists the ``id`` and HTTP ``status`` per dataset, in the same
+    order: 204 with the new ``etag`` if the dataset was updated, 412 if its
+    etag didn't match, 404 if it doesn't exist, or another status with an
+    ``error`` message if it is invalid.
+
+    """
+    hooks = request.app.hooks
+    scopes = request.authz_scopes
+
+    is_redact_only = 'CAT/W' not in scopes
+
+    try:
+        items = await request.json()
+    except json.decoder.JSONDecodeError:
+        raise web.HTTPBadRequest(text='invalid json')
+    if not isinstance(items, list) or not all(
+            isinstance(item, dict) and isinstance(item.get('id'), str) and
+            isinstance(item.get('etag'), str) and isinstance(item.get('dataset'), dict)
+            for item in items):
+        raise web.HTTPBadRequest(
+            text='Expected a list of objects with an id, an etag and a dataset'
+        )
+    if len(items) > _BATCH_MAX_SIZE:
+        raise web.HTTPBadRequest(
+            text='At most {} datasets can be updated at once'.format(_BATCH_MAX_SIZE)
+        )
+
+    old_docs = await hooks.storage_retrieve_many(
+        app=request.app, docids={item['id'] for item in items}
+    )
+    results = []
+    updates = []
+    for item in items:
+        docid = item['id']
+        result = {'id': docid}
+        results.append(result)
+        if docid not in old_docs:
+            result['status'] = 404
+            continue
+        old_doc, etag = old_docs[docid]
+        if not conditional.match_etags(etag, {item['etag']}, False):
+            result['status'] = 412
+            continue
+        try:
+            canonical_doc = await _canonicalize_new(
+                request.app, item['dataset'], request.authz_subject, is_redact_only
+            )
+        except web.HTTPException as e:
+            result.update(status=e.status, error=e.text)
+            continue
+        except Exception as e:
+            _logger.info('Could not update dataset %s', docid, exc_info=True)
+            result.update(status=400, error=str(e))
+            continue
+        canonical_doc = await hooks.mds_before_storage(
+            app=request.app, data=canonical_doc, old_data=old_doc
+        )
+        searchable_text = await hooks.mds_full_text_search_representation(
+            data=canonical_doc
+        )
+        updates.append((docid, canonical_doc, searchable_text, {etag}, 'nl'))
+        result['status'] = 204
+
+    new_etags = iter(await hooks.storage_update_many(app=request.app, docs=updates))
+    new_docs = iter([update[1] for update in updates])
+    changes = []
+    stored = []
+    # Results with status 204 have a document in updates
+    for result in results:
+        if result['status'] != 204:
+            continue
+        new_etag = next(new_etags)
+        new_doc = next(new_docs)
+        if new_etag is None:
+            # changed since we retrieved it
+            result['status'] = 412
+        else:
+            result['etag'] = new_etag
+            changes.append(('update', result['id'], old_docs[result['id']][1], new_etag))
+            stored.append((result['id'], new_doc, new_etag))
+    if len(changes) > 0:
+        await notify_data_changed(request.app, changes)
+    for docid, new_doc, new_etag in stored:
+        await _store_rendered(request.app, docid, new_doc, new_etag)
+    return web.json_response(results)
+
+
+async def import_datasets(app, lines: T.AsyncIterable[bytes], modifiedby: str,
+                          is_redact_only: bool = False,
+                          batch_size: int = _IMPORT_BATCH_SIZE) -> T.AsyncGenerator[dict, None]:
+    # language=rst
+    """Create datasets from lines of JSON, like :func:`post_collection` does
+    for a single dataset.
+
+    Datasets are stored in batches of ``batch_size``, each in a single
+    transaction. Blank lines are skipped.
+
+    :returns: a generator over the outcome per non-blank line, in order: a
+        dictionary with the ``line`` number, the HTTP ``status`` the line
+        would have gotten from :func:`post_collection` and the ``id`` of the
+        dataset, if known. Created datasets have an ``etag``, others an
+        ``error`` message.
+
+    """
+    hooks = app.hooks
+    batch = []
+    results = []
+    line_number = 0
+
+    async def store_batch() -> None:
+        etags = iter(await hooks.storage_create_many(app=app, docs=[
+            (docid, doc, searchable_text, 'nl')
+            for docid, doc, searchable_text in batch
+        ]))
+        docs = iter([doc for docid, doc, searchable_text in batch])
+        batch.clear()
+        changes = []
+        stored = []
+        # Results with status 201 have a document in the batch
+        for result in results:
+            if result['status'] != 201:
+                continue
+            etag = next(etags)
+            doc = next(docs)
+            if etag is None:
+                result['status'] = 400
+                result['error'] = 'Document with dct:identifier {} already exists'.format(result['id'])
+            else:
+                result['etag'] = etag
+                changes.append(('create', result['id'], None, etag))
+                stored.append((result['id'], doc, etag))
+        if len(changes) > 0:
+            await notify_data_changed(app, changes)
+        for docid, doc, etag in stored:
+            await _store_rendered(app, docid, doc, etag)
+
+    async for line in lines:
+        line_number += 1
+        if len(line.strip()) == 0:
+            continue
+        try:
+            doc = json.loads(line)
+            if not isinstance(doc, dict):
+                raise web.HTTPBadRequest(text='invalid json')
+            prepared = await _prepare_create(app, doc, modifiedby, is_redact_only)
+        except json.decoder.JSONDecodeError:
+            results.append({'line': line_number, 'status': 400, 'error': 'invalid json'})
+        except web.HTTPException as e:
+            results.append({'line': line_number, 'status': e.status, 'error': e.text})
+        except Exception as e:
+            _logger.info('Could not import line %d', line_number, exc_info=True)
+            results.append({'line': line_number, 'status': 400, 'error': str(e)})
+        else:
+            batch.append(prepared)
+            results.append({'line': line_number, 'status': 201, 'id': prepared[0]})
+        if len(batch) == batch_size:
+            await store_batch()
+            for result in results:
+                yield result
+            results.clear()
+    if len(batch) > 0:
+        await store_batch()
+    for result in results:
+        yield result
+
+
+async def notify_data_changed(app, changes: T.List[T.Tuple[str, str, T.Optional[str], T.Optional[str]]]):
+    # language=rst
+    """Notify all instances of the given ``(operation, docid, old_etag,
+    new_etag)`` changes, see :func:`datacatalog.plugin_interfaces.notify`."""
+    hooks = app.hooks
+    await hooks.notify(app=app, changes=changes)
+
+
+def _render_version(app) -> str:
+    # The representation contains URLs that depend on the configuration
+    return _RENDER_VERSION + ' ' + app.config['web']['baseurl']
+
+
+async def _canonicalize_new(app, doc: dict, modifiedby: str, is_redact_only: bool) -> dict:
+    """Canonicalize a dataset sent by a client.
+
+    :raises: `web.HTTPForbidden` if the client may only redact datasets, and
+        the dataset is available.
+
+    """
+    doc['ams:modifiedby'] = modifiedby
+    canonical_doc = await app.hooks.mds_canonicalize(app=app, data=doc)
 
     if is_redact_only and canonical_doc['ams:status'] == 'beschikbaar':
         raise web.HTTPForbidden()
+    return canonical_doc
+
+
+async def _prepare_create(app, doc: dict, modifiedby: str,
+                          is_redact_only: bool) -> T.Tuple[str, dict, dict]:
+    """Canonicalize a new dataset.
+
+    :returns: the id, the document to store and its searchable text.
+    :raises: `web.HTTPException` if the dataset can't be created.
+
+    """
+    hooks = app.hooks
+    canonical_doc = await _canonicalize_new(app, doc, modifiedby, is_redact_only)
 
     docid = canonical_doc.get('dct:identifier')
     if docid is not None:
@@ -355,39 +766,95 @@ async def post_collection(request: web.Request):
     else:
         docid = await hooks.storage_id()
 
-    canonical_doc = await hooks.mds_before_storage(app=request.app, data=canonical_doc)
+    canonical_doc = await hooks.mds_before_storage(app=app, data=canonical_doc)
     # Let the metadata plugin grab the full-text search representation
     searchable_text = await hooks.mds_full_text_search_representation(
         data=canonical_doc
     )
-    try:
-        new_etag = await hooks.storage_create(
-            app=request.app, docid=docid, doc=canonical_doc,
-            searchable_text=searchable_text, iso_639_1_code="nl"
-        )
-    except KeyError:
-        raise web.HTTPBadRequest(
-            text='Document with dct:identifier {} already exists'.format(docid)
-        )
-    await notify_data_changed(request.app)
-    return web.Response(
-        status=201, headers={
-            'Etag': new_etag,
-            'Location': datasets_url + f'/{docid}'
-        },
-        content_type='text/plain'
-    )
+    return docid, canonical_doc, searchable_text
+
+
+async def _ndjson_lines(stream) -> T.AsyncGenerator[bytes, None]:
+    """The lines of a request body, which may be longer than the limit of
+    `aiohttp.StreamReader.readline`."""
+    rest = b''
+    async for chunk in stream.iter_any():
+        lines = (rest + chunk).split(b'\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line
+    if len(rest) > 0:
+        yield rest
 
 
-async def notify_data_changed(app):
+async def _canonicalize(app, docid: str, doc: dict) -> dict:
+    """The read representation of a stored document."""
     hooks = app.hooks
-    await hooks.notify(app=app, msg='data_changed')
+    canonical_doc = await hooks.mds_canonicalize(app=app, data=doc)
+    return await hooks.mds_after_storage(app=app, data=canonical_doc, doc_id=docid)
+
+
+async def _render(app, docid: str, doc: dict) -> T.Tuple[str, bytes]:
+    """Render the read representation of a stored document.
+
+    :returns: the status of the dataset and the representation.
+
+    """
+    canonical_doc = await _canonicalize(app, docid, doc)
+    return canonical_doc['ams:status'], json.dumps(canonical_doc).encode()
+
+
+def _summarize(canonical_doc: dict) -> dict:
+    """The summary of a dataset shown in listings."""
+    summary = {
+        key: value for key, value in canonical_doc.items()
+        if key in _SUMMARY_KEEPERS
+    }
+    if 'dcat:distribution' in summary:
+        summary['dcat:distribution'] = [
+            {key: value for key, value in d.items() if key in _SUMMARY_DISTRIBUTION_KEEPERS}
+            for d in summary['dcat:distribution']
+        ]
+    return summary
+
+
+async def _store_rendered(app, docid: str, doc: dict, etag: str) -> None:
+    """Store the read representation and summary of a document that was just
+    written, so :func:`get` and :func:`get_collection` don't have to render
+    it.
+
+    The document is already stored, so errors are only logged: without a
+    stored representation the document is rendered when it's read.
+
+    """
+    try:
+        canonical_doc = await _canonicalize(app, docid, doc)
+        version = _render_version(app)
+        if canonical_doc['ams:status'] in _PUBLIC_STATUSES:
+            await app.hooks.storage_store_rendered(
+                app=app, docid=docid, etag=etag, version=version,
+                rendered=json.dumps(canonical_doc).encode()
+            )
+        await app.hooks.storage_store_summary(
+            app=app, docid=docid, etag=etag, version=version,
+            summary=_summarize(canonical_doc)
+        )
+    except Exception:
+        _logger.exception('Could not store the representation of dataset %s', docid)
 
 
 def _datasets_url(request: web.Request) -> str:
     return request.app.config['web']['baseurl'] + 'datasets'
 
 
+async def _chain(first_result, resultiterator):
+    if first_result is None:
+        return
+    yield first_result
+    async for result in resultiterator:
+        yield result
+
+
 def _csv_decode_line(s: str) -> T.Optional[T.Set[str]]:
     reader = csv.reader([s])
     try:
@@ -8,6 +8,8 @@ from aiohttp import web
 
 from aiohttp_extras.content_negotiation import produces_content_types
 
+from . import streaming
+
 
 # logger = logging.getLogger(__name__ )
 
@@ -44,18 +46,19 @@ async def get_collection(request: web.Request) -> web.StreamResponse:
     response.content_type = request['best_content_type']
     response.enable_compression()
     await response.prepare(request)
-    await response.write(b'{"@context":')
-    await response.write(ctx_json.encode())
-    await response.write(b',"dcat:dataset":[')
-
-    separator = b''
-    async for docid, doc in dataset_iterator:
-        canonical_doc = await hooks.mds_canonicalize(app=request.app, data=doc)
-        canonical_doc = await hooks.mds_after_storage(app=request.app, data=canonical_doc, doc_id=docid)
-        del canonical_doc['@context']
-        await response.write(separator + json.dumps(canonical_doc).encode())
-        separator = b','
-
-    await response.write(b']}')
-    await response.write_eof()
+    async with streaming.Stream(request, response, dataset_iterator) as stream:
+        await stream.write(b'{"@context":')
+        await stream.write(ctx_json.encode())
+        await stream.write(b',"dcat:dataset":[')
+
+        separator = b''
+        async for docid, doc in dataset_iterator:
+            canonical_doc = await hooks.mds_canonicalize(app=request.app, data=doc)
+            canonical_doc = await hooks.mds_after_storage(app=request.app, data=canonical_doc, doc_id=docid)
+            del canonical_doc['@context']
+            await stream.write(separator + json.dumps(canonical_doc).encode())
+            separator = b','
+
+        await stream.write(b']}')
+        await response.write_eof()
     return response
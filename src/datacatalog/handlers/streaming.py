@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import typing as T
+
+from aiohttp import web
+
+
+_logger = logging.getLogger(__name__)
+
+# Number of streaming responses that were aborted, by reason. Exposed by
+# ``/system/stats``.
+aborted = {
+    # the client went away:
+    'disconnected': 0,
+    # the response took longer than option ``web.max_streaming_duration``:
+    'timeout': 0,
+    # a query took longer than the storage plugin allows:
+    'statement_timeout': 0,
+}
+
+
+class _Aborted(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Stream:
+    # language=rst
+    """Writes the body of a streaming response of search results.
+
+    Use as an async context manager around the loop over ``results``, and
+    write through :meth:`write`. The response is aborted if the client
+    disconnects, if it takes longer than option
+    ``web.max_streaming_duration``, or if a query of the search times out.
+    The search results are then closed so that the database connection
+    goes back to the pool, the connection with the client is closed, the
+    abort is counted in :data:`aborted`, and the context manager swallows
+    the exception, unless it's the cancellation of the handler. So don't
+    write the end of the response outside the context.
+
+    """
+
+    def __init__(self, request: web.Request, response: web.StreamResponse,
+                 results: T.AsyncGenerator):
+        self._request = request
+        self._response = response
+        self._results = results
+        self._deadline = None
+        max_duration = request.app.config['web'].get('max_streaming_duration')
+        if max_duration is not None:
+            self._deadline = asyncio.get_event_loop().time() + max_duration
+
+    async def write(self, data: bytes) -> None:
+        if self._disconnected():
+            raise _Aborted('disconnected')
+        timeout = None
+        if self._deadline is not None:
+            timeout = self._deadline - asyncio.get_event_loop().time()
+            if timeout <= 0:
+                raise _Aborted('timeout')
+        try:
+            await asyncio.wait_for(self._response.write(data), timeout)
+        except asyncio.TimeoutError:
+            raise _Aborted('timeout')
+        except ConnectionResetError:
+            raise _Aborted('disconnected')
+
+    async def __aenter__(self) -> 'Stream':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if exc is None:
+            return False
+        await self._results.aclose()
+        if isinstance(exc, _Aborted):
+            reason = exc.reason
+        elif isinstance(exc, asyncio.TimeoutError):
+            # timeouts of our own writes are converted to _Aborted, so this
+            # one was raised by the search
+            reason = 'statement_timeout'
+        elif isinstance(exc, asyncio.CancelledError) and self._disconnected():
+            # with option handler_cancellation, aiohttp cancels the handler
+            # when the client disconnects
+            reason = 'disconnected'
+        else:
+            return False
+        aborted[reason] += 1
+        _logger.info("Aborted streaming response to %s: %s", self._request.path_qs, reason)
+        transport = self._request.transport
+        if transport is not None:
+            transport.close()
+        # a cancellation must go on
+        return not isinstance(exc, asyncio.CancelledError)
+
+    def _disconnected(self) -> bool:
+        transport = self._request.transport
+        return transport is None or transport.is_closing()
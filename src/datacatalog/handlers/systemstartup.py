@@ -0,0 +1,15 @@
+from aiohttp import web
+
+from .. import startup_actions
+
+
+async def get(request):
+    # language=rst
+    """Handle the progress of the startup actions.
+
+    The startup actions run in the background after the server has started,
+    on one instance at a time. Returns their progress in this process as a
+    JSON object, see :data:`datacatalog.startup_actions.status`.
+
+    """
+    return web.json_response(startup_actions.status)
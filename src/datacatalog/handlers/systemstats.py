@@ -0,0 +1,21 @@
+from aiohttp import web
+
+from . import streaming
+
+
+async def get(request):
+    # language=rst
+    """Handle the system statistics.
+
+    Returns counters of this process as a JSON object: the numbers of aborted
+    streaming responses, by reason, under ``aborted_streams``, and the
+    counters of the plugins, see
+    :func:`datacatalog.plugin_interfaces.system_stats`.
+
+    """
+    stats = {}
+    for result in await request.app.hooks.system_stats(app=request.app):
+        if result.value is not None:
+            stats.update(result.value)
+    stats['aborted_streams'] = streaming.aborted
+    return web.json_response(stats)
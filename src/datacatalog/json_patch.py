@@ -0,0 +1,161 @@
+"""JSON Patch (`RFC 6902 <https://tools.ietf.org/html/rfc6902>`_).
+
+Patches are applied without changing the original document: only the
+objects and arrays on the paths that are changed are copied, the rest of
+the result is shared with the original.
+
+"""
+import re
+import typing as T
+
+import jsonpointer
+
+
+_ARRAY_INDEX = re.compile(r'0|[1-9][0-9]*')
+
+
+class PatchError(ValueError):
+    """The patch is malformed."""
+
+
+class PatchConflict(Exception):
+    """The patch can't be applied to the document, e.g. because a path
+    doesn't exist or a test failed."""
+
+
+def apply(doc, patch: T.List[dict]):
+    # language=rst
+    """Apply ``patch`` to ``doc``.
+
+    :returns: the patched document.
+    :raises PatchError: if the patch is malformed.
+    :raises PatchConflict: if the patch can't be applied to the document.
+
+    """
+    if not isinstance(patch, list):
+        raise PatchError('A patch must be an array of operations')
+    for operation in patch:
+        if not isinstance(operation, dict):
+            raise PatchError('An operation must be an object')
+        op = operation.get('op')
+        path = _parts(operation, 'path')
+        if op == 'add':
+            doc = _add(doc, path, _value(operation))
+        elif op == 'remove':
+            doc = _remove(doc, path)
+        elif op == 'replace':
+            value = _value(operation)
+            doc = value if len(path) == 0 else _add(_remove(doc, path), path, value)
+        elif op == 'move':
+            from_path = _parts(operation, 'from')
+            if path[:len(from_path)] == from_path and path != from_path:
+                raise PatchError('Cannot move a value into one of its children')
+            value = _get(doc, from_path)
+            doc = _add(_remove(doc, from_path), path, value)
+        elif op == 'copy':
+            doc = _add(doc, path, _get(doc, _parts(operation, 'from')))
+        elif op == 'test':
+            if not _equal(_get(doc, path), _value(operation)):
+                raise PatchConflict('Test failed: ' + operation['path'])
+        else:
+            raise PatchError('Unknown operation: {!r}'.format(op))
+    return doc
+
+
+def _parts(operation: dict, member: str) -> T.List[str]:
+    pointer = operation.get(member)
+    if not isinstance(pointer, str):
+        raise PatchError('Operation must have a {} member'.format(member))
+    try:
+        return jsonpointer.JsonPointer(pointer).parts
+    except jsonpointer.JsonPointerException as e:
+        raise PatchError(str(e))
+
+
+def _value(operation: dict):
+    if 'value' not in operation:
+        raise PatchError('Operation must have a value member')
+    return operation['value']
+
+
+def _equal(a, b) -> bool:
+    # in JSON, true isn't 1
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_equal(a[key], b[key]) for key in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def _index(container: list, part: str, insert: bool = False) -> int:
+    if insert and part == '-':
+        return len(container)
+    if not _ARRAY_INDEX.fullmatch(part):
+        raise PatchConflict('Not an array index: ' + part)
+    index = int(part)
+    if index > len(container) or (index == len(container) and not insert):
+        raise PatchConflict('Array index out of range: ' + part)
+    return index
+
+
+def _get(doc, parts: T.List[str]):
+    for part in parts:
+        if isinstance(doc, dict):
+            if part not in doc:
+                raise PatchConflict('Member does not exist: ' + part)
+            doc = doc[part]
+        elif isinstance(doc, list):
+            doc = doc[_index(doc, part)]
+        else:
+            raise PatchConflict('Cannot look up {} in a {}'.format(part, type(doc).__name__))
+    return doc
+
+
+def _copy_path(doc, parts: T.List[str]):
+    """Copy the containers on the path to the parent of ``parts``.
+
+    :returns: the copy of the document and of the parent.
+
+    """
+    root = parent = _copy(doc)
+    for part in parts[:-1]:
+        key = _index(parent, part) if isinstance(parent, list) else part
+        if isinstance(parent, dict) and key not in parent:
+            raise PatchConflict('Member does not exist: ' + part)
+        parent[key] = _copy(parent[key])
+        parent = parent[key]
+    return root, parent
+
+
+def _copy(container):
+    if isinstance(container, dict):
+        return dict(container)
+    if isinstance(container, list):
+        return list(container)
+    raise PatchConflict('Cannot change a member of a ' + type(container).__name__)
+
+
+def _add(doc, parts: T.List[str], value):
+    if len(parts) == 0:
+        return value
+    doc, parent = _copy_path(doc, parts)
+    if isinstance(parent, list):
+        parent.insert(_index(parent, parts[-1], insert=True), value)
+    else:
+        parent[parts[-1]] = value
+    return doc
+
+
+def _remove(doc, parts: T.List[str]):
+    if len(parts) == 0:
+        raise PatchConflict('Cannot remove the whole document')
+    doc, parent = _copy_path(doc, parts)
+    if isinstance(parent, list):
+        del parent[_index(parent, parts[-1])]
+    elif parts[-1] in parent:
+        del parent[parts[-1]]
+    else:
+        raise PatchConflict('Member does not exist: ' + parts[-1])
+    return doc
@@ -1,16 +1,26 @@
 import asyncio
+import collections
+import json
 import os
+import sys
 
 from aiohttp import web
+import click
 import uvloop
 
 import sentry_sdk
 from sentry_sdk.integrations.aiohttp import AioHttpIntegration
 
 from datacatalog import application
+from datacatalog.handlers import datasets
 
 
-def main():
+@click.group(invoke_without_command=True)
+@click.pass_context
+def main(ctx):
+    """Run the data catalog, or one of the commands below."""
+    if ctx.invoked_subcommand is not None:
+        return
     sentry_dsn = os.getenv('SENTRY_DSN')
     if sentry_dsn:
         sentry_sdk.init(
@@ -26,5 +36,47 @@ def main():
     return 0
 
 
+@main.command('import')
+@click.argument('file', type=click.File('rb'), default='-')
+@click.option('--modified-by', default='import', show_default=True,
+              help='Value of ams:modifiedby of the imported datasets.')
+@click.option('--batch-size', default=datasets._IMPORT_BATCH_SIZE, show_default=True,
+              help='Number of datasets stored per transaction.')
+def import_datasets(file, modified_by, batch_size):
+    """Create the datasets in FILE, one JSON document per line.
+
+    Prints the outcome per dataset as a line of JSON, like
+    POST /datasets/_bulk.
+    """
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    aio_app = application.Application()
+    counts = asyncio.run(_import(aio_app, file, modified_by, batch_size))
+    click.echo(', '.join(
+        '{} with status {}'.format(count, status) for status, count in sorted(counts.items())
+    ) or 'Nothing to import', err=True)
+    sys.exit(0 if set(counts) <= {201} else 1)
+
+
+async def _import(aio_app, file, modifiedby: str, batch_size: int) -> collections.Counter:
+    results = await aio_app.hooks.initialize(app=aio_app)
+    for r in results:
+        if r.exception is not None:
+            raise r.exception
+
+    async def lines():
+        for line in file:
+            yield line
+
+    counts = collections.Counter()
+    try:
+        async for result in datasets.import_datasets(
+                aio_app, lines(), modifiedby, batch_size=batch_size):
+            counts[result['status']] += 1
+            click.echo(json.dumps(result))
+    finally:
+        await aio_app.hooks.deinitialize(app=aio_app)
+    return counts
+
+
 if __name__ == '__main__':
     main()
@@ -60,6 +60,17 @@ def health_check(app) -> T.Optional[str]:
     """
 
 
+# noinspection PyUnusedLocal
+@hookspec
+def system_stats(app) -> T.Optional[dict]:
+    # language=rst
+    """Counters of this process, shown by ``GET /system/stats``.
+
+    :returns: a dictionary of counters by name, or ``None``.
+
+    """
+
+
 # noinspection PyUnusedLocal
 @hookspec.first_only
 def check_startup_action(app, name: str) -> bool:
@@ -76,6 +87,25 @@ def add_startup_action(app, name: str):
     """
 
 
+# noinspection PyUnusedLocal
+@hookspec.first_only
+def lock_startup_actions(app) -> bool:
+    # language=rst
+    """Try to become the only instance that runs the startup actions.
+
+    :returns: True if this instance holds the lock until
+        :func:`unlock_startup_actions`, False if another instance holds it.
+    """
+
+
+# noinspection PyUnusedLocal
+@hookspec.first_only
+def unlock_startup_actions(app):
+    # language=rst
+    """Release the lock taken by :func:`lock_startup_actions`, if any.
+    """
+
+
 # noinspection PyUnusedLocal
 @hookspec.first_only
 def get_old_identifiers(app):
@@ -99,7 +129,8 @@ def set_new_identifier(app, old_id: str, new_id: str):
 
 # noinspection PyUnusedLocal
 @hookspec.first_only.required
-def storage_retrieve(app, docid: str, etags: T.Optional[T.Set[str]]) \
+def storage_retrieve(app, docid: str, etags: T.Optional[T.Set[str]],
+                     primary: bool=False) \
         -> T.Tuple[T.Optional[dict], str]:
     # language=rst
     """ Get document and corresponsing etag by id.
@@ -107,6 +138,9 @@ def storage_retrieve(app, docid: str, etags: T.Optional[T.Set[str]]) \
     :param app: the `~datacatalog.application.Application`
     :param docid: document id
     :param etags: None, or a set of Etags
+    :param primary: whether the document must be read from the primary
+        database, e.g. because it is about to be changed, instead of from a
+        replica that may lag behind.
     :returns:
         A tuple. The first element is either the document or None if the
         document's Etag corresponds to one of the given etags. The second
@@ -116,6 +150,83 @@ def storage_retrieve(app, docid: str, etags: T.Optional[T.Set[str]]) \
     """
 
 
+# noinspection PyUnusedLocal
+@hookspec.first_only.required
+def storage_retrieve_many(app, docids: T.Iterable[str]) -> T.Dict[str, T.Tuple[dict, str]]:
+    # language=rst
+    """ Get documents and corresponding etags by id.
+
+    :param app: the `~datacatalog.application.Application`
+    :param docids: document ids
+    :returns: a dictionary from document id to a (document, etag) tuple.
+        Documents that don't exist are left out.
+
+    """
+
+
+# noinspection PyUnusedLocal
+@hookspec.first_only.required
+def storage_retrieve_rendered(app, docid: str, version: str,
+                              etags: T.Optional[T.Set[str]]) \
+        -> T.Tuple[T.Optional[bytes], str]:
+    # language=rst
+    """ Get the stored read representation of a document and its etag by id.
+
+    :param app: the `~datacatalog.application.Application`
+    :param docid: document id
+    :param version: the version of the rendering
+    :param etags: None, or a set of Etags known by the client. Storage
+        plugins that read from replicas use these to decide whether a replica
+        is up to date.
+    :returns:
+        A tuple. The first element is either the representation stored by
+        :func:`storage_store_rendered` for the current etag and the given
+        version, or None if there is none or if the current etag is one of
+        the given etags. The second element is the current etag.
+    :raises KeyError: if not found
+
+    """
+
+
+# noinspection PyUnusedLocal
+@hookspec.first_only.required
+def storage_store_rendered(app, docid: str, etag: str, version: str,
+                           rendered: bytes) -> None:
+    # language=rst
+    """ Store the read representation of a document.
+
+    The representation is only stored if the document still has the given
+    etag, and is dropped as soon as the document changes.
+
+    :param app: the `~datacatalog.application.Application`
+    :param docid: document id
+    :param etag: the etag of the document that was rendered
+    :param version: the version of the rendering
+    :param rendered: the representation
+
+    """
+
+
+# noinspection PyUnusedLocal
+@hookspec.first_only.required
+def storage_store_summary(app, docid: str, etag: str, version: str,
+                          summary: dict) -> None:
+    # language=rst
+    """ Store the summary of a document, as shown in listings.
+
+    The summary is only stored if the document still has the given etag, and
+    is ignored as soon as the document changes. See the ``summary_version``
+    parameter of :func:`search_search`.
+
+    :param app: the `~datacatalog.application.Application`
+    :param docid: document id
+    :param etag: the etag of the document that was summarized
+    :param version: the version of the summary
+    :param summary: the summary; a "JSON dictionary".
+
+    """
+
+
 # noinspection PyUnusedLocal
 @hookspec.first_only.required
 def storage_create(app, docid: str, doc: dict, searchable_text: dict,
@@ -134,6 +245,20 @@ def storage_create(app, docid: str, doc: dict, searchable_text: dict,
     """
 
 
+# noinspection PyUnusedLocal
+@hookspec.first_only.required
+def storage_create_many(app, docs: T.List[T.Tuple[str, dict, dict, T.Optional[str]]]) \
+        -> T.List[T.Optional[str]]:
+    # language=rst
+    """ Store many new documents at once.
+
+    :param app: the `~datacatalog.application.Application`
+    :param docs: ``(docid, doc, searchable_text, iso_639_1_code)`` tuples, see
+        :func:`storage_create`.
+    :returns: for each document its new ETag, or None if a document with the
+        same docid already exists, or occurs earlier in ``docs``.
+    """
+
 
 # noinspection PyUnusedLocal
 @hookspec.first_only.required
@@ -147,7 +272,9 @@ def storage_update(app, docid: str, doc: dict, searchable_text: dict,
     :param docid: the ID under which to store this document. May or may not
         already exist in the data store.
     :param doc: the document to store; a "JSON dictionary".
-    :param searchable_text: dictionary with search strings for A,B,C and D weights.
+    :param searchable_text: dictionary with search strings for A,B,C and D
+        weights. The stored search text of the weights that are left out is
+        kept.
     :param etags: one or more Etags.
     :param iso_639_1_code: the language of the document.
     :returns: new ETag
@@ -158,13 +285,30 @@ def storage_update(app, docid: str, doc: dict, searchable_text: dict,
 
 # noinspection PyUnusedLocal
 @hookspec.first_only.required
-def storage_delete(app, docid: str, etags: T.Set[str]) -> None:
+def storage_update_many(app, docs: T.List[T.Tuple[str, dict, dict, T.Set[str], T.Optional[str]]]) \
+        -> T.List[T.Optional[str]]:
+    # language=rst
+    """ Update many documents in one transaction, each only if it has one of
+    the provided Etags.
+
+    :param app: the `~datacatalog.application.Application`
+    :param docs: ``(docid, doc, searchable_text, etags, iso_639_1_code)``
+        tuples, see :func:`storage_update`.
+    :returns: for each document its new ETag, or None if it doesn't exist or
+        none of its etags match the stored etag.
+    """
+
+
+# noinspection PyUnusedLocal
+@hookspec.first_only.required
+def storage_delete(app, docid: str, etags: T.Set[str]) -> str:
     # language=rst
     """ Delete document only if it has one of the provided Etags.
 
     :param app: the `~datacatalog.application.Application`
     :param docid: the ID of the document to delete.
     :param etags: the last known ETags of this document.
+    :returns: the ETag of the deleted document.
     :raises: ValueError if none of the given etags match the stored etag.
     :raises: KeyError if a document with the given id doesn't exist.
 
@@ -188,6 +332,33 @@ def storage_extract(app, ptr: str, distinct: bool=False) -> T.Generator[str, Non
     """
 
 
+# noinspection PyUnusedLocal
+@hookspec.first_only.required
+def storage_changes(app, since: int, limit: T.Optional[int]=None,
+                    since_id: T.Optional[str]=None) \
+        -> T.AsyncGenerator[T.Tuple[int, str, T.Optional[dict], T.Optional[str]], None]:
+    # language=rst
+    """Generator over the changes to the stored documents since a point in
+    the change sequence, in order.
+
+    Every create, update and delete gives the document a new sequence
+    number, higher than those of all changes yielded before, so only its
+    latest change is yielded. Changes made together may have the same
+    sequence number, and are ordered by document id.
+
+    :param app: the `~datacatalog.application.Application`
+    :param since: only changes with a higher sequence number are yielded;
+        0 for all documents.
+    :param limit: the maximum number of changes, if any.
+    :param since_id: if given, changes with sequence number ``since`` and a
+        higher document id are yielded too, so that a client can continue
+        after the last change it got.
+    :returns: A generator over ``(seq, id, doc, etag)`` tuples, where ``doc``
+        and ``etag`` are None if the document was deleted.
+    :raises: asyncio.TimeoutError if the query takes too long.
+    """
+
+
 @hookspec.first_only.required
 def storage_id() -> str:
     # language=rst
@@ -202,12 +373,23 @@ async def storage_all(app: T.Mapping[str, T.Any]) -> T.AsyncGenerator[T.Tuple[st
     """
 
 @hookspec.first_only
-async def notify(app: T.Mapping[str, T.Any], msg: str) -> None:
+async def notify(app: T.Mapping[str, T.Any],
+                 changes: T.Iterable[T.Tuple[str, str, T.Optional[str], T.Optional[str]]]) -> None:
     # language=rst
     """
-    Notify Postgres channel
+    Notify all instances of changes to datasets, through the callback given
+    to :func:`listen_notifications`.
+
+    The payload of each notification is a JSON object with the
+    ``operation``, ``id``, ``old_etag`` and ``new_etag`` of the change, and a
+    ``change_number`` that increases by one with every change, so that
+    listeners can tell whether they missed a notification. See
+    `~datacatalog.application.Application.subscribe`.
+
     :param app: the `~datacatalog.application.Application`
-    :param msg: message to notify
+    :param changes: ``(operation, docid, old_etag, new_etag)`` tuples, where
+        operation is ``create``, ``update`` or ``delete``, and etags may be
+        None if not applicable or unknown.
     :return: None
     """
 
@@ -262,8 +444,11 @@ def search_search(
             T.Union[str, T.Set[str]]
         ]
     ]]=None,
-    iso_639_1_code: T.Optional[str]=None
-) -> T.AsyncGenerator[T.Tuple[str, dict], None]:
+    iso_639_1_code: T.Optional[str]=None,
+    cursor: T.Optional[str]=None,
+    max_candidates: T.Optional[int]=None,
+    summary_version: T.Optional[str]=None
+) -> T.AsyncGenerator[T.Tuple, None]:
     # language=rst
     """ Search.
 
@@ -271,16 +456,35 @@ def search_search(
     :param q: the query
     :param sortproperty: the property to sort by. Must be a top-level object property.
     :param result_info: mapping in which all encountered facets in the result set are
-        put
+        put, as well as the total amount of results under key ``/``. If
+        ``limit`` results were returned, key ``next`` holds the cursor for the
+        next page.
     :param facets: a list of facets to return and count
     :param limit: maximum hits to be returned
     :param offset: offset in resultset
     :param filters: mapping of JSON pointer -> value, used to filter on some
         value.
     :param iso_639_1_code: the language of the query
-    :returns: A generator over the search results (id, doc, metadata)
+    :param cursor: a ``next`` cursor from the result info of a previous
+        search with the same parameters; results start after the last result
+        of that search.
+    :param max_candidates: if given, a free-text search ranks at most this
+        many matching documents (but at least enough to fill the page), which
+        makes short queries that match most documents fast. The order of the
+        results is then approximate; the total stays exact. There is no
+        ``next`` cursor, and it can't be combined with ``cursor``.
+    :param summary_version: if given, the generator yields
+        ``(id, summary, doc, etag)`` tuples instead of ``(id, doc)``, where
+        ``summary`` is the summary stored by :func:`storage_store_summary` for
+        the current etag and this version. If there's no such summary it is
+        None, and ``doc`` holds the document (which is otherwise None).
+    :returns: A generator over the search results (id, doc)
     :raises: ValueError if filter syntax is invalid, if the ISO 639-1 code is
-        not recognized, or if the offset is invalid.
+        not recognized, or if the offset, cursor or max_candidates is
+        invalid.
+    :raises: asyncio.TimeoutError if a query of the search takes too long;
+        iteration may stop halfway. Closing the generator early releases its
+        resources right away.
 
     """
 
@@ -355,9 +559,13 @@ def mds_json_schema(app, method: str) -> dict:
 
 # noinspection PyUnusedLocal
 @hookspec.first_only
-def mds_full_text_search_representation(data: dict) -> dict:
+def mds_full_text_search_representation(data: dict, properties: T.Optional[T.Set[str]] = None) -> dict:
     # language=rst
     """Full text search representation of the given data as A,B,C and D weights in dict.
+
+    :param properties: if given, only the weights that contain one or more
+        of these properties are in the result, e.g. the properties that
+        were changed by an update.
     """
 
 
@@ -299,16 +299,23 @@ async def mds_json_schema(app, method: str) -> dict:
     return result
 
 
+# The properties whose text is searchable, by weight.
+_FULL_TEXT_SEARCH_PROPERTIES = {
+    'A': {'dct:title', 'dcat:distribution'},
+    'B': {'dcat:theme', 'dcat:keyword'},
+    'C': {'dct:description'},
+    'D': {'ams:owner', 'overheid:grondslag', 'overheidds:doel'},
+}
+
+
 @_hookimpl
-def mds_full_text_search_representation(data: dict) -> dict:
+def mds_full_text_search_representation(data: dict, properties: T.Optional[T.Set[str]] = None) -> dict:
     result = dict()
-    result['A'] = DATASET.full_text_search_representation(data, {'dct:title', 'dcat:distribution'})
-    result['B'] = DATASET.full_text_search_representation(data, {'dcat:theme', 'dcat:keyword'})
-    result['C'] = DATASET.full_text_search_representation(data, {'dct:description'})
-    result['D'] = DATASET.full_text_search_representation(data, {'ams:owner', 'overheid:grondslag', 'overheidds:doel'})
-    for key, value in result.items():
-        if value is None:
-            result[key] = ''
+    for weight, weight_properties in _FULL_TEXT_SEARCH_PROPERTIES.items():
+        if properties is not None and not (weight_properties & properties):
+            continue
+        value = DATASET.full_text_search_representation(data, weight_properties)
+        result[weight] = '' if value is None else value
     return result
 
 
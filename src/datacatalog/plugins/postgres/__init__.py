@@ -3,7 +3,9 @@
 import asyncio
 import base64
 import collections
+import datetime
 import hashlib
+import itertools
 import json
 import logging
 import re
@@ -21,14 +23,44 @@ import jsonpointer
 from aiohttp_extras import conditional
 from pathlib import Path
 
+from . import migrations
 from .languages import ISO_639_1_TO_PG_DICTIONARIES
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 _hookimpl = aiopluggy.HookimplMarker('datacatalog')
 _logger = logging.getLogger(__name__)
 
 _listen_conn = None
 _listen_callback = None
 
+# Text search configurations known to the database, see _to_pg_ts_config().
+_ts_configs = {'simple'}
+
+# Facet counts of unfiltered and status-filtered listings, see
+# _facet_cache_key(). Only used while we're listening for notifications of
+# changes made by other instances.
+_facet_cache = {}
+_facet_cache_generation = 0
+
+# See _EtagIndex. Only used while we're listening for notifications.
+_etag_index = None
+
+# The connection that holds the advisory lock of the startup actions, see
+# lock_startup_actions().
+_startup_actions_conn = None
+
+# Used to take replicas in turn, see _read_pool().
+_replica_counter = itertools.count()
+
+# Hits and misses of the per-connection cache of prepared search statements,
+# see _Connection.
+statement_cache_stats = {'hits': 0, 'misses': 0}
+_STATEMENT_CACHE_SIZE = 100
+
 CONNECT_ATTEMPT_INTERVAL_SECS = 2
 CONNECT_ATTEMPT_MAX_TRIES = 5
 _DEFAULT_CONNECTION_TIMEOUT = 60
@@ -36,52 +68,438 @@ _DEFAULT_MIN_POOL_SIZE = 0
 _DEFAULT_MAX_POOL_SIZE = 6
 _DEFAULT_MAX_INACTIVE_CONNECTION_LIFETIME = 5.0
 
-_Q_CREATE = '''
-CREATE TABLE IF NOT EXISTS "dataset" (
-    "id" character varying(254) PRIMARY KEY,
-    "doc" jsonb NOT NULL,
-    "etag" character varying(254) NOT NULL,
-    "searchable_text" tsvector,
-    "lang" character varying(20)
-);
-CREATE INDEX IF NOT EXISTS "idx_id_etag" ON "dataset" ("id", "etag");
-CREATE INDEX IF NOT EXISTS "idx_full_text_search" ON "dataset" USING gin ("searchable_text");
-CREATE INDEX IF NOT EXISTS "idx_json_docs" ON "dataset" USING gin ("doc" jsonb_path_ops);
-'''
+
+def _orjson_dumps(value) -> str:
+    return orjson.dumps(value).decode()
+
+
+def _json_dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+# Serializers and deserializers of jsonb values, by the name used in option
+# ``jsonb_codec`` of the configuration. See _init_connection().
+JSONB_CODECS = {
+    'json': (_json_dumps, json.loads),
+}
+if orjson is not None:
+    JSONB_CODECS['orjson'] = (_orjson_dumps, orjson.loads)
+_DEFAULT_JSONB_CODEC = 'orjson' if orjson is not None else 'json'
+_jsonb_codec = JSONB_CODECS[_DEFAULT_JSONB_CODEC]
+
+# Number of seconds a search query may take, see option ``statement_timeout``
+# of the configuration.
+_statement_timeout = None
+
+# Facets whose values are stored in table dataset_facet on every write, so
+# they can be counted without looking at the documents. Their values are
+# strings according to the schema; other values aren't stored.
+MATERIALIZED_FACETS = {
+    ptr: jsonpointer.JsonPointer(ptr).parts for ptr in (
+        '/properties/dcat:distribution/items/properties/ams:resourceType',
+        '/properties/dcat:distribution/items/properties/dcat:mediaType',
+        '/properties/dcat:distribution/items/properties/ams:distributionType',
+        '/properties/dcat:distribution/items/properties/ams:serviceType',
+        '/properties/dcat:keyword/items',
+        '/properties/dcat:theme/items',
+        '/properties/ams:owner',
+        '/properties/ams:status',
+    )
+}
+
+# Sort paths that are stored in a typed and indexed column of table dataset on
+# every write, so sorted listings don't need to look at the documents. Maps
+# the sort path to the name and type of the column.
+SORT_COLUMNS = {
+    ('ams:sort_modified',): ('sort_modified', 'date'),
+    ('dct:title',): ('sort_title', 'text'),
+    ('foaf:isPrimaryTopicOf', 'dct:issued'): ('sort_issued', 'date'),
+}
+
+# Frequently filtered properties that are stored in an indexed column of table
+# dataset on every write, so filtering on them doesn't need jsonb containment.
+# Maps the JSON pointer to the name of the column.
+FILTER_COLUMNS = {
+    '/properties/ams:status': 'filter_status',
+    '/properties/ams:owner': 'filter_owner',
+    '/properties/dct:language': 'filter_language',
+}
+
+# Date and integer properties that can be filtered with range comparators.
+# Their values are stored in indexed columns of table dataset on every write.
+# Maps the JSON pointer to the names of the columns holding the lowest and
+# highest value under the pointer, and their type.
+RANGE_COLUMNS = {
+    '/properties/ams:sort_modified': ('sort_modified', 'sort_modified', 'date'),
+    '/properties/foaf:isPrimaryTopicOf/properties/dct:modified': ('range_modified', 'range_modified', 'date'),
+    '/properties/dct:temporal/properties/time:hasBeginning': ('range_beginning', 'range_beginning', 'date'),
+    '/properties/dct:temporal/properties/time:hasEnd': ('range_end', 'range_end', 'date'),
+    '/properties/dcat:distribution/items/properties/dcat:byteSize':
+        ('range_byte_size_min', 'range_byte_size_max', 'integer'),
+}
+
+_RANGE_OPERATORS = {'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}
 
 SEARCH_VECTOR = "SETWEIGHT(TO_TSVECTOR('simple', ${:d}), 'A') || SETWEIGHT(TO_TSVECTOR('simple', ${:d}), 'B') || \
 SETWEIGHT(TO_TSVECTOR('simple', ${:d}), 'C') || SETWEIGHT(TO_TSVECTOR('simple', ${:d}), 'D')"
+# Same, but stemmed with the text search configuration of the document's language
+STEMMED_SEARCH_VECTOR = "SETWEIGHT(TO_TSVECTOR(${4:d}::regconfig, ${0:d}), 'A') || \
+SETWEIGHT(TO_TSVECTOR(${4:d}::regconfig, ${1:d}), 'B') || \
+SETWEIGHT(TO_TSVECTOR(${4:d}::regconfig, ${2:d}), 'C') || \
+SETWEIGHT(TO_TSVECTOR(${4:d}::regconfig, ${3:d}), 'D')"
+# Same as SEARCH_VECTOR and STEMMED_SEARCH_VECTOR, for updates: the stored
+# part of the vector of each weight whose text is NULL is kept.
+UPDATE_SEARCH_VECTOR = "COALESCE(SETWEIGHT(TO_TSVECTOR('simple', ${0:d}), 'A'), ts_filter(searchable_text, '{{a}}')) || \
+COALESCE(SETWEIGHT(TO_TSVECTOR('simple', ${1:d}), 'B'), ts_filter(searchable_text, '{{b}}')) || \
+COALESCE(SETWEIGHT(TO_TSVECTOR('simple', ${2:d}), 'C'), ts_filter(searchable_text, '{{c}}')) || \
+COALESCE(SETWEIGHT(TO_TSVECTOR('simple', ${3:d}), 'D'), ts_filter(searchable_text, '{{d}}'))"
+UPDATE_STEMMED_SEARCH_VECTOR = "COALESCE(SETWEIGHT(TO_TSVECTOR(${4:d}::regconfig, ${0:d}), 'A'), \
+ts_filter(searchable_text_stemmed, '{{a}}')) || \
+COALESCE(SETWEIGHT(TO_TSVECTOR(${4:d}::regconfig, ${1:d}), 'B'), ts_filter(searchable_text_stemmed, '{{b}}')) || \
+COALESCE(SETWEIGHT(TO_TSVECTOR(${4:d}::regconfig, ${2:d}), 'C'), ts_filter(searchable_text_stemmed, '{{c}}')) || \
+COALESCE(SETWEIGHT(TO_TSVECTOR(${4:d}::regconfig, ${3:d}), 'D'), ts_filter(searchable_text_stemmed, '{{d}}'))"
 _Q_HEALTHCHECK = 'SELECT 1'
+# One notification per change, numbered in order, see notify().
+_Q_NOTIFY = '''
+SELECT pg_notify('channel', json_build_object(
+    'operation', operation, 'id', id, 'old_etag', old_etag, 'new_etag', new_etag,
+    'change_number', nextval('dataset_change_number')
+)::text)
+FROM unnest($1::text[], $2::text[], $3::text[], $4::text[]) AS c(operation, id, old_etag, new_etag)
+'''
+_Q_TS_CONFIGS = 'SELECT cfgname FROM pg_ts_config'
+# Key of the advisory lock of the startup actions.
+_STARTUP_ACTIONS_LOCK_KEY = 0x64636175
+_Q_TRY_LOCK = 'SELECT pg_try_advisory_lock($1)'
+_Q_UNLOCK = 'SELECT pg_advisory_unlock($1)'
 _Q_RETRIEVE_DOC = 'SELECT doc, etag FROM "dataset" WHERE id = $1'
-_Q_INSERT_DOC = 'INSERT INTO "dataset" (id, doc, searchable_text, lang, etag) VALUES ($1, $2, ' + \
-                   SEARCH_VECTOR.format(3, 4, 5, 6) + ', $7, $8)'
-_Q_UPDATE_DOC = 'UPDATE "dataset" SET doc=$1, searchable_text=' + \
-                   SEARCH_VECTOR.format(2, 3, 4, 5) + ', etag=$6 WHERE id=$7 AND etag=ANY($8) RETURNING id'
+_Q_RETRIEVE_DOCS = 'SELECT id, doc, etag FROM "dataset" WHERE id = ANY($1)'
+_Q_RETRIEVE_ETAGS = 'SELECT id, etag FROM "dataset"'
+# Documents are written as the text their etag is computed from (see
+# storage_create()), instead of being serialized once more by the jsonb codec.
+_Q_INSERT_DOC = 'INSERT INTO "dataset" (id, doc, searchable_text, lang, etag, ' \
+                'sort_modified, sort_title, sort_issued, ' \
+                'filter_status, filter_owner, filter_language, ' \
+                'range_modified, range_beginning, range_end, range_byte_size_min, range_byte_size_max, ' \
+                'searchable_text_stemmed) ' \
+                'VALUES ($1, $2::text::jsonb, ' + SEARCH_VECTOR.format(3, 4, 5, 6) + \
+                ', $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $19, ' + \
+                STEMMED_SEARCH_VECTOR.format(3, 4, 5, 6, 20) + ')'
+_UPDATE_DOC_SET = 'doc=$1::text::jsonb, searchable_text=' + \
+                  UPDATE_SEARCH_VECTOR.format(2, 3, 4, 5) + ', etag=$6, ' \
+                  'lang=$20, searchable_text_stemmed=' + \
+                  UPDATE_STEMMED_SEARCH_VECTOR.format(2, 3, 4, 5, 21) + ', ' \
+                  'sort_modified=$9, sort_title=$10, sort_issued=$11, ' \
+                  'filter_status=$12, filter_owner=$13, filter_language=$14, ' \
+                  'range_modified=$15, range_beginning=$16, range_end=$17, ' \
+                  'range_byte_size_min=$18, range_byte_size_max=$19, ' \
+                  'txid=txid_current()'
+_Q_UPDATE_DOC = 'UPDATE "dataset" SET ' + _UPDATE_DOC_SET + \
+                ' WHERE id=$7 AND etag=ANY($8) RETURNING id'
+# Same, and replaces the document's facet values ($22 to $24, see
+# _facet_args()), in a single statement. The stored row is locked first, so
+# that the result tells why nothing was updated: there's no row if the
+# document doesn't exist, and updated is false if its etag doesn't match.
+# Facet values that are gone are deleted and the others are upserted, so the
+# two never touch the same row.
+_Q_UPDATE_DOC_AND_FACETS = '''
+WITH old AS (
+    SELECT id, etag FROM "dataset" WHERE id = $7 FOR UPDATE
+), updated AS (
+    UPDATE "dataset" SET ''' + _UPDATE_DOC_SET + '''
+    FROM old WHERE "dataset".id = old.id AND old.etag = ANY($8)
+    RETURNING "dataset".id
+), deleted_facets AS (
+    DELETE FROM "dataset_facet" WHERE dataset_id IN (SELECT id FROM updated)
+    AND (facet, value) NOT IN (SELECT * FROM unnest($22::varchar[], $23::text[]))
+), stored_facets AS (
+    INSERT INTO "dataset_facet" (dataset_id, facet, value, count)
+    SELECT updated.id, f.* FROM updated, unnest($22::varchar[], $23::text[], $24::integer[]) AS f
+    ON CONFLICT (dataset_id, facet, value) DO UPDATE SET count = EXCLUDED.count
+)
+SELECT old.etag, EXISTS (SELECT 1 FROM updated) AS updated FROM old
+'''
+# Documents created by storage_create_many() are first copied into this
+# table, in the order of the arguments of _Q_INSERT_DOC.
+_Q_CREATE_IMPORT_TABLE = '''
+CREATE TEMPORARY TABLE "dataset_import" (
+    "id" character varying(254),
+    "doc" text,
+    "text_a" text,
+    "text_b" text,
+    "text_c" text,
+    "text_d" text,
+    "lang" character varying(20),
+    "etag" character varying(254),
+    "sort_modified" date,
+    "sort_title" text,
+    "sort_issued" date,
+    "filter_status" text,
+    "filter_owner" text,
+    "filter_language" text,
+    "range_modified" date,
+    "range_beginning" date,
+    "range_end" date,
+    "range_byte_size_min" bigint,
+    "range_byte_size_max" bigint,
+    "ts_config" text
+) ON COMMIT DROP
+'''
+_Q_IMPORT_DOCS = '''
+INSERT INTO "dataset" (id, doc, searchable_text, lang, etag,
+    sort_modified, sort_title, sort_issued,
+    filter_status, filter_owner, filter_language,
+    range_modified, range_beginning, range_end, range_byte_size_min, range_byte_size_max,
+    searchable_text_stemmed)
+SELECT id, doc::jsonb,
+    SETWEIGHT(TO_TSVECTOR('simple', text_a), 'A') || SETWEIGHT(TO_TSVECTOR('simple', text_b), 'B') ||
+    SETWEIGHT(TO_TSVECTOR('simple', text_c), 'C') || SETWEIGHT(TO_TSVECTOR('simple', text_d), 'D'),
+    lang, etag,
+    sort_modified, sort_title, sort_issued,
+    filter_status, filter_owner, filter_language,
+    range_modified, range_beginning, range_end, range_byte_size_min, range_byte_size_max,
+    SETWEIGHT(TO_TSVECTOR(ts_config::regconfig, text_a), 'A') ||
+    SETWEIGHT(TO_TSVECTOR(ts_config::regconfig, text_b), 'B') ||
+    SETWEIGHT(TO_TSVECTOR(ts_config::regconfig, text_c), 'C') ||
+    SETWEIGHT(TO_TSVECTOR(ts_config::regconfig, text_d), 'D')
+FROM "dataset_import"
+ON CONFLICT (id) DO NOTHING
+RETURNING id
+'''
 
-_Q_DELETE_DOC = 'DELETE FROM "dataset" WHERE id=$1 AND etag=ANY($2) RETURNING id'
+# Deleted documents leave a tombstone, for the change feed (see
+# storage_changes()).
+# Like _Q_UPDATE_DOC_AND_FACETS, tells why nothing was deleted.
+_Q_DELETE_DOC = '''
+WITH old AS (
+    SELECT id, etag FROM "dataset" WHERE id = $1 FOR UPDATE
+), deleted AS (
+    DELETE FROM "dataset" USING old WHERE "dataset".id = old.id AND old.etag = ANY($2)
+    RETURNING "dataset".id
+), tombstone AS (
+    INSERT INTO "dataset_tombstone" (id) SELECT id FROM deleted
+    ON CONFLICT (id) DO UPDATE SET txid = EXCLUDED.txid
+)
+SELECT old.etag, EXISTS (SELECT 1 FROM deleted) AS deleted FROM old
+'''
+_Q_INSERT_TOMBSTONE = '''
+INSERT INTO "dataset_tombstone" (id) VALUES ($1)
+ON CONFLICT (id) DO UPDATE SET txid = EXCLUDED.txid
+'''
+# Every write stores the id of its transaction in column txid, and the changes
+# are ordered by it. Only changes by transactions older than the oldest one
+# still in progress are returned: all later changes will get a higher txid,
+# so a client that continues after the last change it got misses none. The
+# changes of a transaction are ordered by id, so that a client can also
+# continue after change $3 of transaction $1.
+_Q_CHANGES = '''
+SELECT txid, id, doc, etag FROM (
+    SELECT txid, id, doc, etag FROM "dataset"
+    WHERE {after} AND txid < txid_snapshot_xmin(txid_current_snapshot())
+    UNION ALL
+    SELECT txid, id, NULL, NULL FROM "dataset_tombstone"
+    WHERE {after} AND txid < txid_snapshot_xmin(txid_current_snapshot())
+) changes
+ORDER BY txid, id
+LIMIT $2
+'''
+_Q_CHANGES_AFTER_TXID = 'txid > $1'
+_Q_CHANGES_AFTER_ID = '(txid, id) > ($1, $3)'
+_Q_DELETE_FACETS_MANY = 'DELETE FROM "dataset_facet" WHERE dataset_id = ANY($1)'
+_Q_INSERT_FACETS = 'INSERT INTO "dataset_facet" (dataset_id, facet, value, count) ' \
+                   'SELECT $1, * FROM unnest($2::varchar[], $3::text[], $4::integer[])'
 _Q_RETRIEVE_ALL_DOCS = 'SELECT doc FROM "dataset"'
+_Q_EXTRACT_VALUES = 'SELECT {distinct} {expression} AS value FROM "dataset"{froms} ' \
+                    'WHERE {expression} IS NOT NULL'
+_Q_EXTRACT_FACET_VALUES = 'SELECT DISTINCT value FROM "dataset_facet" WHERE facet = $1'
+_Q_RETRIEVE_RENDERED = """
+SELECT d.etag, r.rendered
+FROM "dataset" d
+LEFT JOIN "dataset_render" r ON r.dataset_id = d.id AND r.etag = d.etag AND r.version = $2
+WHERE d.id = $1
+"""
+_Q_STORE_RENDERED = """
+INSERT INTO "dataset_render" (dataset_id, etag, version, rendered)
+SELECT id, etag, $3, $4 FROM "dataset" WHERE id = $1 AND etag = $2
+ON CONFLICT (dataset_id) DO UPDATE
+SET etag = EXCLUDED.etag, version = EXCLUDED.version, rendered = EXCLUDED.rendered
+"""
+_Q_DELETE_RENDERED = 'DELETE FROM "dataset_render" WHERE dataset_id = $1'
+_Q_STORE_SUMMARY = """
+INSERT INTO "dataset_summary" (dataset_id, etag, version, summary)
+SELECT id, etag, $3, $4 FROM "dataset" WHERE id = $1 AND etag = $2
+ON CONFLICT (dataset_id) DO UPDATE
+SET etag = EXCLUDED.etag, version = EXCLUDED.version, summary = EXCLUDED.summary
+"""
+_Q_DELETE_SUMMARY = 'DELETE FROM "dataset_summary" WHERE dataset_id = $1'
 _Q_SEARCH_DOCS = """
-SELECT id, doc, 2 * ts_rank_cd(searchable_text, fullmatch_query) + ts_rank_cd(searchable_text, prefix_query) AS rank
-FROM "dataset", to_tsquery('simple', $1) prefix_query, to_tsquery('simple', $2) fullmatch_query
-WHERE (''=$1::varchar OR searchable_text @@ prefix_query) {filters}
-ORDER BY rank DESC;
+SELECT id, {columns}, rank AS sortvalue
+FROM (
+    SELECT id, etag, doc, rank
+    FROM (
+        SELECT id, etag, doc, 2 * ts_rank_cd(searchable_text, fullmatch_query) + ts_rank_cd(searchable_text, prefix_query)
+                        + ts_rank_cd(searchable_text_stemmed, stemmed_query) AS rank
+        FROM "dataset", to_tsquery('simple', $1) prefix_query, to_tsquery('simple', $2) fullmatch_query,
+            to_tsquery($6::regconfig, $1) stemmed_query
+        WHERE (''=$1::varchar OR searchable_text @@ prefix_query OR searchable_text_stemmed @@ stemmed_query) {filters}
+    ) ranked
+    WHERE TRUE {seek}
+    LIMIT $5
+) "dataset" {join}
+ORDER BY rank DESC, id
+LIMIT $3 OFFSET $4;
+"""
+_Q_SEARCH_SEEK = 'AND rank <= $7 AND (rank < $7 OR id > $8)'
+
+_Q_COUNT_SEARCH_DOCS = """
+SELECT count(*)
+FROM "dataset", to_tsquery('simple', $1) prefix_query, to_tsquery($2::regconfig, $1) stemmed_query
+WHERE (''=$1::varchar OR searchable_text @@ prefix_query OR searchable_text_stemmed @@ stemmed_query) {filters};
 """
 
 
 _Q_LIST_DOCS = """
-SELECT id, doc
+SELECT id, {columns}, {sortexpression} AS sortvalue
+FROM "dataset" {join}
+WHERE ('simple'=$1::varchar OR lang=$1::varchar) {filters} {seek}
+ORDER BY {sortexpression} DESC, id
+LIMIT $2 OFFSET $3;
+"""
+_Q_LIST_SEEK = 'AND {sortexpression} <= $4 AND ({sortexpression} < $4 OR id > $5)'
+
+# Columns and join to select the summary stored by storage_store_summary()
+# instead of the document, if there is a current one.
+_Q_SUMMARY_COLUMNS = 's.summary, CASE WHEN s.summary IS NULL THEN doc END AS doc, "dataset".etag'
+_Q_SUMMARY_JOIN = 'LEFT JOIN "dataset_summary" s ON s.dataset_id = "dataset".id ' \
+                  'AND s.etag = "dataset".etag AND s.version = ${:d}'
+
+_Q_COUNT_LIST_DOCS = """
+SELECT count(*)
 FROM "dataset"
+WHERE ('simple'=$1::varchar OR lang=$1::varchar) {filters};
+"""
+
+_Q_FACET_SEARCH_DOCS = """
+SELECT f.facet, f.value, sum(f.count) AS count
+FROM "dataset", to_tsquery('simple', $1) prefix_query, to_tsquery($2::regconfig, $1) stemmed_query,
+    LATERAL ({facets}) f
+WHERE (''=$1::varchar OR searchable_text @@ prefix_query OR searchable_text_stemmed @@ stemmed_query) {filters}
+GROUP BY f.facet, f.value
+ORDER BY count DESC, f.value;
+"""
+
+_Q_FACET_LIST_DOCS = """
+SELECT f.facet, f.value, sum(f.count) AS count
+FROM "dataset", LATERAL ({facets}) f
 WHERE ('simple'=$1::varchar OR lang=$1::varchar) {filters}
-ORDER BY {sortexpression} DESC;
+GROUP BY f.facet, f.value
+ORDER BY count DESC, f.value;
 """
 
-_Q_CREATE_STARTUP_ACTIONS = '''
-CREATE TABLE IF NOT EXISTS "dcatd_startup_actions" (
-    id SERIAL PRIMARY KEY,
-    action character varying(255) NOT NULL,
-    applied TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-);
-'''
+
+class _Connection(asyncpg.connection.Connection):
+    """Connection that keeps track of the search statements it has prepared.
+
+    asyncpg prepares every statement executed through the connection once and
+    keeps it in a per-connection LRU cache of ``statement_cache_size``
+    statements. Since search statements only depend on the shape of the
+    filters, each shape is planned once per connection. This class mirrors
+    that cache for search statements, to count its hits and misses.
+
+    """
+    __slots__ = ('_search_statements',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._search_statements = collections.OrderedDict()
+
+    def count_search_statement(self, query: str) -> None:
+        if query in self._search_statements:
+            statement_cache_stats['hits'] += 1
+            self._search_statements.move_to_end(query)
+            return
+        statement_cache_stats['misses'] += 1
+        self._search_statements[query] = None
+        if len(self._search_statements) > _STATEMENT_CACHE_SIZE:
+            self._search_statements.popitem(last=False)
+
+
+class _EtagIndex:
+    """Current etag by document id, so that conditional requests can be
+    answered without fetching the document.
+
+    The index is loaded when we start listening for notifications, and kept
+    current by the changes the application publishes (see
+    :meth:`datacatalog.application.Application.subscribe`). While it's being
+    loaded, or after we may have missed a change, it's reloaded and doesn't
+    know any etags in the meantime.
+
+    """
+    __slots__ = ('_etags', '_pending', '_generation', '_pool', '_loader')
+
+    def __init__(self, pool: asyncpg.pool.Pool):
+        self._etags = None
+        # changes published while the index is being loaded
+        self._pending = None
+        self._generation = 0
+        self._pool = pool
+        self._loader = None
+
+    def clear(self) -> None:
+        self._etags = None
+        self._pending = None
+        # loads in progress are stale
+        self._generation += 1
+
+    async def load(self) -> None:
+        self.clear()
+        generation = self._generation
+        pending = self._pending = []
+        rows = await self._pool.fetch(_Q_RETRIEVE_ETAGS)
+        if generation != self._generation:
+            return
+        etags = {row['id']: row['etag'] for row in rows}
+        # changes committed after our snapshot may have been published already
+        for change in pending:
+            self._apply(etags, change)
+        self._etags = etags
+        self._pending = None
+
+    def on_change(self, change: T.Optional[dict]) -> None:
+        if change is None:
+            # we may have missed a change
+            self.clear()
+            self._loader = asyncio.ensure_future(self.load())
+        elif self._pending is not None:
+            self._pending.append(change)
+        elif self._etags is not None:
+            self._apply(self._etags, change)
+
+    @staticmethod
+    def _apply(etags: T.Dict[str, str], change: dict) -> None:
+        if change['operation'] == 'delete':
+            etags.pop(change['id'], None)
+        else:
+            etags[change['id']] = change['new_etag']
+
+    def get(self, docid: str) -> T.Optional[str]:
+        """The current etag of the document, or None if unknown."""
+        if self._etags is None:
+            return None
+        return self._etags.get(docid)
+
+    def close(self) -> None:
+        self.clear()
+        if self._loader is not None:
+            self._loader.cancel()
+
+
+async def _init_connection(con: asyncpg.connection.Connection) -> None:
+    """Decode and encode jsonb values with the configured codec, instead of
+    passing them as text."""
+    encoder, decoder = _jsonb_codec
+    await con.set_type_codec('jsonb', encoder=encoder, decoder=decoder,
+                             schema='pg_catalog')
 
 
 @_hookimpl
@@ -90,9 +508,13 @@ async def initialize(app):
     """ Initialize the plugin.
 
     This function validates the configuration and creates a connection pool.
-    The pool is stored as a module-scoped singleton in app['pool'].
+    The pool is stored as a module-scoped singleton in app['pool'], the pools
+    of the configured read replicas in app['replica_pools'].
 
     """
+    global _ts_configs
+    global _jsonb_codec
+    global _statement_timeout
 
     if app.get('pool') is not None:
         # Not failing hard because not sure whether initializing twice is allowed
@@ -111,6 +533,11 @@ async def initialize(app):
     max_pool_size = dbconf.get('max_pool_size', _DEFAULT_MAX_POOL_SIZE)
     max_inactive_conn_lifetime = dbconf.get(
         'max_inactive_connection_lifetime', _DEFAULT_MAX_INACTIVE_CONNECTION_LIFETIME)
+    jsonb_codec = dbconf.get('jsonb_codec', _DEFAULT_JSONB_CODEC)
+    if jsonb_codec not in JSONB_CODECS:
+        raise ValueError('jsonb codec {} is not available'.format(jsonb_codec))
+    _jsonb_codec = JSONB_CODECS[jsonb_codec]
+    _statement_timeout = dbconf.get('statement_timeout')
 
     password = dbconf['pass']
     if os.getenv("DATABASE_PW_LOCATION", False):
@@ -120,20 +547,24 @@ async def initialize(app):
     _logger.info("Connecting to database: postgres://%s:%i/%s",
                  dbconf['host'], dbconf['port'], dbconf['name'])
 
+    pool_args = dict(
+        user=dbconf['user'],
+        database=dbconf['name'],
+        host=dbconf['host'],
+        port=dbconf['port'],
+        password=password,
+        timeout=conn_timeout,
+        min_size=min_pool_size,
+        max_size=max_pool_size,
+        max_inactive_connection_lifetime=max_inactive_conn_lifetime,
+        statement_cache_size=_STATEMENT_CACHE_SIZE,
+        connection_class=_Connection,
+        init=_init_connection
+    )
     connect_attempt_tries_left = CONNECT_ATTEMPT_MAX_TRIES - 1
     while connect_attempt_tries_left >= 0:
         try:
-            app['pool'] = await asyncpg.create_pool(
-                user=dbconf['user'],
-                database=dbconf['name'],
-                host=dbconf['host'],
-                port=dbconf['port'],
-                password=password,
-                timeout=conn_timeout,
-                min_size=min_pool_size,
-                max_size=max_pool_size,
-                max_inactive_connection_lifetime=max_inactive_conn_lifetime
-            )
+            app['pool'] = await asyncpg.create_pool(**pool_args)
         except ConnectionRefusedError:
             if connect_attempt_tries_left > 0:
                 _logger.warning("Database not accepting connections. Retrying %d more times.", connect_attempt_tries_left)
@@ -146,8 +577,7 @@ async def initialize(app):
             break
     while connect_attempt_tries_left >= 0 and dbconf.get('mode', 'READWRITE') != "READONLY":
         try:
-            await app['pool'].execute(_Q_CREATE)
-            await app['pool'].execute(_Q_CREATE_STARTUP_ACTIONS)
+            await migrations.migrate(app['pool'])
         except ConnectionRefusedError:
             if connect_attempt_tries_left > 0:
                 _logger.warning("Database not accepting connections. Retrying %d more times.", connect_attempt_tries_left)
@@ -159,6 +589,24 @@ async def initialize(app):
         else:
             break
 
+    app['replica_pools'] = []
+    for replica in dbconf.get('replicas', []):
+        replica_args = dict(
+            pool_args,
+            host=replica['host'],
+            port=replica.get('port', dbconf['port']),
+            database=replica.get('name', dbconf['name']),
+            user=replica.get('user', dbconf['user']),
+            password=replica.get('pass', password)
+        )
+        _logger.info("Connecting to replica: postgres://%s:%i/%s",
+                     replica_args['host'], replica_args['port'], replica_args['database'])
+        app['replica_pools'].append(await asyncpg.create_pool(**replica_args))
+
+    _ts_configs = {
+        row['cfgname'] for row in await app['pool'].fetch(_Q_TS_CONFIGS)
+    }
+
     _logger.info("Successfully connected to postgres.")
 
 
@@ -168,10 +616,24 @@ async def deinitialize(app, remove_listener=True):
     """ Deinitialize the plugin."""
     global _listen_conn
     global _listen_callback
-
+    global _etag_index
+    global _startup_actions_conn
+
+    if _etag_index is not None:
+        _etag_index.close()
+        _etag_index = None
+        app.unsubscribe(_on_change)
+    if _startup_actions_conn is not None:
+        # the pool resets the connection, which releases the lock
+        await app['pool'].release(_startup_actions_conn)
+        _startup_actions_conn = None
     if remove_listener and _listen_conn  and not _listen_conn.is_closed():
          await _listen_conn.remove_listener('channel', _listen_callback)
          await _listen_conn.close()
+         _listen_conn = None
+    for pool in app.get('replica_pools', []):
+        await pool.close()
+    app['replica_pools'] = []
     await app['pool'].close()
     del app['pool']
 
@@ -188,10 +650,27 @@ async def health_check(app: T.Mapping[str, T.Any]) -> T.Optional[str]:
     """
     if (await app['pool'].fetchval(_Q_HEALTHCHECK)) != 1:
         return 'Postgres connection problem'
+    for pool in app.get('replica_pools', []):
+        if (await pool.fetchval(_Q_HEALTHCHECK)) != 1:
+            return 'Postgres replica connection problem'
+
+
+@_hookimpl
+async def system_stats(app: T.Mapping[str, T.Any]) -> dict:
+    # language=rst
+    """ Counters of this process.
+
+    :param app: the `~datacatalog.application.Application`
+    :returns: the hits and misses of the prepared statement caches, under
+        ``statement_cache``.
+
+    """
+    return {'statement_cache': dict(statement_cache_stats)}
 
 
 @_hookimpl
-async def storage_retrieve(app: T.Mapping[str, T.Any], docid: str, etags: T.Optional[T.Set[str]] = None) \
+async def storage_retrieve(app: T.Mapping[str, T.Any], docid: str, etags: T.Optional[T.Set[str]] = None,
+                           primary: bool = False) \
         -> T.Tuple[T.Optional[dict], str]:
     # language=rst
     """ Get document and corresponsing etag by id.
@@ -199,6 +678,7 @@ async def storage_retrieve(app: T.Mapping[str, T.Any], docid: str, etags: T.Opti
     :param app: the `~datacatalog.application.Application`
     :param docid: document id
     :param etags: None, or a set of Etags
+    :param primary: whether to read from the primary instead of a replica
     :returns:
         A tuple. The first element is either the document or None if the
         document's Etag corresponds to one of the given etags. The second
@@ -206,12 +686,130 @@ async def storage_retrieve(app: T.Mapping[str, T.Any], docid: str, etags: T.Opti
     :raises KeyError: if not found
 
     """
-    record = await app['pool'].fetchrow(_Q_RETRIEVE_DOC, docid)
+    if primary:
+        record = await app['pool'].fetchrow(_Q_RETRIEVE_DOC, docid)
+    else:
+        etag = _indexed_etag(docid, etags)
+        if etag is not None:
+            return None, etag
+        record = await _fetch_current(app, etags, _Q_RETRIEVE_DOC, docid)
     if record is None:
         raise KeyError()
     if etags and conditional.match_etags(record['etag'], etags, True):
         return None, record['etag']
-    return json.loads(record['doc']), record['etag']
+    return record['doc'], record['etag']
+
+
+@_hookimpl
+async def storage_retrieve_many(app: T.Mapping[str, T.Any], docids: T.Iterable[str]) \
+        -> T.Dict[str, T.Tuple[dict, str]]:
+    # language=rst
+    """ Get documents and corresponding etags by id.
+
+    See :func:`datacatalog.plugin_interfaces.storage_retrieve_many`
+
+    """
+    return {
+        record['id']: (record['doc'], record['etag'])
+        for record in await app['pool'].fetch(_Q_RETRIEVE_DOCS, list(docids))
+    }
+
+
+@_hookimpl
+async def storage_retrieve_rendered(app: T.Mapping[str, T.Any], docid: str, version: str,
+                                    etags: T.Optional[T.Set[str]] = None) \
+        -> T.Tuple[T.Optional[bytes], str]:
+    # language=rst
+    """ Get the stored read representation of a document and its etag by id.
+
+    See :func:`datacatalog.plugin_interfaces.storage_retrieve_rendered`
+
+    """
+    etag = _indexed_etag(docid, etags)
+    if etag is not None:
+        return None, etag
+    record = await _fetch_current(app, etags, _Q_RETRIEVE_RENDERED, docid, version)
+    if record is None:
+        raise KeyError()
+    return record['rendered'], record['etag']
+
+
+def _read_pool(app: T.Mapping[str, T.Any]) -> asyncpg.pool.Pool:
+    """The pool to read from.
+
+    That's the pool of the read replica with the fewest connections in use,
+    taking replicas with the same number in turn, or the primary pool if
+    there are no replicas.
+
+    """
+    pools = app.get('replica_pools')
+    if not pools:
+        return app['pool']
+    start = next(_replica_counter) % len(pools)
+    return min(pools[start:] + pools[:start],
+               key=lambda pool: pool.get_size() - pool.get_idle_size())
+
+
+def _indexed_etag(docid: str, etags: T.Optional[T.Set[str]]) -> T.Optional[str]:
+    """The current etag of a document according to the etag index, if it's
+    one of the given etags.
+
+    Only as long as we listen for notifications, because otherwise the index
+    isn't kept current.
+
+    :returns: the etag, or None if it doesn't match or isn't known.
+
+    """
+    if not etags or _etag_index is None or _listen_conn is None or _listen_conn.is_closed():
+        return None
+    etag = _etag_index.get(docid)
+    if etag is None or not conditional.match_etags(etag, etags, True):
+        return None
+    return etag
+
+
+async def _fetch_current(app: T.Mapping[str, T.Any], etags: T.Optional[T.Set[str]],
+                         query: str, docid: str, *args) -> T.Optional[asyncpg.Record]:
+    """Fetch the row of a document with column ``etag`` from a replica.
+
+    Replicas may lag behind the primary. If the replica doesn't have the
+    document, or the client knows an etag the replica doesn't, the row is
+    fetched from the primary, so clients read their own writes.
+
+    """
+    pool = _read_pool(app)
+    record = await pool.fetchrow(query, docid, *args)
+    if pool is not app['pool'] and (
+            record is None or
+            etags and not conditional.match_etags(record['etag'], etags, True)):
+        record = await app['pool'].fetchrow(query, docid, *args)
+    return record
+
+
+@_hookimpl
+async def storage_store_rendered(app: T.Mapping[str, T.Any], docid: str, etag: str,
+                                 version: str, rendered: bytes) -> None:
+    # language=rst
+    """ Store the read representation of a document.
+
+    See :func:`datacatalog.plugin_interfaces.storage_store_rendered`
+
+    """
+    # Renderings of older versions of the document are never returned, because
+    # their etag doesn't match, and are replaced by the next rendering.
+    await app['pool'].execute(_Q_STORE_RENDERED, docid, etag, version, rendered)
+
+
+@_hookimpl
+async def storage_store_summary(app: T.Mapping[str, T.Any], docid: str, etag: str,
+                                version: str, summary: dict) -> None:
+    # language=rst
+    """ Store the summary of a document, as shown in listings.
+
+    See :func:`datacatalog.plugin_interfaces.storage_store_summary`
+
+    """
+    await app['pool'].execute(_Q_STORE_SUMMARY, docid, etag, version, summary)
 
 
 @_hookimpl
@@ -233,7 +831,9 @@ async def storage_create(app: T.Mapping[str, T.Any], docid: str, doc: dict, sear
     new_etag = _etag_from_str(new_doc)
     lang = _iso_639_1_code_to_pg(iso_639_1_code)
     try:
-        await app['pool'].execute(_Q_INSERT_DOC,
+        async with app['pool'].acquire() as con:
+            async with con.transaction():
+                await con.execute(_Q_INSERT_DOC,
                                   docid,
                                   new_doc,
                                   searchable_text.get('A', ''),
@@ -241,12 +841,81 @@ async def storage_create(app: T.Mapping[str, T.Any], docid: str, doc: dict, sear
                                   searchable_text.get('C', ''),
                                   searchable_text.get('D', ''),
                                   lang,
-                                  new_etag)
+                                  new_etag,
+                                  *_sort_values(doc),
+                                  *_filter_values(doc),
+                                  *_range_values(doc),
+                                  _to_pg_ts_config(lang))
+                await _store_facets(con, docid, doc)
     except asyncpg.exceptions.UniqueViolationError as e:
         raise KeyError from e
+    _invalidate_facet_cache()
     return new_etag
 
 
+@_hookimpl
+async def storage_create_many(
+        app: T.Mapping[str, T.Any],
+        docs: T.List[T.Tuple[str, dict, dict, T.Optional[str]]]) -> T.List[T.Optional[str]]:
+    # language=rst
+    """ Store many new documents in one transaction.
+
+    The documents are copied into a temporary table, and inserted from there
+    in a single statement.
+
+    See :func:`datacatalog.plugin_interfaces.storage_create_many`
+
+    """
+    records = []
+    etags = []
+    seen = set()
+    for docid, doc, searchable_text, iso_639_1_code in docs:
+        if docid in seen:
+            etags.append(None)
+            continue
+        seen.add(docid)
+        new_doc = json.dumps(doc, ensure_ascii=False, sort_keys=True)
+        new_etag = _etag_from_str(new_doc)
+        lang = _iso_639_1_code_to_pg(iso_639_1_code)
+        records.append((
+            docid,
+            new_doc,
+            searchable_text.get('A', ''),
+            searchable_text.get('B', ''),
+            searchable_text.get('C', ''),
+            searchable_text.get('D', ''),
+            lang,
+            new_etag,
+            *_sort_values(doc),
+            *_filter_values(doc),
+            *_range_values(doc),
+            _to_pg_ts_config(lang)
+        ))
+        etags.append(new_etag)
+
+    async with app['pool'].acquire() as con:
+        async with con.transaction():
+            await con.execute(_Q_CREATE_IMPORT_TABLE)
+            await con.copy_records_to_table('dataset_import', records=records)
+            created = {row['id'] for row in await con.fetch(_Q_IMPORT_DOCS)}
+            etags = [
+                etag if docid in created else None
+                for (docid, _doc, _text, _lang), etag in zip(docs, etags)
+            ]
+            facets = [
+                (docid, facet, value, count)
+                for (docid, doc, _text, _lang), etag in zip(docs, etags)
+                if etag is not None
+                for (facet, value), count in _facet_counts(doc).items()
+            ]
+            await con.copy_records_to_table(
+                'dataset_facet', records=facets,
+                columns=('dataset_id', 'facet', 'value', 'count'))
+    if len(created) > 0:
+        _invalidate_facet_cache()
+    return etags
+
+
 @_hookimpl
 async def storage_update(app: T.Mapping[str, T.Any], docid: str, doc: dict, searchable_text: dict,
                          etags: T.Set[str], iso_639_1_code: T.Optional[str]) \
@@ -265,44 +934,241 @@ async def storage_update(app: T.Mapping[str, T.Any], docid: str, doc: dict, sear
     :raises: ValueError if none of the given etags match the stored etag.
     :raises: KeyError if the docid doesn't exist.
     """
-    new_doc = json.dumps(doc, ensure_ascii=False, sort_keys=True)
-    new_etag = _etag_from_str(new_doc)
-    if (await app['pool'].fetchval(_Q_UPDATE_DOC,
-                                   new_doc,
-                                   searchable_text.get('A', ''),
-                                   searchable_text.get('B', ''),
-                                   searchable_text.get('C', ''),
-                                   searchable_text.get('D', ''),
-                                   new_etag,
-                                   docid,
-                                   list(etags))) is None:
+    new_etag, args = _update_args(docid, doc, searchable_text, etags, iso_639_1_code)
+    # a single statement, so no transaction is needed
+    result = await app['pool'].fetchrow(_Q_UPDATE_DOC_AND_FACETS, *args, *_facet_args(doc))
+    if result is None:
+        raise KeyError()
+    if not result['updated']:
         raise ValueError
+    _invalidate_facet_cache()
     return new_etag
 
 
 @_hookimpl
-async def storage_delete(app: T.Mapping[str, T.Any], docid: str, etags: T.Set[str]) -> None:
+async def storage_update_many(
+        app: T.Mapping[str, T.Any],
+        docs: T.List[T.Tuple[str, dict, dict, T.Set[str], T.Optional[str]]]) -> T.List[T.Optional[str]]:
+    # language=rst
+    """ Update many documents in one transaction, each only if it has one of
+    the provided Etags.
+
+    See :func:`datacatalog.plugin_interfaces.storage_update_many`
+
+    """
+    new_etags = []
+    updated = {}
+    async with app['pool'].acquire() as con:
+        async with con.transaction():
+            statement = await con.prepare(_Q_UPDATE_DOC)
+            for docid, doc, searchable_text, etags, iso_639_1_code in docs:
+                new_etag, args = _update_args(docid, doc, searchable_text, etags, iso_639_1_code)
+                if (await statement.fetchval(*args)) is None:
+                    new_etags.append(None)
+                    continue
+                new_etags.append(new_etag)
+                updated[docid] = doc
+            if len(updated) > 0:
+                await con.execute(_Q_DELETE_FACETS_MANY, list(updated))
+                await con.copy_records_to_table(
+                    'dataset_facet', records=[
+                        (docid, facet, value, count)
+                        for docid, doc in updated.items()
+                        for (facet, value), count in _facet_counts(doc).items()
+                    ],
+                    columns=('dataset_id', 'facet', 'value', 'count'))
+    if len(updated) > 0:
+        _invalidate_facet_cache()
+    return new_etags
+
+
+def _update_args(docid: str, doc: dict, searchable_text: dict, etags: T.Set[str],
+                 iso_639_1_code: T.Optional[str]) -> T.Tuple[str, tuple]:
+    """The new etag of a document, and the arguments of :data:`_Q_UPDATE_DOC`
+    to store it."""
+    new_doc = json.dumps(doc, ensure_ascii=False, sort_keys=True)
+    new_etag = _etag_from_str(new_doc)
+    lang = _iso_639_1_code_to_pg(iso_639_1_code)
+    return new_etag, (
+        new_doc,
+        searchable_text.get('A'),
+        searchable_text.get('B'),
+        searchable_text.get('C'),
+        searchable_text.get('D'),
+        new_etag,
+        docid,
+        list(etags),
+        *_sort_values(doc),
+        *_filter_values(doc),
+        *_range_values(doc),
+        lang,
+        _to_pg_ts_config(lang)
+    )
+
+
+@_hookimpl
+async def storage_delete(app: T.Mapping[str, T.Any], docid: str, etags: T.Set[str]) -> str:
     # language=rst
     """ Delete document only if it has one of the provided Etags.
 
     :param app: the `~datacatalog.application.Application`
     :param docid: the ID of the document to delete.
     :param etags: the last known ETags of this document.
+    :returns: the ETag of the deleted document.
     :raises ValueError: if none of the given etags match the stored etag.
     :raises KeyError: if a document with the given id doesn't exist.
 
     """
-    if (await app['pool'].fetchval(_Q_DELETE_DOC, docid, etags)) is None:
-        # the operation may fail because either the id doesn't exist or the given
-        # etag doesn't match. There's no way to atomically check for both
-        # conditions at the same time, apart from a full table lock. However,
-        # all scenario's in which the below, not threat-safe way of identifying
-        # the cause of failure is not correct, are trivial.
-        #
-        # TODO: don't call storage_retrieve() directly, but through the plugin manager.
-        _, etag = await storage_retrieve(app, docid, etags)  # this may raise a KeyError
-        assert etag not in etags
+    result = await app['pool'].fetchrow(_Q_DELETE_DOC, docid, etags)
+    if result is None:
+        raise KeyError()
+    if not result['deleted']:
         raise ValueError
+    # the document's facet values are removed by ON DELETE CASCADE
+    _invalidate_facet_cache()
+    return result['etag']
+
+
+def _facet_counts(doc: dict) -> T.Counter[T.Tuple[str, str]]:
+    """Number of occurrences of the values of all :data:`MATERIALIZED_FACETS`
+    in ``doc``, by facet and value."""
+    return collections.Counter(
+        (facet, value)
+        for facet, ptr_parts in MATERIALIZED_FACETS.items()
+        for value in _extract_values(doc, ptr_parts)
+        if isinstance(value, str)
+    )
+
+
+def _facet_args(doc: dict) -> T.Tuple[list, list, list]:
+    """The facets, values and counts of :func:`_facet_counts` as arrays, the
+    arguments of :data:`_Q_INSERT_FACETS`."""
+    counter = _facet_counts(doc)
+    return ([facet for facet, _value in counter],
+            [value for _facet, value in counter],
+            list(counter.values()))
+
+
+async def _store_facets(con, docid: str, doc: dict) -> None:
+    """Store the values of all :data:`MATERIALIZED_FACETS` in ``doc``."""
+    facets, values, counts = _facet_args(doc)
+    if len(facets) == 0:
+        return
+    await con.execute(_Q_INSERT_FACETS, docid, facets, values, counts)
+
+
+def _sort_values(doc: dict) -> list:
+    """Values of all :data:`SORT_COLUMNS` in ``doc``."""
+    values = []
+    for sortpath, (_column, column_type) in SORT_COLUMNS.items():
+        value = doc
+        for p in sortpath:
+            value = value.get(p) if isinstance(value, dict) else None
+        values.append(_to_sort_value(value, column_type))
+    return values
+
+
+def _to_sort_value(value: T.Any, column_type: str) -> T.Union[str, datetime.date]:
+    """Convert a document value into a value of a sort column.
+
+    Missing and invalid values are sorted last; dates become ``-infinity``
+    and strings become empty.
+
+    """
+    if column_type == 'date':
+        try:
+            return datetime.date.fromisoformat(value[:10])
+        except (TypeError, ValueError):
+            return datetime.date.min
+    return value if isinstance(value, str) else ''
+
+
+def _from_sort_value(value: T.Union[str, datetime.date]) -> str:
+    """Inverse of :func:`_to_sort_value`, used in cursors."""
+    if isinstance(value, datetime.date):
+        return '' if value == datetime.date.min else value.isoformat()
+    return value
+
+
+def _filter_values(doc: dict) -> list:
+    """Values of all :data:`FILTER_COLUMNS` in ``doc``.
+
+    Only strings are stored; other values can only be found through the
+    document itself.
+
+    """
+    values = []
+    for ptr in FILTER_COLUMNS:
+        value = next(_extract_values(doc, jsonpointer.JsonPointer(ptr).parts), None)
+        values.append(value if isinstance(value, str) else None)
+    return values
+
+
+def _range_values(doc: dict) -> list:
+    """Values of all :data:`RANGE_COLUMNS` in ``doc``, except those that are
+    also sort columns, see :func:`_sort_values`."""
+    values = []
+    for ptr, (lower_column, upper_column, column_type) in RANGE_COLUMNS.items():
+        if lower_column.startswith('sort_'):
+            continue
+        found = [
+            value for value in (
+                _to_range_value(elm, column_type)
+                for elm in _extract_values(doc, jsonpointer.JsonPointer(ptr).parts)
+            ) if value is not None
+        ]
+        values.append(min(found) if len(found) > 0 else None)
+        if upper_column != lower_column:
+            values.append(max(found) if len(found) > 0 else None)
+    return values
+
+
+def _to_range_value(value: T.Any, column_type: str) -> T.Union[None, int, datetime.date]:
+    """Convert a document or filter value into a value of a range column.
+
+    :returns: the value, or None if it isn't a valid date or integer.
+
+    """
+    if column_type == 'date':
+        try:
+            return datetime.date.fromisoformat(value[:10])
+        except (TypeError, ValueError):
+            return None
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def _invalidate_facet_cache() -> None:
+    global _facet_cache_generation
+    _facet_cache.clear()
+    _facet_cache_generation += 1
+
+
+def _facet_cache_key(q: str, lang: str, filters: T.Optional[dict]) -> T.Optional[tuple]:
+    """Key under which the facet counts of a listing are cached.
+
+    Only unfiltered and status-filtered listings are cached, and only as long
+    as we listen for notifications, because otherwise we wouldn't notice
+    changes made by other instances.
+
+    :returns: the key, or None if the facet counts shouldn't be cached.
+
+    """
+    if len(q) > 0 or _listen_conn is None or _listen_conn.is_closed():
+        return None
+    if filters is None:
+        filters = {}
+    if any(ptr != '/properties/ams:status' for ptr in filters):
+        return None
+    status_filter = filters.get('/properties/ams:status', {})
+    return lang, tuple(sorted(
+        (op, tuple(sorted(value)) if op == 'in' else value)
+        for op, value in status_filter.items()
+    ))
 
 
 def _extract_values(elm, ptr_parts, ptr_idx=0):
@@ -334,6 +1200,32 @@ def _extract_values(elm, ptr_parts, ptr_idx=0):
         raise ValueError('Element must be either list, object or end of pointer, not: ' + part)
 
 
+@_hookimpl
+async def storage_changes(app: T.Mapping[str, T.Any], since: int, limit: T.Optional[int]=None,
+                          since_id: T.Optional[str]=None) \
+        -> T.AsyncGenerator[T.Tuple[int, str, T.Optional[dict], T.Optional[str]], None]:
+    # language=rst
+    """ Changes to the stored documents.
+
+    The sequence number of a change is the id of the transaction that made
+    it, see :data:`_Q_CHANGES`.
+
+    See :func:`datacatalog.plugin_interfaces.storage_changes`
+
+    """
+    args = [since, limit]
+    if since_id is None:
+        query = _Q_CHANGES.format(after=_Q_CHANGES_AFTER_TXID)
+    else:
+        query = _Q_CHANGES.format(after=_Q_CHANGES_AFTER_ID)
+        args.append(since_id)
+    async with _read_pool(app).acquire() as con:
+        async with con.transaction():
+            # use a cursor so we can stream
+            async for row in con.cursor(query, *args, timeout=_statement_timeout):
+                yield row['txid'], row['id'], row['doc'], row['etag']
+
+
 @_hookimpl
 async def storage_extract(app: T.Mapping[str, T.Any], ptr: str, distinct: bool=False) -> T.Generator[str, None, None]:
     # language=rst
@@ -341,8 +1233,12 @@ async def storage_extract(app: T.Mapping[str, T.Any], ptr: str, distinct: bool=F
     distinct.
 
     Used to, for example, get a list of all tags or ids in the system. Or to
-    get all documents stored in the system. If distinct=True then the generator
-    will cache all values in a set, which may become prohibitively large.
+    get all documents stored in the system. Values are extracted, and made
+    distinct, by Postgres; distinct values of :data:`MATERIALIZED_FACETS`
+    are read from table ``dataset_facet``. Pointers that Postgres can't
+    follow are followed through every document by :func:`_extract_values`,
+    which only fails on documents that have a value where the pointer is
+    invalid.
 
     :param app: the `~datacatalog.application.Application`
     :param ptr: JSON pointer to the element.
@@ -351,11 +1247,11 @@ async def storage_extract(app: T.Mapping[str, T.Any], ptr: str, distinct: bool=F
     """
     # If the pointer is '/' we should return all documents
     if ptr == '/':
-        async with app['pool'].acquire() as con:
+        async with _read_pool(app).acquire() as con:
             async with con.transaction():
                 # use a cursor so we can stream
                 async for row in con.cursor(_Q_RETRIEVE_ALL_DOCS):
-                    yield json.loads(row['doc'])
+                    yield row['doc']
         return
 
     # Otherwise, return the values
@@ -363,19 +1259,42 @@ async def storage_extract(app: T.Mapping[str, T.Any], ptr: str, distinct: bool=F
         p = jsonpointer.JsonPointer(ptr)
     except jsonpointer.JsonPointerException:
         raise ValueError('Cannot parse pointer')
-    ptr_parts = p.parts
+    if distinct and ptr in MATERIALIZED_FACETS:
+        query, args = _Q_EXTRACT_FACET_VALUES, [ptr]
+    else:
+        args = []
+        try:
+            expr, froms = _to_pg_json_values_expression(p.parts, args)
+        except ValueError:
+            async for value in _walk_all_values(app, p.parts, distinct):
+                yield value
+            return
+        query = _Q_EXTRACT_VALUES.format(
+            distinct='DISTINCT' if distinct else '', expression=expr,
+            froms=''.join(', ' + f for f in froms))
+    async with _read_pool(app).acquire() as con:
+        async with con.transaction():
+            # use a cursor so we can stream
+            async for row in con.cursor(query, *args):
+                yield row['value']
 
-    cache = set()
-    async with app['pool'].acquire() as con:
+
+async def _walk_all_values(app: T.Mapping[str, T.Any], ptr_parts: T.List[str], distinct: bool):
+    """The values under a pointer in all documents, extracted by
+    :func:`_extract_values`."""
+    seen = set()
+    async with _read_pool(app).acquire() as con:
         async with con.transaction():
             # use a cursor so we can stream
             async for row in con.cursor(_Q_RETRIEVE_ALL_DOCS):
-                doc = json.loads(row['doc'])
-                for elm in _extract_values(doc, ptr_parts):
-                    if not distinct or elm not in cache:
-                        yield elm
-                        if distinct:
-                            cache.add(elm)
+                for value in _extract_values(row['doc'], ptr_parts):
+                    if distinct:
+                        # values may be objects or arrays, which aren't hashable
+                        key = json.dumps(value, sort_keys=True)
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                    yield value
 
 
 @_hookimpl
@@ -407,8 +1326,11 @@ async def search_search(
             T.Union[str, T.Set[str]]
         ]
     ]]=None,
-    iso_639_1_code: T.Optional[str]=None
-) -> T.AsyncGenerator[T.Tuple[str, dict], None]:
+    iso_639_1_code: T.Optional[str]=None,
+    cursor: T.Optional[str]=None,
+    max_candidates: T.Optional[int]=None,
+    summary_version: T.Optional[str]=None
+) -> T.AsyncGenerator[T.Tuple, None]:
     # language=rst
     """ Search
 
@@ -423,87 +1345,331 @@ async def search_search(
             facets = [(f, jsonpointer.JsonPointer(f)) for f in facets]
         except jsonpointer.JsonPointerException:
             raise ValueError('Cannot parse pointer')
-    # interpret the filters
-    filterexpr = _to_pg_json_filterexpression(filters)
     # interpret the language
     lang = _to_pg_lang(iso_639_1_code)
-    # init paging parameters
-    start, end = offset, offset+limit if limit is not None else float('inf')
-    # keep track of the current row index
+    # check paging parameters
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError('Limit and offset must not be negative')
+    if max_candidates is not None and max_candidates < 1:
+        raise ValueError('Max_candidates must be positive')
+    # Each page would rank a different set of candidates, so a next page
+    # could skip matches that rank above the end of this one.
+    ranks_candidates = max_candidates is not None and len(q) > 0
+    if ranks_candidates and cursor is not None:
+        raise ValueError("Max_candidates can't be combined with a cursor")
+    # facet counts of this listing may have been cached
+    cache_key = None
+    if len(facets) > 0 and all(facet in MATERIALIZED_FACETS for facet, _ptr in facets):
+        cache_key = _facet_cache_key(q, lang, filters)
+    # interpret the cursor
+    seek = None if cursor is None else _decode_cursor(cursor, len(q) > 0)
+    # keep track of the current row index, and whether there are more
+    # results after this page
     row_index = 0
+    has_more = False
+    # fetch one extra row, to find out if there's a next page
+    fetch_limit = None if limit is None else limit + 1
+    # rank at least enough candidates to fill this page, so that if we get
+    # less than fetch_limit results, we know we've seen all matches.
+    if max_candidates is not None:
+        max_candidates = None if fetch_limit is None else max(max_candidates, offset + fetch_limit)
     # if we have a query we should perform a free-text search ordered by
     # relevance, otherwise we should do a sorted listing.
+    pool = _read_pool(app)
     if len(q) > 0:
-        result_iterator = _execute_search_query(app, filterexpr, q)
+        q = _sanitize_query(q)
+        result_iterator = _execute_search_query(pool, filters, lang, q, fetch_limit, offset, seek,
+                                                max_candidates, summary_version)
     else:
-        result_iterator = _execute_list_query(app, filterexpr, lang, sortpath)
+        result_iterator = _execute_list_query(pool, filters, lang, sortpath, fetch_limit, offset, seek,
+                                              summary_version)
     # now iterate over the results
-    async for docid, doc in result_iterator:
-        # update the result info
-        for facet, ptr in facets:
-            if facet not in result_info:
-                result_info[facet] = {}
-            ptr_parts = ptr.parts
-            for value in _extract_values(doc, ptr_parts):
-                value = str(value)
-                if value not in result_info[facet]:
-                    result_info[facet][value] = 1
-                else:
-                    result_info[facet][value] += 1
-        # yield the result if it falls within the current page
-        if start <= row_index < end:
-            yield (docid, doc)
-
-        row_index += 1
-    # store the total amount of documents in the result info
-    result_info['/'] = row_index
-
-
-async def _execute_list_query(app, filterexpr: str, lang: str, sortpath: T.List[str]):
+    last_result = None
+    try:
+        async for docid, result, sortvalue in result_iterator:
+            if row_index == limit:
+                has_more = True
+                # an empty page has nothing to continue after
+                if last_result is not None and not ranks_candidates:
+                    result_info['next'] = _encode_cursor(*last_result)
+                break
+            yield (docid,) + result
+            row_index += 1
+            last_result = sortvalue, docid
+    finally:
+        # Also when our caller stops iterating early, so that the cursor is
+        # closed and the connection released right away instead of whenever
+        # the result iterator is garbage collected.
+        await result_iterator.aclose()
+    if cache_key is not None:
+        cached = _facet_cache.get(cache_key)
+        if cached is None:
+            generation = _facet_cache_generation
+            # Count on the primary: the cache is only invalidated when a
+            # change is made there, replicas may not have it yet.
+            cached = {'/': await _execute_count_query(app['pool'], filters, lang, q)}
+            all_facets = list(MATERIALIZED_FACETS)
+            for facet in all_facets:
+                cached[facet] = {}
+            async for index, value, count in _execute_facet_query(
+                    app['pool'], filters, lang, q, all_facets):
+                cached[all_facets[index]][value] = count
+            # don't cache counts that may have been changed while we were
+            # counting them
+            if generation == _facet_cache_generation:
+                _facet_cache[cache_key] = cached
+        result_info['/'] = cached['/']
+        if result_info['/'] > 0:
+            for facet, _ptr in facets:
+                result_info[facet] = dict(cached[facet])
+        return
+    # store the total amount of documents in the result info. If this is the
+    # last page we've seen the last matching document, otherwise we need to
+    # ask Postgres.
+    if not has_more and (row_index > 0 or offset == 0) and seek is None:
+        result_info['/'] = offset + row_index
+    else:
+        result_info['/'] = await _execute_count_query(pool, filters, lang, q)
+    # count the facet values of all matching documents
+    if len(facets) > 0 and result_info['/'] > 0:
+        for facet, _ptr in facets:
+            result_info[facet] = {}
+        async for index, value, count in _execute_facet_query(
+                pool, filters, lang, q, [facet for facet, _ptr in facets]):
+            result_info[facets[index][0]][value] = count
+
+
+async def _execute_list_query(pool: asyncpg.pool.Pool, filters: T.Optional[dict], lang: str,
+                              sortpath: T.List[str], limit: T.Optional[int]=None, offset: int=0,
+                              seek: T.Optional[tuple]=None,
+                              summary_version: T.Optional[str]=None):
     if len(sortpath) == 0:
         raise ValueError('Sortpath should not be empty')
-    sortexpr = 'doc->'
-    for p in sortpath[:-1]:
-        sortexpr += "'" + p + "'->"
-    sortexpr += ">'" + sortpath[-1] + "'"
-    async with app['pool'].acquire() as con:
+    column_type = 'text'
+    if tuple(sortpath) in SORT_COLUMNS:
+        sortexpr, column_type = SORT_COLUMNS[tuple(sortpath)]
+    else:
+        sortexpr = 'doc->'
+        for p in sortpath[:-1]:
+            sortexpr += "'" + p + "'->"
+        sortexpr += ">'" + sortpath[-1] + "'"
+        # documents without a sort value are sorted last
+        sortexpr = "COALESCE(" + sortexpr + ", '')"
+    args = [lang, limit, offset]
+    seekexpr = ''
+    if seek is not None:
+        seekexpr = _Q_LIST_SEEK.format(sortexpression=sortexpr)
+        sortvalue, docid = seek
+        args.extend((_to_sort_value(sortvalue, column_type), docid))
+    columns, join = _summary_columns(summary_version, args)
+    filterexpr = _to_pg_json_filterexpression(filters, args)
+    async with pool.acquire() as con:
         # use a cursor so we can stream
         async with con.transaction():
-            stmt = await con.prepare(
-                _Q_LIST_DOCS.format(filters=filterexpr, sortexpression=sortexpr)
-            )
-            async for row in stmt.cursor(lang):
-                yield row['id'], json.loads(row['doc'])
+            query = _Q_LIST_DOCS.format(filters=filterexpr, sortexpression=sortexpr, seek=seekexpr,
+                                        columns=columns, join=join)
+            con.count_search_statement(query)
+            async for row in con.cursor(query, *args, timeout=_statement_timeout):
+                yield row['id'], _to_result(row, summary_version), _from_sort_value(row['sortvalue'])
+
+
+async def _execute_search_query(pool: asyncpg.pool.Pool, filters: T.Optional[dict], lang: str,
+                                q: str,
+                                limit: T.Optional[int]=None, offset: int=0,
+                                seek: T.Optional[tuple]=None,
+                                max_candidates: T.Optional[int]=None,
+                                summary_version: T.Optional[str]=None):
+    """Search documents ordered by relevance.
+
+    Documents match if they match the prefix query, or if their stemmed text
+    matches the prefix query stemmed in the language of the search. If
+    ``max_candidates`` is given, only that many matching documents are
+    ranked. Which ones is up to the GIN index, so if more documents match,
+    the order of the results is approximate and they can't be paged through.
 
-
-async def _execute_search_query(app, filterexpr: str, q: str):
-    # Replace .,\'"|&:()*!\/ with spaces
-    q = re.sub(r'[\\/.,\'"|&:()*!<>;\[\]{}]', ' ', q)
+    """
     prefix_query = _to_pg_json_query(q)
     fullmatch_query = _to_pg_json_query_fullmatch(q)
-
-    async with app['pool'].acquire() as con:
+    args = [prefix_query, fullmatch_query, limit, offset, max_candidates, _to_pg_ts_config(lang)]
+    seekexpr = ''
+    if seek is not None:
+        seekexpr = _Q_SEARCH_SEEK
+        args.extend(seek)
+    columns, join = _summary_columns(summary_version, args)
+    filterexpr = _to_pg_json_filterexpression(filters, args)
+
+    async with pool.acquire() as con:
         # use a cursor so we can stream
         async with con.transaction():
-            stmt = await con.prepare(
-                _Q_SEARCH_DOCS.format(filters=filterexpr)
-            )
-            async for row in stmt.cursor(prefix_query, fullmatch_query):
-                yield row['id'], json.loads(row['doc'])
+            query = _Q_SEARCH_DOCS.format(filters=filterexpr, seek=seekexpr, columns=columns, join=join)
+            con.count_search_statement(query)
+            async for row in con.cursor(query, *args, timeout=_statement_timeout):
+                yield row['id'], _to_result(row, summary_version), row['sortvalue']
+
+
+def _summary_columns(summary_version: T.Optional[str], args: list) -> T.Tuple[str, str]:
+    """Columns and join of a list or search query.
+
+    :returns: the columns to select and the join clause, which selects stored
+        summaries of the given version, if any.
+
+    """
+    if summary_version is None:
+        return 'doc', ''
+    args.append(summary_version)
+    return _Q_SUMMARY_COLUMNS, _Q_SUMMARY_JOIN.format(len(args))
+
+
+def _to_result(row, summary_version: T.Optional[str]) -> tuple:
+    """The part of a search result after the document id, see
+    :func:`datacatalog.plugin_interfaces.search_search`."""
+    if summary_version is None:
+        return row['doc'],
+    if row['summary'] is not None:
+        return row['summary'], None, row['etag']
+    return None, row['doc'], row['etag']
+
+
+async def _execute_count_query(pool: asyncpg.pool.Pool, filters: T.Optional[dict], lang: str,
+                               q: str) -> int:
+    """Count the documents matching a listing (if ``q`` is empty) or a
+    search, without fetching them."""
+    if len(q) > 0:
+        args = [_to_pg_json_query(q), _to_pg_ts_config(lang)]
+        query = _Q_COUNT_SEARCH_DOCS
+    else:
+        args = [lang]
+        query = _Q_COUNT_LIST_DOCS
+    filterexpr = _to_pg_json_filterexpression(filters, args)
+    query = query.format(filters=filterexpr)
+    async with pool.acquire() as con:
+        con.count_search_statement(query)
+        return await con.fetchval(query, *args, timeout=_statement_timeout)
+
+
+async def _execute_facet_query(pool: asyncpg.pool.Pool, filters: T.Optional[dict], lang: str,
+                               q: str, facets: T.List[str]):
+    """Count the values under each of the given facet pointers in all documents
+    matching a listing (if ``q`` is empty) or a search.
+
+    Values of :data:`MATERIALIZED_FACETS` are counted in table
+    ``dataset_facet``, other values are extracted from the documents.
+
+    Yields ``(index in facets, value, count)`` tuples.
+
+    """
+    if len(q) > 0:
+        args = [_to_pg_json_query(q), _to_pg_ts_config(lang)]
+        query = _Q_FACET_SEARCH_DOCS
+    else:
+        args = [lang]
+        query = _Q_FACET_LIST_DOCS
+    filterexpr = _to_pg_json_filterexpression(filters, args)
+    selects = []
+    for index, facet in enumerate(facets):
+        if facet in MATERIALIZED_FACETS:
+            args.append(facet)
+            selects.append(
+                'SELECT {:d} AS facet, value, count FROM "dataset_facet" '
+                'WHERE dataset_id = "dataset".id AND facet = ${:d}'.format(index, len(args)))
+            continue
+        try:
+            ptr_parts = jsonpointer.JsonPointer(facet).parts
+        except jsonpointer.JsonPointerException:
+            raise ValueError('Cannot parse pointer')
+        expr, froms = _to_pg_json_values_expression(ptr_parts, args)
+        select = 'SELECT {:d} AS facet, {} #>> \'{{}}\' AS value, 1 AS count'.format(index, expr)
+        if len(froms) > 0:
+            select += ' FROM ' + ', '.join(froms)
+        selects.append(select)
+    query = query.format(facets=' UNION ALL '.join(selects), filters=filterexpr)
+    async with pool.acquire() as con:
+        con.count_search_statement(query)
+        for row in await con.fetch(query, *args, timeout=_statement_timeout):
+            if row['value'] is not None:
+                yield row['facet'], row['value'], row['count']
+
+
+def _to_pg_json_values_expression(ptr_parts: T.List[str], args: list) \
+        -> T.Tuple[str, T.List[str]]:
+    """SQL equivalent of :func:`_extract_values`.
+
+    Translates the parts of a JSON pointer into an expression and a list of
+    ``FROM`` items that together select all values that may live under the
+    pointer in column ``doc``. Property names are appended to ``args`` and
+    referenced as bind parameters.
+
+    """
+    expr = 'doc'
+    froms = []
+    parts = collections.deque(ptr_parts)
+    while len(parts) > 0:
+        part = parts.popleft()
+        if part == 'properties':
+            if len(parts) == 0:
+                raise ValueError('Properties must be followed by property name')
+            args.append(parts.popleft())
+            expr = '{}->${:d}::text'.format(expr, len(args))
+        elif part == 'items':
+            alias = 'e{:d}'.format(len(froms))
+            froms.append(
+                "jsonb_array_elements(CASE jsonb_typeof({0}) WHEN 'array' THEN {0} END) "
+                "AS {1}(v)".format(expr, alias))
+            expr = alias + '.v'
+        else:
+            raise ValueError('Element must be either list, object or end of pointer, not: ' + part)
+    return expr, froms
+
+
+def _encode_cursor(sortvalue: T.Union[str, float], docid: str) -> str:
+    """Opaque continuation token for the result after the given one."""
+    return base64.urlsafe_b64encode(
+        json.dumps([sortvalue, docid]).encode()
+    ).decode()
+
+
+def _decode_cursor(cursor: str, is_search: bool) -> T.Tuple[T.Union[str, float], str]:
+    """Inverse of :func:`_encode_cursor`.
+
+    :raises ValueError: if the cursor is invalid, or wasn't created for this
+        kind of query.
+    """
+    try:
+        sortvalue, docid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    sortvalue_type = (int, float) if is_search else str
+    if not isinstance(sortvalue, sortvalue_type) or not isinstance(docid, str):
+        raise ValueError('Invalid cursor')
+    return float(sortvalue) if is_search else sortvalue, docid
+
+
+def _sanitize_query(q: str) -> str:
+    # Replace .,\'"|&:()*!\/ with spaces
+    return re.sub(r'[\\/.,\'"|&:()*!<>;\[\]{}]', ' ', q)
+
 
+def _to_pg_json_filterexpression(filters: T.Optional[dict], args: list) -> str:
+    """Translate the filters of a search into a SQL expression.
 
-def _to_pg_json_filterexpression(filters: T.Optional[dict]) -> str:
+    Filters on one of the :data:`FILTER_COLUMNS` are translated into a
+    comparison with that column, other filters into jsonb containment
+    expressions. All values are appended to ``args`` and referenced as bind
+    parameters, so the expression only depends on the pointers and operators
+    used (and the number of values of ``in`` filters on the document).
+
+    """
     if filters is None:
         return ''
 
-    def to_expr(ptr: str, value: T.Any) -> str:
-        """Create a filterexpression from a json pointer and value."""
+    def to_expr(ptr: str, value: T.Any) -> T.Any:
+        """Create the jsonb value contained by documents matching a json
+        pointer and value."""
         try:
             p = jsonpointer.JsonPointer(ptr)
         except jsonpointer.JsonPointerException:
             raise ValueError('Cannot parse pointer')
         parts = collections.deque(p.parts)
-        value = json.dumps(value)
 
         def parse_complex_type():
             nxt = parts.popleft()
@@ -514,22 +1680,22 @@ def _to_pg_json_filterexpression(filters: T.Optional[dict]) -> str:
             raise ValueError('Child must be either list, '
                              'object or end of pointer, not: ' + nxt)
 
-        def parse_obj() -> str:
+        def parse_obj() -> dict:
             if len(parts) == 0:
                 raise ValueError('Properties must be followed by property name')
-            name = json.dumps(parts.popleft())
+            name = parts.popleft()
             # either end-of-pointer primitive...
             if len(parts) == 0:
-                return '{' + name + ': ' + value + '}'
+                return {name: value}
             # or a complex type
-            return '{' + name + ': ' + parse_complex_type() + '}'
+            return {name: parse_complex_type()}
 
-        def parse_list() -> str:
+        def parse_list() -> list:
             # either end-of-pointer primitive...
             if len(parts) == 0:
-                return '[' + value + ']'
+                return [value]
             # or a complex type
-            return '[' + parse_complex_type() + ']'
+            return [parse_complex_type()]
 
         # base case: query json document with solely a single primitive
         # (string, int, bool, ...)
@@ -541,23 +1707,56 @@ def _to_pg_json_filterexpression(filters: T.Optional[dict]) -> str:
 
     # Interpret the filters
     filterexprs = []
-    for ptr, filter in filters.items():
-        for op, val in filter.items():
+    for ptr, filter in sorted(filters.items()):
+        for op, val in sorted(filter.items()):
+            if op in _RANGE_OPERATORS:
+                filterexprs.append(_to_pg_range_filterexpression(ptr, op, val, args))
+                continue
             if op != 'eq' and op != 'in':
                 raise NotImplementedError(
-                    'Postgres plugin only supports '
-                    '"eq" and "in" filter operators')
-            if op == "eq":
+                    'Postgres plugin only supports "eq", "in", '
+                    '"lt", "le", "gt" and "ge" filter operators')
+            column = FILTER_COLUMNS.get(ptr)
+            values = [val] if op == 'eq' else list(val)
+            if column is not None and all(isinstance(v, str) for v in values):
+                args.append(values)
                 filterexprs.append(
-                    " AND doc @> '" + to_expr(ptr, val) + "'")
-            elif op == "in":
-                orexpr = ' OR '.join(
-                    "doc @> '" + to_expr(ptr, v) + "'" for v in val
-                )
-                filterexprs.append(' AND (' + orexpr + ')')
+                    ' AND {} = ANY(${:d}::text[])'.format(column, len(args)))
+            else:
+                orexprs = []
+                for v in values:
+                    args.append(to_expr(ptr, v))
+                    orexprs.append('doc @> ${:d}::jsonb'.format(len(args)))
+                filterexprs.append(' AND (' + ' OR '.join(orexprs) + ')')
     return ''.join(filterexprs)
 
 
+def _to_pg_range_filterexpression(ptr: str, op: str, value: T.Any, args: list) -> str:
+    """Translate a range filter on one of the :data:`RANGE_COLUMNS` into a SQL
+    expression, with the value appended to ``args``.
+
+    A document matches if any of the values under the pointer matches, so
+    ``lt`` and ``le`` compare the lowest value and ``gt`` and ``ge`` the
+    highest.
+
+    """
+    if ptr not in RANGE_COLUMNS:
+        raise ValueError(
+            'Range comparators are only supported on ' + ', '.join(RANGE_COLUMNS))
+    lower_column, upper_column, column_type = RANGE_COLUMNS[ptr]
+    range_value = _to_range_value(value, column_type)
+    if range_value is None:
+        raise ValueError('Invalid {} value for {}: {}'.format(column_type, ptr, value))
+    args.append(range_value)
+    if op in ('lt', 'le'):
+        expr = ' AND {} {} ${:d}'.format(lower_column, _RANGE_OPERATORS[op], len(args))
+        if column_type == 'date':
+            # sort columns hold -infinity for documents without a value
+            expr += " AND {} > '-infinity'".format(lower_column)
+        return expr
+    return ' AND {} {} ${:d}'.format(upper_column, _RANGE_OPERATORS[op], len(args))
+
+
 def _to_pg_lang(iso_639_1_code: str) -> str:
     if iso_639_1_code is None:
         return 'simple'
@@ -599,6 +1798,16 @@ def _etag_from_str(s: str) -> str:
     return '"' + base64.urlsafe_b64encode(h.digest()).decode() + '"'
 
 
+def _to_pg_ts_config(lang: str) -> str:
+    """The text search configuration to stem text in the given language with.
+
+    Not all dictionaries in :data:`ISO_639_1_TO_PG_DICTIONARIES` come with a
+    default Postgres installation; text in other languages isn't stemmed.
+
+    """
+    return lang if lang in _ts_configs else 'simple'
+
+
 def _iso_639_1_code_to_pg(iso_639_1_code: str) -> str:
     # we use the simple dictionary for ISO 639-1 language codes we don't know
     if iso_639_1_code not in ISO_639_1_TO_PG_DICTIONARIES:
@@ -608,24 +1817,10 @@ def _iso_639_1_code_to_pg(iso_639_1_code: str) -> str:
     return ISO_639_1_TO_PG_DICTIONARIES[iso_639_1_code]
 
 
-all_startup_actions = None
-
-# TODO : make this check work in way it is executed on only one server in case the service is restarted
-# on multiple servers
-
 @_hookimpl
 async def check_startup_action(app: T.Mapping[str, T.Any], name: str) -> bool:
-    global all_startup_actions
-    if all_startup_actions is None:
-        _Q = 'SELECT id, action, applied FROM dcatd_startup_actions'
-
-        async with app['pool'].acquire() as con:
-            actions = await con.fetch(_Q)
-            all_startup_actions = set(map(lambda x: x['action'], actions))
-    if name in all_startup_actions:
-        return True
-    else:
-        return False
+    _Q = 'SELECT EXISTS (SELECT 1 FROM dcatd_startup_actions WHERE action = $1)'
+    return await app['pool'].fetchval(_Q, name)
 
 
 @_hookimpl
@@ -635,6 +1830,44 @@ async def add_startup_action(app: T.Mapping[str, T.Any], name: str):
         await con.execute(_Q, name)
 
 
+@_hookimpl
+async def lock_startup_actions(app: T.Mapping[str, T.Any]) -> bool:
+    # language=rst
+    """Try to take the advisory lock of the startup actions.
+
+    The lock is held by a connection taken from the pool until
+    :func:`unlock_startup_actions`, so that it's released when this process
+    dies.
+
+    """
+    global _startup_actions_conn
+    if _startup_actions_conn is not None:
+        return True
+    con = await app['pool'].acquire()
+    try:
+        locked = await con.fetchval(_Q_TRY_LOCK, _STARTUP_ACTIONS_LOCK_KEY)
+    except BaseException:
+        await app['pool'].release(con)
+        raise
+    if not locked:
+        await app['pool'].release(con)
+        return False
+    _startup_actions_conn = con
+    return True
+
+
+@_hookimpl
+async def unlock_startup_actions(app: T.Mapping[str, T.Any]):
+    global _startup_actions_conn
+    if _startup_actions_conn is None:
+        return
+    con, _startup_actions_conn = _startup_actions_conn, None
+    try:
+        await con.fetchval(_Q_UNLOCK, _STARTUP_ACTIONS_LOCK_KEY)
+    finally:
+        await app['pool'].release(con)
+
+
 @_hookimpl
 async def get_old_identifiers(app: T.Mapping[str, T.Any]):
     _Q = 'SELECT id FROM dataset WHERE length(id) <> 14 OR LOWER(id) = id'
@@ -645,9 +1878,16 @@ async def get_old_identifiers(app: T.Mapping[str, T.Any]):
 
 @_hookimpl
 async def set_new_identifier(app: T.Mapping[str, T.Any], old_id: str, new_id: str):
-    _Q = 'UPDATE dataset SET id = $1 WHERE id = $2'
+    _Q = 'UPDATE dataset SET id = $1, txid = txid_current() WHERE id = $2'
     async with app['pool'].acquire() as con:
-        result = await con.execute(_Q, new_id, old_id)
+        async with con.transaction():
+            # the rendering and summary contain the old identifier
+            await con.execute(_Q_DELETE_RENDERED, old_id)
+            await con.execute(_Q_DELETE_SUMMARY, old_id)
+            result = await con.execute(_Q, new_id, old_id)
+            if result == 'UPDATE 1':
+                # for the change feed, the old identifier is deleted
+                await con.execute(_Q_INSERT_TOMBSTONE, old_id)
         return result
 
 
@@ -655,25 +1895,52 @@ async def set_new_identifier(app: T.Mapping[str, T.Any], old_id: str, new_id: st
 async def storage_all(app: T.Mapping[str, T.Any]) -> T.AsyncGenerator[T.Tuple[str, str, dict], None]:
     # language=rst
     _Q = 'SELECT id, etag, doc FROM dataset'
-    async with app['pool'].acquire() as con:
+    async with _read_pool(app).acquire() as con:
         async with con.transaction():
             stmt = await con.prepare(_Q)
             async for row in stmt.cursor():
-                yield row['id'], row['etag'], json.loads(row['doc'])
+                yield row['id'], row['etag'], row['doc']
 
 
 @_hookimpl
-async def notify(app: T.Mapping[str, T.Any], msg: str) -> None:
-    async with app['pool'].acquire() as conn:
-        await conn.execute(f"NOTIFY channel, '{msg}'")
+async def notify(app: T.Mapping[str, T.Any],
+                 changes: T.Iterable[T.Tuple[str, str, T.Optional[str], T.Optional[str]]]) -> None:
+    # language=rst
+    """ Notify all instances of changes to datasets.
+
+    See :func:`datacatalog.plugin_interfaces.notify`
+
+    """
+    changes = list(changes)
+    if len(changes) == 0:
+        return
+    operations, docids, old_etags, new_etags = zip(*changes)
+    await app['pool'].execute(_Q_NOTIFY, operations, docids, old_etags, new_etags)
 
 
 @_hookimpl
 async def listen_notifications(app, callback: T.Callable) -> None:
     global _listen_conn
     global _listen_callback
+    global _etag_index
 
     _listen_callback = callback
     _listen_conn = await app['pool'].acquire()
     await _listen_conn.add_listener('channel', _listen_callback)
+    # we may have missed notifications while we weren't listening
+    _invalidate_facet_cache()
+    if _etag_index is not None:
+        _etag_index.close()
+    else:
+        app.subscribe(_on_change)
+    _etag_index = _EtagIndex(app['pool'])
+    await _etag_index.load()
     return _listen_conn
+
+
+def _on_change(change: T.Optional[dict]) -> None:
+    """Keep the facet cache and the etag index current, see
+    :meth:`datacatalog.application.Application.subscribe`."""
+    _invalidate_facet_cache()
+    if _etag_index is not None:
+        _etag_index.on_change(change)
@@ -0,0 +1,64 @@
+-- The tables and columns, as they were created on every startup before
+-- there were migrations. Everything is idempotent, so that databases that
+-- were created back then are adopted. The newer indexes on the dataset
+-- table are created concurrently by later migrations, so that creating them
+-- doesn't block writes.
+CREATE TABLE IF NOT EXISTS "dataset" (
+    "id" character varying(254) PRIMARY KEY,
+    "doc" jsonb NOT NULL,
+    "etag" character varying(254) NOT NULL,
+    "searchable_text" tsvector,
+    "lang" character varying(20)
+);
+CREATE INDEX IF NOT EXISTS "idx_id_etag" ON "dataset" ("id", "etag");
+CREATE INDEX IF NOT EXISTS "idx_full_text_search" ON "dataset" USING gin ("searchable_text");
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "searchable_text_stemmed" tsvector;
+CREATE INDEX IF NOT EXISTS "idx_json_docs" ON "dataset" USING gin ("doc" jsonb_path_ops);
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "sort_modified" date NOT NULL DEFAULT '-infinity';
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "sort_title" text NOT NULL DEFAULT '';
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "sort_issued" date NOT NULL DEFAULT '-infinity';
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "filter_status" text;
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "filter_owner" text;
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "filter_language" text;
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "range_modified" date;
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "range_beginning" date;
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "range_end" date;
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "range_byte_size_min" bigint;
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "range_byte_size_max" bigint;
+CREATE TABLE IF NOT EXISTS "dataset_facet" (
+    "dataset_id" character varying(254) NOT NULL
+        REFERENCES "dataset" ("id") ON UPDATE CASCADE ON DELETE CASCADE,
+    "facet" character varying(254) NOT NULL,
+    "value" text NOT NULL,
+    "count" integer NOT NULL,
+    PRIMARY KEY ("dataset_id", "facet", "value")
+);
+CREATE INDEX IF NOT EXISTS "idx_dataset_facet_facet_value" ON "dataset_facet" ("facet", "value");
+CREATE TABLE IF NOT EXISTS "dataset_summary" (
+    "dataset_id" character varying(254) PRIMARY KEY
+        REFERENCES "dataset" ("id") ON UPDATE CASCADE ON DELETE CASCADE,
+    "etag" character varying(254) NOT NULL,
+    "version" character varying(254) NOT NULL,
+    "summary" jsonb NOT NULL
+);
+CREATE TABLE IF NOT EXISTS "dataset_render" (
+    "dataset_id" character varying(254) PRIMARY KEY
+        REFERENCES "dataset" ("id") ON UPDATE CASCADE ON DELETE CASCADE,
+    "etag" character varying(254) NOT NULL,
+    "version" character varying(254) NOT NULL,
+    "rendered" bytea NOT NULL
+);
+CREATE SEQUENCE IF NOT EXISTS "dataset_change_number";
+-- Existing rows get their txid in 0003, in batches.
+ALTER TABLE "dataset" ADD COLUMN IF NOT EXISTS "txid" bigint;
+ALTER TABLE "dataset" ALTER COLUMN "txid" SET DEFAULT txid_current();
+CREATE TABLE IF NOT EXISTS "dataset_tombstone" (
+    "id" character varying(254) PRIMARY KEY,
+    "txid" bigint NOT NULL DEFAULT txid_current()
+);
+CREATE INDEX IF NOT EXISTS "idx_tombstone_txid_id" ON "dataset_tombstone" ("txid", "id");
+CREATE TABLE IF NOT EXISTS "dcatd_startup_actions" (
+    id SERIAL PRIMARY KEY,
+    action character varying(255) NOT NULL,
+    applied TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,4 @@
+-- no transaction
+-- check_startup_action() looks up a single action.
+DROP INDEX CONCURRENTLY IF EXISTS "idx_startup_actions_action";
+CREATE INDEX CONCURRENTLY "idx_startup_actions_action" ON "dcatd_startup_actions" ("action");
@@ -0,0 +1,31 @@
+-- no transaction
+-- Give the existing datasets a txid, a batch per transaction, so that the
+-- table isn't locked for writes while all its rows are updated.
+DO $$
+DECLARE
+    last_id character varying(254) := '';
+    batch_last_id character varying(254);
+BEGIN
+    LOOP
+        SELECT max("id") INTO batch_last_id FROM (
+            SELECT "id" FROM "dataset" WHERE "id" > last_id ORDER BY "id" LIMIT 1000
+        ) AS batch;
+        EXIT WHEN batch_last_id IS NULL;
+        UPDATE "dataset" SET "txid" = txid_current()
+        WHERE "id" > last_id AND "id" <= batch_last_id AND "txid" IS NULL;
+        last_id := batch_last_id;
+        COMMIT;
+    END LOOP;
+END
+$$;
+-- From PostgreSQL 12 on, a validated check constraint spares SET NOT NULL
+-- the scan of the table under an exclusive lock; the validation itself
+-- allows writes. PostgreSQL 11, which docker-compose.yml runs, ignores the
+-- constraint, so there SET NOT NULL still scans the table under the lock.
+ALTER TABLE "dataset" DROP CONSTRAINT IF EXISTS "dataset_txid_not_null";
+ALTER TABLE "dataset" ADD CONSTRAINT "dataset_txid_not_null" CHECK ("txid" IS NOT NULL) NOT VALID;
+ALTER TABLE "dataset" VALIDATE CONSTRAINT "dataset_txid_not_null";
+ALTER TABLE "dataset" ALTER COLUMN "txid" SET NOT NULL;
+ALTER TABLE "dataset" DROP CONSTRAINT "dataset_txid_not_null";
+DROP INDEX CONCURRENTLY IF EXISTS "idx_txid_id";
+CREATE INDEX CONCURRENTLY "idx_txid_id" ON "dataset" ("txid", "id");
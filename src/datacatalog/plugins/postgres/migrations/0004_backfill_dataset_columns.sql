@@ -0,0 +1,107 @@
+-- no transaction
+-- Fill the columns and the dataset_facet rows that the postgres plugin
+-- derives from the document on every write, for the datasets written
+-- before it did. A batch per transaction, like in 0003. The functions below
+-- are the SQL versions of _to_sort_value(), _to_range_value() and
+-- _to_pg_ts_config(); they only exist in this session.
+CREATE OR REPLACE FUNCTION pg_temp.dcatd_date(value jsonb) RETURNS date
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    IF jsonb_typeof(value) = 'string' AND substr(value #>> '{}', 1, 10) ~ '^\d{4}-\d{2}-\d{2}$' THEN
+        RETURN substr(value #>> '{}', 1, 10)::date;
+    END IF;
+    RETURN NULL;
+EXCEPTION WHEN datetime_field_overflow OR invalid_datetime_format THEN
+    RETURN NULL;
+END
+$$;
+CREATE OR REPLACE FUNCTION pg_temp.dcatd_integer(value jsonb) RETURNS bigint
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    IF jsonb_typeof(value) = 'number' AND value #>> '{}' ~ '^-?\d+$'
+            OR jsonb_typeof(value) = 'string' AND value #>> '{}' ~ '^\s*[-+]?\d+\s*$' THEN
+        RETURN (value #>> '{}')::bigint;
+    END IF;
+    RETURN NULL;
+EXCEPTION WHEN numeric_value_out_of_range THEN
+    RETURN NULL;
+END
+$$;
+-- The text the search vectors were made of isn't stored, so the stemmed
+-- vector is made by stemming the lexemes of the unstemmed one, keeping their
+-- positions and weights.
+CREATE OR REPLACE FUNCTION pg_temp.dcatd_stem(vector tsvector, lang text) RETURNS tsvector
+LANGUAGE sql STABLE AS $$
+SELECT coalesce(string_agg(
+    '''' || replace(replace(stem, '\', '\\'), '''', '''''') || '''' || coalesce(':' || (
+        SELECT string_agg(pos || weight, ',') FROM unnest(positions, weights) AS p(pos, weight)
+    ), ''),
+    ' '), '')::tsvector
+FROM unnest(vector) AS v(lexeme, positions, weights),
+    unnest(tsvector_to_array(to_tsvector((
+        CASE WHEN EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = lang) THEN lang ELSE 'simple' END
+    )::regconfig, lexeme))) AS stem
+$$;
+DO $$
+DECLARE
+    last_id character varying(254) := '';
+    batch_last_id character varying(254);
+BEGIN
+    LOOP
+        SELECT max("id") INTO batch_last_id FROM (
+            SELECT "id" FROM "dataset" WHERE "id" > last_id ORDER BY "id" LIMIT 1000
+        ) AS batch;
+        EXIT WHEN batch_last_id IS NULL;
+        UPDATE "dataset" SET
+            "sort_modified" = coalesce(pg_temp.dcatd_date(doc->'ams:sort_modified'), '-infinity'),
+            "sort_title" = CASE WHEN jsonb_typeof(doc->'dct:title') = 'string' THEN doc->>'dct:title' ELSE '' END,
+            "sort_issued" = coalesce(pg_temp.dcatd_date(doc->'foaf:isPrimaryTopicOf'->'dct:issued'), '-infinity'),
+            "filter_status" = CASE WHEN jsonb_typeof(doc->'ams:status') = 'string' THEN doc->>'ams:status' END,
+            "filter_owner" = CASE WHEN jsonb_typeof(doc->'ams:owner') = 'string' THEN doc->>'ams:owner' END,
+            "filter_language" = CASE WHEN jsonb_typeof(doc->'dct:language') = 'string' THEN doc->>'dct:language' END,
+            "range_modified" = pg_temp.dcatd_date(doc->'foaf:isPrimaryTopicOf'->'dct:modified'),
+            "range_beginning" = pg_temp.dcatd_date(doc->'dct:temporal'->'time:hasBeginning'),
+            "range_end" = pg_temp.dcatd_date(doc->'dct:temporal'->'time:hasEnd'),
+            "searchable_text_stemmed" = pg_temp.dcatd_stem("searchable_text", "lang"),
+            ("range_byte_size_min", "range_byte_size_max") = (
+                SELECT min(byte_size), max(byte_size)
+                FROM jsonb_array_elements(CASE
+                    WHEN jsonb_typeof(doc->'dcat:distribution') = 'array' THEN doc->'dcat:distribution'
+                    ELSE '[]'
+                END) AS distribution,
+                    pg_temp.dcatd_integer(distribution->'dcat:byteSize') AS byte_size
+            )
+        WHERE "id" > last_id AND "id" <= batch_last_id;
+        DELETE FROM "dataset_facet" WHERE "dataset_id" > last_id AND "dataset_id" <= batch_last_id;
+        INSERT INTO "dataset_facet" ("dataset_id", "facet", "value", "count")
+        SELECT d.id, f.facet, f.value #>> '{}', count(*)
+        FROM "dataset" AS d
+        CROSS JOIN LATERAL (
+            SELECT '/properties/dcat:distribution/items/properties/' || property, distribution->property
+            FROM jsonb_array_elements(CASE
+                WHEN jsonb_typeof(d.doc->'dcat:distribution') = 'array' THEN d.doc->'dcat:distribution'
+                ELSE '[]'
+            END) AS distribution,
+                unnest(ARRAY['ams:resourceType', 'dcat:mediaType', 'ams:distributionType', 'ams:serviceType'])
+                    AS property
+            UNION ALL
+            SELECT '/properties/' || property || '/items', item
+            FROM unnest(ARRAY['dcat:keyword', 'dcat:theme']) AS property,
+                jsonb_array_elements(CASE
+                    WHEN jsonb_typeof(d.doc->property) = 'array' THEN d.doc->property
+                    ELSE '[]'
+                END) AS item
+            UNION ALL
+            SELECT '/properties/' || property, d.doc->property
+            FROM unnest(ARRAY['ams:owner', 'ams:status']) AS property
+        ) AS f(facet, value)
+        WHERE jsonb_typeof(f.value) = 'string' AND d.id > last_id AND d.id <= batch_last_id
+        GROUP BY d.id, f.facet, f.value #>> '{}';
+        last_id := batch_last_id;
+        COMMIT;
+    END LOOP;
+END
+$$;
+DROP FUNCTION pg_temp.dcatd_date(jsonb);
+DROP FUNCTION pg_temp.dcatd_integer(jsonb);
+DROP FUNCTION pg_temp.dcatd_stem(tsvector, text);
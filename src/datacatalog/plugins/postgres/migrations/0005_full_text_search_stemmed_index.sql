@@ -0,0 +1,3 @@
+-- no transaction
+DROP INDEX CONCURRENTLY IF EXISTS "idx_full_text_search_stemmed";
+CREATE INDEX CONCURRENTLY "idx_full_text_search_stemmed" ON "dataset" USING gin ("searchable_text_stemmed");
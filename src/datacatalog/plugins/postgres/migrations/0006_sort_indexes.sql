@@ -0,0 +1,7 @@
+-- no transaction
+DROP INDEX CONCURRENTLY IF EXISTS "idx_sort_modified";
+CREATE INDEX CONCURRENTLY "idx_sort_modified" ON "dataset" ("sort_modified" DESC, "id");
+DROP INDEX CONCURRENTLY IF EXISTS "idx_sort_title";
+CREATE INDEX CONCURRENTLY "idx_sort_title" ON "dataset" ("sort_title" DESC, "id");
+DROP INDEX CONCURRENTLY IF EXISTS "idx_sort_issued";
+CREATE INDEX CONCURRENTLY "idx_sort_issued" ON "dataset" ("sort_issued" DESC, "id");
@@ -0,0 +1,7 @@
+-- no transaction
+DROP INDEX CONCURRENTLY IF EXISTS "idx_filter_status";
+CREATE INDEX CONCURRENTLY "idx_filter_status" ON "dataset" ("filter_status");
+DROP INDEX CONCURRENTLY IF EXISTS "idx_filter_owner";
+CREATE INDEX CONCURRENTLY "idx_filter_owner" ON "dataset" ("filter_owner");
+DROP INDEX CONCURRENTLY IF EXISTS "idx_filter_language";
+CREATE INDEX CONCURRENTLY "idx_filter_language" ON "dataset" ("filter_language");
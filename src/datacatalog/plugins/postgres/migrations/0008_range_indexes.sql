@@ -0,0 +1,11 @@
+-- no transaction
+DROP INDEX CONCURRENTLY IF EXISTS "idx_range_modified";
+CREATE INDEX CONCURRENTLY "idx_range_modified" ON "dataset" ("range_modified");
+DROP INDEX CONCURRENTLY IF EXISTS "idx_range_beginning";
+CREATE INDEX CONCURRENTLY "idx_range_beginning" ON "dataset" ("range_beginning");
+DROP INDEX CONCURRENTLY IF EXISTS "idx_range_end";
+CREATE INDEX CONCURRENTLY "idx_range_end" ON "dataset" ("range_end");
+DROP INDEX CONCURRENTLY IF EXISTS "idx_range_byte_size_min";
+CREATE INDEX CONCURRENTLY "idx_range_byte_size_min" ON "dataset" ("range_byte_size_min");
+DROP INDEX CONCURRENTLY IF EXISTS "idx_range_byte_size_max";
+CREATE INDEX CONCURRENTLY "idx_range_byte_size_max" ON "dataset" ("range_byte_size_max");
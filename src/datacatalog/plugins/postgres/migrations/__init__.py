@@ -0,0 +1,135 @@
+"""Versioned schema migrations.
+
+The migrations are the files ``NNNN_description.sql`` in this package. They
+are applied in the order of their number, and the numbers of the applied
+migrations are stored in table ``schema_version``. When the schema is
+current, which takes a single query to find out, no DDL is executed at all.
+
+A migration is applied in a transaction, unless its first line is
+``-- no transaction``. Use that for statements that can't run in a
+transaction, like ``CREATE INDEX CONCURRENTLY``. The statements of such a
+migration must each end with a ``;`` at the end of a line, and are executed
+one by one. Semicolons inside dollar quotes don't end a statement, so a
+``DO`` block can update a big table in batches and ``COMMIT`` after each.
+If a statement fails the migration is applied again from the start next
+time, so drop what it creates first, e.g. an index left invalid by a failed
+``CREATE INDEX CONCURRENTLY``, and make updates skip the rows they already
+did.
+
+"""
+import asyncio
+import logging
+import re
+import typing as T
+
+import asyncpg
+import pkg_resources
+
+
+_logger = logging.getLogger(__name__)
+
+_FILENAME = re.compile(r'(\d{4})_(\w+)\.sql')
+_NO_TRANSACTION = '-- no transaction'
+# A statement of a migration that isn't applied in a transaction ends at a
+# semicolon at the end of a line, outside dollar quotes.
+_STATEMENT_END = re.compile(r'(\$\w*\$).*?\1|(;[ \t]*$)', flags=re.M | re.S)
+
+# Key of the advisory lock held while migrating, so that instances that start
+# at the same time don't apply the same migrations.
+_LOCK_KEY = 0x64636174
+# Seconds between attempts to get the lock.
+_LOCK_INTERVAL_SECS = 1
+
+_Q_CREATE_SCHEMA_VERSION = '''
+CREATE TABLE IF NOT EXISTS "schema_version" (
+    "version" integer PRIMARY KEY,
+    "name" character varying(254) NOT NULL,
+    "applied" timestamp with time zone NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+'''
+_Q_SCHEMA_VERSION = 'SELECT coalesce(max(version), 0) FROM "schema_version"'
+_Q_INSERT_SCHEMA_VERSION = 'INSERT INTO "schema_version" (version, name) VALUES ($1, $2)'
+_Q_TRY_LOCK = 'SELECT pg_try_advisory_lock($1)'
+_Q_UNLOCK = 'SELECT pg_advisory_unlock($1)'
+
+
+class Migration(T.NamedTuple):
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def transactional(self) -> bool:
+        return not self.sql.startswith(_NO_TRANSACTION)
+
+    def statements(self) -> T.List[str]:
+        result = []
+        start = 0
+        for match in _STATEMENT_END.finditer(self.sql):
+            if match[2] is not None:
+                result.append(self.sql[start:match.start()])
+                start = match.end()
+        result.append(self.sql[start:])
+        return [statement for statement in result if statement.strip() != '']
+
+
+def migrations() -> T.List[Migration]:
+    # language=rst
+    """All migrations, in order."""
+    result = []
+    for filename in pkg_resources.resource_listdir(__name__, ''):
+        match = _FILENAME.fullmatch(filename)
+        if match is None:
+            continue
+        sql = pkg_resources.resource_string(__name__, filename).decode('utf-8')
+        result.append(Migration(int(match[1]), match[2], sql))
+    result.sort()
+    versions = [migration.version for migration in result]
+    if len(set(versions)) != len(versions):
+        raise ValueError('Migrations with the same number: {}'.format(versions))
+    return result
+
+
+async def schema_version(con: asyncpg.connection.Connection) -> int:
+    # language=rst
+    """The number of the last applied migration, 0 if there is none."""
+    try:
+        return await con.fetchval(_Q_SCHEMA_VERSION)
+    except asyncpg.UndefinedTableError:
+        return 0
+
+
+async def migrate(pool: asyncpg.pool.Pool) -> int:
+    # language=rst
+    """Apply the migrations that haven't been applied yet.
+
+    :returns: the number of applied migrations.
+
+    """
+    pending = migrations()
+    async with pool.acquire() as con:
+        if await schema_version(con) >= pending[-1].version:
+            return 0
+        # Poll instead of waiting for the lock in a statement: the open
+        # transaction of a waiting instance would block CREATE INDEX
+        # CONCURRENTLY.
+        while not await con.fetchval(_Q_TRY_LOCK, _LOCK_KEY):
+            _logger.info("Waiting for another instance to migrate the schema.")
+            await asyncio.sleep(_LOCK_INTERVAL_SECS)
+        try:
+            await con.execute(_Q_CREATE_SCHEMA_VERSION)
+            version = await schema_version(con)
+            pending = [migration for migration in pending if migration.version > version]
+            for migration in pending:
+                _logger.info("Applying migration %04d_%s", migration.version, migration.name)
+                if migration.transactional:
+                    async with con.transaction():
+                        await con.execute(migration.sql)
+                        await con.execute(_Q_INSERT_SCHEMA_VERSION, migration.version, migration.name)
+                else:
+                    for statement in migration.statements():
+                        await con.execute(statement)
+                    await con.execute(_Q_INSERT_SCHEMA_VERSION, migration.version, migration.name)
+        finally:
+            await con.fetchval(_Q_UNLOCK, _LOCK_KEY)
+    return len(pending)
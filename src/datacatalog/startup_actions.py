@@ -1,8 +1,28 @@
+import asyncio
 import logging
 
 
 logger = logging.getLogger(__name__)
 
+# Progress of the startup actions in this process. Exposed by
+# ``/system/startup``.
+status = {
+    # 'pending', 'waiting' while another instance runs the actions,
+    # 'running', 'done' or 'failed':
+    'state': 'pending',
+    # the action that is running:
+    'current': None,
+    # number of datasets processed by the running action:
+    'processed': 0,
+    # actions completed by this process:
+    'completed': [],
+    # actions that didn't process all datasets, and run again on the next start:
+    'incomplete': [],
+}
+
+# Seconds between attempts to become the instance that runs the actions.
+_LOCK_INTERVAL_SECS = 10
+
 
 async def replace_old_identifiers(app):
     old_identifiers = await app.hooks.get_old_identifiers(app=app)
@@ -10,10 +30,15 @@ async def replace_old_identifiers(app):
     changed = 0
     for old_id in old_identifiers:
         count += 1
+        status['processed'] = count
         new_id = await app.hooks.storage_id()
         result = await app.hooks.set_new_identifier(app=app, old_id=old_id, new_id=new_id)
         if result == 'UPDATE 1':
             changed += 1
+            # so that other instances drop what they cached of the dataset
+            await app.hooks.notify(app=app, changes=[
+                ('delete', old_id, None, None), ('create', new_id, None, None)
+            ])
     logger.info(f'Set new identifiers for {changed} datasets')
     if changed == count:
         return True
@@ -34,12 +59,18 @@ async def read_write_all(app):
             data=canonical_doc
         )
         count += 1
-        result = await app.hooks.storage_update(
-            app=app, docid=docid, doc=canonical_doc,
-            searchable_text=searchable_text, etags={etag},
-            iso_639_1_code="nl")
-        if result:
-            changed += 1
+        status['processed'] = count
+        try:
+            new_etag = await app.hooks.storage_update(
+                app=app, docid=docid, doc=canonical_doc,
+                searchable_text=searchable_text, etags={etag},
+                iso_639_1_code="nl")
+        except (KeyError, ValueError):
+            # changed or deleted since it was read: the server is running
+            logger.warning(f'{docid} changed while rewriting datasets')
+            continue
+        await app.hooks.notify(app=app, changes=[('update', docid, etag, new_etag)])
+        changed += 1
     logger.info(f'read_write for {changed} datasets')
     if changed == count:
         return True
@@ -62,12 +93,18 @@ async def read_write_set_status_all(app):
         if 'ams:status' not in canonical_doc:
             canonical_doc['ams:status'] = 'beschikbaar'
         count += 1
-        result = await app.hooks.storage_update(
-            app=app, docid=docid, doc=canonical_doc,
-            searchable_text=searchable_text, etags={etag},
-            iso_639_1_code="nl")
-        if result:
-            changed += 1
+        status['processed'] = count
+        try:
+            new_etag = await app.hooks.storage_update(
+                app=app, docid=docid, doc=canonical_doc,
+                searchable_text=searchable_text, etags={etag},
+                iso_639_1_code="nl")
+        except (KeyError, ValueError):
+            # changed or deleted since it was read: the server is running
+            logger.warning(f'{docid} changed while rewriting datasets')
+            continue
+        await app.hooks.notify(app=app, changes=[('update', docid, etag, new_etag)])
+        changed += 1
     logger.info(f'read_write for {changed} datasets')
     if changed == count:
         return True
@@ -81,9 +118,34 @@ _startup_actions = [
 
 
 async def run_startup_actions(app):
-    for (name, action) in _startup_actions:
-        if not await app.hooks.check_startup_action(app=app, name=name):
-            result = await action(app)
-            if result:
-                await app.hooks.add_startup_action(app=app, name=name)
+    # language=rst
+    """Run the startup actions that haven't been done yet.
+
+    Meant to run in the background while the server handles requests. Only
+    one instance at a time runs the actions: others wait until they can
+    take over, and then skip the actions that are done.
+
+    """
+    status['state'] = 'waiting'
+    while not await app.hooks.lock_startup_actions(app=app):
+        await asyncio.sleep(_LOCK_INTERVAL_SECS)
+    status['state'] = 'running'
+    try:
+        for (name, action) in _startup_actions:
+            if not await app.hooks.check_startup_action(app=app, name=name):
+                logger.info(f'Running startup action {name}')
+                status.update(current=name, processed=0)
+                result = await action(app)
+                if result:
+                    await app.hooks.add_startup_action(app=app, name=name)
+                    status['completed'].append(name)
+                else:
+                    status['incomplete'].append(name)
+        status['state'] = 'done'
+    except Exception:
+        status['state'] = 'failed'
+        logger.exception(f'Startup action {status["current"]} failed')
+    finally:
+        status['current'] = None
+        await app.hooks.unlock_startup_actions(app=app)
 
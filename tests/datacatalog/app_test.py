@@ -1,12 +1,16 @@
+import asyncio
+import json
 import time
+import urllib.parse
 
 from os import path
 
-from aiohttp import FormData
+from aiohttp import ClientPayloadError, FormData
 from aiohttp.test_utils import unittest_run_loop
-from mockito import when, unstub, any
+from mockito import when, unstub, any, spy2, verify, patch
 from jwcrypto.jwt import JWT
 
+from datacatalog.handlers import datasets, streaming
 from datacatalog.plugins import postgres as pgpl, swift
 from datacatalog.jwks import get_keyset
 from tests.datacatalog.base_test_case import BaseTestCase
@@ -16,6 +20,24 @@ from tests.datacatalog.base_test_case import BaseTestCase
 _INVALID_TOKEN = "bearer invalid_token"
 
 _SUT_DOC_ID = '_FlXXpXDa-Ro3Q'
+_BULK_DOC_ID = 'bulk-test'
+_UNPUBLISHED_DOC_ID = 'changes-test'
+
+
+class _InterruptedStream(streaming.Stream):
+    """Awaits ``interruption(request)`` before writing the first dataset of
+    ``/harvest``, when the search holds a database connection."""
+    interruption = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._writes = 0
+
+    async def write(self, data: bytes) -> None:
+        self._writes += 1
+        if self._writes == 4:
+            await self.interruption(self._request)
+        await super().write(data)
 
 
 def create_valid_token(app, subject, scopes):
@@ -44,8 +66,8 @@ def create_valid_token(app, subject, scopes):
 
 class DatasetTestCase(BaseTestCase):
 
-    def setUp(self):
-        super().setUp()
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
         self.admin_token = create_valid_token(self.app, 'test@test.nl', ['CAT/W', 'CAT/R'])
         self.redact_token = create_valid_token(self.app, 'test@test.nl', ['CAT/R'])
 
@@ -193,6 +215,201 @@ class DatasetTestCase(BaseTestCase):
 
         self.assertEqual(response.status, 204, 'Redacteur mag ongepubliceerde dataset niet opslaan')
 
+    @unittest_run_loop
+    async def test_render_failure(self):
+        with open(self._WORKING_PATH + path.sep + 'test.json') as definition:
+            data = definition.read()
+        headers = {
+            'content-type': 'application/json',
+            'authorization': self.admin_token
+        }
+
+        # the dataset is stored before its representation is
+        when(datasets)._summarize(any).thenRaise(ValueError('summary'))
+        spy2(datasets.notify_data_changed)
+        try:
+            response = await self.client.request(
+                "POST", "/datasets", data=data, headers=headers)
+            self.assertEqual(response.status, 201)
+            etag = response.headers.get('Etag')
+            verify(datasets).notify_data_changed(
+                any, [('create', _SUT_DOC_ID, None, etag)])
+        finally:
+            unstub()
+
+        response = await self.client.request("GET", f"/datasets/{_SUT_DOC_ID}")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.headers.get('Etag'), etag)
+
+    @unittest_run_loop
+    async def test_patch(self):
+        with open(self._WORKING_PATH + path.sep + 'test.json') as definition:
+            data = definition.read()
+        headers = {
+            'content-type': 'application/json',
+            'authorization': self.admin_token
+        }
+        response = await self.client.request(
+            "POST", "/datasets", data=data, headers=headers)
+        self.assertEqual(response.status, 201)
+        etag = response.headers.get('Etag')
+
+        async def patch(operations, etag=etag):
+            return await self.client.request(
+                "PATCH", f"/datasets/{_SUT_DOC_ID}", data=json.dumps(operations),
+                headers={**headers, 'content-type': 'application/json-patch+json',
+                         'If-Match': etag})
+
+        for operations, status in [
+            ([{'op': 'test', 'path': '/dct:title', 'value': 'Anders'}], 409),
+            ([{'op': 'remove', 'path': '/nonexistent'}], 409),
+            ([{'op': 'append', 'path': '/dct:title', 'value': 'Nieuw'}], 400),
+            ({'op': 'add', 'path': '/dct:title', 'value': 'Nieuw'}, 400),
+            ([{'op': 'replace', 'path': '', 'value': ['Nieuw']}], 422),
+            ([{'op': 'replace', 'path': '/dct:title', 'value': 5}], 422),
+        ]:
+            response = await patch(operations)
+            self.assertEqual(response.status, status, operations)
+        response = await patch([], etag='"random"')
+        self.assertEqual(response.status, 412)
+
+        # none of the above changed the dataset
+        response = await self.client.request("GET", f"/datasets/{_SUT_DOC_ID}")
+        self.assertEqual(response.headers.get('Etag'), etag)
+
+        response = await patch([
+            {'op': 'test', 'path': '/dct:title', 'value': 'Ouderen'},
+            {'op': 'replace', 'path': '/dct:title', 'value': 'Nieuw'},
+            {'op': 'add', 'path': '/dcat:keyword/-', 'value': 'nieuw'},
+        ])
+        self.assertEqual(response.status, 204)
+        new_etag = response.headers.get('Etag')
+        self.assertNotEqual(new_etag, etag)
+        response = await self.client.request("GET", f"/datasets/{_SUT_DOC_ID}")
+        self.assertEqual(response.headers.get('Etag'), new_etag)
+        doc = await response.json()
+        self.assertEqual(doc['dct:title'], 'Nieuw')
+        self.assertEqual(doc['dcat:keyword'][-1], 'nieuw')
+
+        response = await self.client.request(
+            "GET", "/datasets", params={'q': 'nieuw'})
+        self.assertIn(_SUT_DOC_ID, await response.text())
+
+    @unittest_run_loop
+    async def test_batch(self):
+        with open(self._WORKING_PATH + path.sep + 'test.json') as definition:
+            data = definition.read()
+        headers = {
+            'content-type': 'application/json',
+            'authorization': self.admin_token
+        }
+
+        response = await self.client.request(
+            "POST", "/datasets", data=data, headers=headers)
+        self.assertEqual(response.status, 201)
+        etag = response.headers.get('Etag')
+        doc = json.loads(data)
+        doc['dct:title'] = 'Ouderen in Amsterdam'
+        items = [
+            {'id': _SUT_DOC_ID, 'etag': etag, 'dataset': doc},
+            {'id': 'nonexistent', 'etag': etag, 'dataset': doc},
+        ]
+
+        # the whole batch is notified before any representation is stored
+        calls = []
+
+        async def notify(app, changes):
+            calls.append(changes)
+
+        def summarize(canonical_doc):
+            calls.append('summarize')
+            raise ValueError('summary')
+
+        when(datasets).notify_data_changed(any, any).thenAnswer(notify)
+        when(datasets)._summarize(any).thenAnswer(summarize)
+        try:
+            response = await self.client.request(
+                "POST", "/datasets/_batch", json=items, headers=headers)
+            self.assertEqual(response.status, 200)
+            results = await response.json()
+            self.assertEqual([(r['id'], r['status']) for r in results],
+                             [(_SUT_DOC_ID, 204), ('nonexistent', 404)])
+            new_etag = results[0]['etag']
+            self.assertEqual(calls, [[('update', _SUT_DOC_ID, etag, new_etag)], 'summarize'])
+        finally:
+            unstub()
+
+        # the etag of the update is outdated now
+        response = await self.client.request(
+            "POST", "/datasets/_batch", json=items[:1], headers=headers)
+        self.assertEqual((await response.json())[0]['status'], 412)
+
+        response = await self.client.request("GET", f"/datasets/{_SUT_DOC_ID}")
+        self.assertEqual(response.headers.get('Etag'), new_etag)
+        self.assertEqual((await response.json())['dct:title'], 'Ouderen in Amsterdam')
+
+    @unittest_run_loop
+    async def test_bulk(self):
+        with open(self._WORKING_PATH + path.sep + 'test.json') as definition:
+            data = definition.read()
+        headers = {
+            'content-type': 'application/json',
+            'authorization': self.admin_token
+        }
+
+        response = await self.client.request(
+            "POST", "/datasets", data=data, headers=headers)
+        self.assertEqual(response.status, 201)
+        doc = json.loads(data)
+        doc['dct:identifier'] = _BULK_DOC_ID
+        lines = [
+            data.replace('\n', ' '),  # exists already
+            json.dumps(doc),
+            '',
+            'invalid json',
+            json.dumps(doc),  # duplicate
+        ]
+
+        # the chunk is notified before any representation is stored
+        calls = []
+
+        async def notify(app, changes):
+            calls.append(changes)
+
+        def summarize(canonical_doc):
+            calls.append('summarize')
+            raise ValueError('summary')
+
+        when(datasets).notify_data_changed(any, any).thenAnswer(notify)
+        when(datasets)._summarize(any).thenAnswer(summarize)
+        try:
+            response = await self.client.request(
+                "POST", "/datasets/_bulk", data='\n'.join(lines),
+                headers={**headers, 'content-type': 'application/x-ndjson'})
+            self.assertEqual(response.status, 200)
+            results = [json.loads(line) for line in (await response.text()).splitlines()]
+        finally:
+            unstub()
+        try:
+            self.assertEqual(
+                [(r['line'], r['status'], r.get('id')) for r in results],
+                [(1, 400, _SUT_DOC_ID), (2, 201, _BULK_DOC_ID), (4, 400, None), (5, 400, _BULK_DOC_ID)])
+            self.assertIn('already exists', results[0]['error'])
+            self.assertIn('already exists', results[3]['error'])
+            etag = results[1]['etag']
+            self.assertEqual(calls, [[('create', _BULK_DOC_ID, None, etag)], 'summarize'])
+
+            response = await self.client.request("GET", f"/datasets/{_BULK_DOC_ID}")
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.headers.get('Etag'), etag)
+        finally:
+            try:
+                _, etag = await pgpl.storage_retrieve(app=self.app, docid=_BULK_DOC_ID)
+            except KeyError:
+                pass
+            else:
+                await pgpl.storage_delete(app=self.app, docid=_BULK_DOC_ID, etags={etag})
+
     @unittest_run_loop
     async def testUpload(self):
         headers = {
@@ -227,17 +444,193 @@ class DatasetTestCase(BaseTestCase):
 
         self.assertEqual(response.status, 201, 'File upload mislukt')
 
-    def tearDown(self):
-        async def cleanup():
+    @unittest_run_loop
+    async def test_changes(self):
+        async def changes(url, **headers):
+            response = await self.client.request("GET", url, headers=headers)
+            self.assertEqual(response.status, 200)
+            text = await response.text()
+            result = json.loads(text)
+            next_url = urllib.parse.urlsplit(result['ams:next'])
+            next_query = urllib.parse.parse_qs(next_url.query)
+            return result['ams:changes'], f'{next_url.path}?{next_url.query}', next_query, text
+
+        for query in ('since=-1', 'since=x', 'limit=-1', 'limit=x', 'since_id=x'):
+            response = await self.client.request("GET", f"/changes?{query}")
+            self.assertEqual(response.status, 400, query)
+
+        # from the current state on
+        _, start, _, _ = await changes("/changes")
+
+        with open(self._WORKING_PATH + path.sep + 'test.json') as definition:
+            data = definition.read()
+        with open(self._WORKING_PATH + path.sep + 'test_unpublished.json') as definition:
+            unpublished_doc = json.load(definition)
+        unpublished_doc['dct:identifier'] = _UNPUBLISHED_DOC_ID
+        unpublished_doc['dct:title'] = 'Niet openbaar'
+        headers = {
+            'content-type': 'application/json',
+            'authorization': self.admin_token
+        }
+        try:
+            response = await self.client.request(
+                "POST", "/datasets", data=data, headers=headers)
+            self.assertEqual(response.status, 201)
+            etag = response.headers.get('Etag')
+            response = await self.client.request(
+                "POST", "/datasets", data=json.dumps(unpublished_doc), headers=headers)
+            self.assertEqual(response.status, 201)
+            unpublished_etag = response.headers.get('Etag')
+
+            # datasets that aren't public are deletes to anonymous callers
+            result, _, _, text = await changes(start)
+            self.assertEqual([(change['id'], change['operation']) for change in result],
+                             [(_SUT_DOC_ID, 'upsert'), (_UNPUBLISHED_DOC_ID, 'delete')])
+            self.assertEqual(result[0]['etag'], etag)
+            self.assertEqual(result[0]['dataset']['dct:identifier'], _SUT_DOC_ID)
+            self.assertEqual(set(result[1]), {'seq', 'id', 'operation'})
+            self.assertNotIn('Niet openbaar', text)
+
+            result, _, _, _ = await changes(start, authorization=self.redact_token)
+            self.assertEqual([(change['id'], change['operation'], change['etag']) for change in result],
+                             [(_SUT_DOC_ID, 'upsert', etag),
+                              (_UNPUBLISHED_DOC_ID, 'upsert', unpublished_etag)])
+            self.assertEqual(result[1]['dataset']['dct:title'], 'Niet openbaar')
+            seqs = [change['seq'] for change in result]
+
+            # page by page
+            result, next_url, next_query, _ = await changes(start + '&limit=1')
+            self.assertEqual([change['id'] for change in result], [_SUT_DOC_ID])
+            self.assertEqual(next_query, {'since': [str(seqs[0])], 'since_id': [_SUT_DOC_ID],
+                                          'limit': ['1']})
+            result, next_url, next_query, _ = await changes(next_url)
+            self.assertEqual([change['id'] for change in result], [_UNPUBLISHED_DOC_ID])
+            self.assertEqual(next_query, {'since': [str(seqs[1])], 'since_id': [_UNPUBLISHED_DOC_ID],
+                                          'limit': ['1']})
+            # without changes the next link stays the same
+            result, last_url, _, _ = await changes(next_url)
+            self.assertEqual(result, [])
+            self.assertEqual(last_url, next_url)
+
+            response = await self.client.request(
+                "DELETE", f"/datasets/{_UNPUBLISHED_DOC_ID}",
+                headers={**headers, 'If-Match': unpublished_etag})
+            self.assertEqual(response.status, 204)
+            result, _, _, _ = await changes(next_url, authorization=self.redact_token)
+            self.assertEqual([(change['id'], change['operation']) for change in result],
+                             [(_UNPUBLISHED_DOC_ID, 'delete')])
+        finally:
             try:
-                _, etag = await pgpl.storage_retrieve(
-                    app=self.app, docid=_SUT_DOC_ID)
+                _, unpublished_etag = await pgpl.storage_retrieve(app=self.app, docid=_UNPUBLISHED_DOC_ID)
             except KeyError:
-                # Nothing to clean
-                return
+                pass
+            else:
+                await pgpl.storage_delete(app=self.app, docid=_UNPUBLISHED_DOC_ID, etags={unpublished_etag})
+
+    def test_notify_callback(self):
+        changes = []
+        self.app.subscribe(changes.append)
+
+        def notify(change_number, channel='channel'):
+            self.app.notify_callback(None, 1, channel, json.dumps({
+                'operation': 'update', 'id': _SUT_DOC_ID,
+                'old_etag': None, 'new_etag': None, 'change_number': change_number
+            }))
+            return [change and change['change_number'] for change in changes]
+
+        try:
+            self.assertEqual(notify(1), [1])
+            self.assertEqual(notify(2), [1, 2])
+            # skipped
+            self.assertEqual(notify(5), [1, 2, None, 5])
+            # out of order
+            self.assertEqual(notify(4), [1, 2, None, 5, 4])
+            self.assertEqual(notify(6), [1, 2, None, 5, 4, 6])
+            self.assertEqual(notify(8), [1, 2, None, 5, 4, 6, None, 8])
+            self.assertEqual(notify(7), [1, 2, None, 5, 4, 6, None, 8, 7])
+            self.assertEqual(notify(9, channel='other'), [1, 2, None, 5, 4, 6, None, 8, 7])
+            # not a change, e.g. from an older version
+            changes.clear()
+            self.app.notify_callback(None, 1, 'channel', 'data_changed')
+            self.assertEqual(changes, [None])
+            # there's no gap after changes were missed
+            self.assertEqual(notify(12), [None, 12])
+            self.assertEqual(notify(13), [None, 12, 13])
+        finally:
+            self.app.unsubscribe(changes.append)
 
-            if etag:
-                await pgpl.storage_delete(
-                    app=self.app, docid=_SUT_DOC_ID, etags={etag})
-
-        self.loop.run_until_complete(cleanup())
+    @unittest_run_loop
+    async def test_streaming_abort(self):
+        with open(self._WORKING_PATH + path.sep + 'test.json') as definition:
+            data = definition.read()
+        headers = {
+            'content-type': 'application/json',
+            'authorization': self.admin_token
+        }
+        response = await self.client.request(
+            "POST", "/datasets", data=data, headers=headers)
+        self.assertEqual(response.status, 201)
+
+        pool = self.app['pool']
+        idle_size = pool.get_idle_size()
+        web_config = self.app.config['web']
+
+        async def disconnect(request):
+            self.assertLess(pool.get_idle_size(), idle_size)
+            while request.transport is not None and not request.transport.is_closing():
+                await asyncio.sleep(0.01)
+
+        async def timeout(request):
+            self.assertLess(pool.get_idle_size(), idle_size)
+            await asyncio.sleep(0.2)
+
+        # the test server cancels the handler when the client disconnects,
+        # web.run_app() doesn't
+        server = self.server.runner.server
+        patch(streaming, 'Stream', _InterruptedStream)
+        try:
+            for interruption, reason, cancellation in (
+                (disconnect, 'disconnected', True),
+                (disconnect, 'disconnected', False),
+                (timeout, 'timeout', False),
+            ):
+                _InterruptedStream.interruption = staticmethod(interruption)
+                server.handler_cancellation = cancellation
+                if reason == 'timeout':
+                    web_config['max_streaming_duration'] = 0.1
+                aborted = streaming.aborted[reason]
+                response = await self.client.request("GET", "/harvest")
+                self.assertEqual(response.status, 200)
+                if reason == 'disconnected':
+                    response.close()
+                else:
+                    with self.assertRaises(ClientPayloadError):
+                        await response.read()
+                for _ in range(100):
+                    if streaming.aborted[reason] > aborted:
+                        break
+                    await asyncio.sleep(0.01)
+                self.assertEqual(streaming.aborted[reason], aborted + 1, (reason, cancellation))
+                self.assertEqual(pool.get_idle_size(), idle_size, (reason, cancellation))
+        finally:
+            unstub()
+            server.handler_cancellation = True
+            web_config.pop('max_streaming_duration', None)
+
+        response = await self.client.request("GET", "/system/stats")
+        stats = await response.json()
+        self.assertEqual(stats['aborted_streams'], streaming.aborted)
+
+    async def asyncTearDown(self):
+        # before the application, and its connection pool, is closed
+        try:
+            _, etag = await pgpl.storage_retrieve(
+                app=self.app, docid=_SUT_DOC_ID)
+        except KeyError:
+            # Nothing to clean
+            etag = None
+
+        if etag:
+            await pgpl.storage_delete(
+                app=self.app, docid=_SUT_DOC_ID, etags={etag})
+        await super().asyncTearDown()
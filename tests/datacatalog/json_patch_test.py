@@ -0,0 +1,136 @@
+"""Tests for JSON Patch.
+"""
+import copy
+
+import pytest
+
+from datacatalog import json_patch
+
+
+_DOC = {
+    'title': 'Title',
+    'keywords': ['a', 'b'],
+    'distribution': [{'id': 'd1', 'size': 1}],
+    'flag': True,
+}
+
+
+def _apply(patch):
+    doc = copy.deepcopy(_DOC)
+    result = json_patch.apply(doc, patch)
+    # the original document is never changed
+    assert doc == _DOC
+    return result
+
+
+def test_add():
+    assert _apply([{'op': 'add', 'path': '/owner', 'value': 'me'}]) == {**_DOC, 'owner': 'me'}
+    assert _apply([{'op': 'add', 'path': '/title', 'value': 'New'}])['title'] == 'New'
+    assert _apply([{'op': 'add', 'path': '/keywords/0', 'value': 'z'}])['keywords'] == ['z', 'a', 'b']
+    assert _apply([{'op': 'add', 'path': '/keywords/2', 'value': 'z'}])['keywords'] == ['a', 'b', 'z']
+    assert _apply([{'op': 'add', 'path': '/keywords/-', 'value': 'z'}])['keywords'] == ['a', 'b', 'z']
+    assert _apply([{'op': 'add', 'path': '', 'value': {'new': 1}}]) == {'new': 1}
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'add', 'path': '/missing/child', 'value': 1}])
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'add', 'path': '/title/child', 'value': 1}])
+
+
+def test_remove():
+    assert 'title' not in _apply([{'op': 'remove', 'path': '/title'}])
+    assert _apply([{'op': 'remove', 'path': '/keywords/0'}])['keywords'] == ['b']
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'remove', 'path': '/missing'}])
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'remove', 'path': ''}])
+
+
+def test_replace():
+    assert _apply([{'op': 'replace', 'path': '/title', 'value': 'New'}])['title'] == 'New'
+    assert _apply([{'op': 'replace', 'path': '/distribution/0/size', 'value': 2}])['distribution'] == [
+        {'id': 'd1', 'size': 2}]
+    assert _apply([{'op': 'replace', 'path': '', 'value': ['root']}]) == ['root']
+    # unlike add, replace needs an existing value
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'replace', 'path': '/missing', 'value': 1}])
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'replace', 'path': '/keywords/-', 'value': 1}])
+
+
+def test_move():
+    result = _apply([{'op': 'move', 'from': '/title', 'path': '/name'}])
+    assert 'title' not in result and result['name'] == 'Title'
+    assert _apply([{'op': 'move', 'from': '/keywords/0', 'path': '/keywords/-'}])['keywords'] == ['b', 'a']
+    assert _apply([{'op': 'move', 'from': '/title', 'path': '/title'}]) == _DOC
+    with pytest.raises(json_patch.PatchError):
+        _apply([{'op': 'move', 'from': '/distribution', 'path': '/distribution/0'}])
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'move', 'from': '/missing', 'path': '/title'}])
+
+
+def test_copy():
+    result = _apply([{'op': 'copy', 'from': '/distribution/0', 'path': '/distribution/-'}])
+    assert result['distribution'] == [{'id': 'd1', 'size': 1}, {'id': 'd1', 'size': 1}]
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'copy', 'from': '/missing', 'path': '/title'}])
+
+
+def test_test():
+    assert _apply([{'op': 'test', 'path': '/keywords', 'value': ['a', 'b']}]) == _DOC
+    assert _apply([{'op': 'test', 'path': '/distribution/0', 'value': {'size': 1, 'id': 'd1'}}]) == _DOC
+    for path, value in (('/title', 'Other'), ('/keywords', ['b', 'a']), ('/keywords/0', None)):
+        with pytest.raises(json_patch.PatchConflict):
+            _apply([{'op': 'test', 'path': path, 'value': value}])
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'test', 'path': '/missing', 'value': None}])
+    # operations after a failed test aren't applied either
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'remove', 'path': '/title'}, {'op': 'test', 'path': '/title', 'value': 'Title'}])
+
+
+def test_test_equality():
+    # in JSON, true isn't 1, but 1 is 1.0
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'test', 'path': '/flag', 'value': 1}])
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'test', 'path': '/distribution/0/size', 'value': True}])
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'test', 'path': '/distribution', 'value': [{'id': 'd1', 'size': True}]}])
+    assert _apply([{'op': 'test', 'path': '/flag', 'value': True}]) == _DOC
+    assert _apply([{'op': 'test', 'path': '/distribution/0/size', 'value': 1.0}]) == _DOC
+
+
+def test_array_indexes():
+    for index in ('2', '-1', '01', 'x'):
+        with pytest.raises(json_patch.PatchConflict):
+            _apply([{'op': 'remove', 'path': '/keywords/' + index}])
+    for index in ('3', '-1', '01'):
+        with pytest.raises(json_patch.PatchConflict):
+            _apply([{'op': 'add', 'path': '/keywords/' + index, 'value': 'z'}])
+    with pytest.raises(json_patch.PatchConflict):
+        _apply([{'op': 'test', 'path': '/keywords/-', 'value': 'b'}])
+
+
+def test_copy_on_write():
+    doc = copy.deepcopy(_DOC)
+    result = json_patch.apply(doc, [{'op': 'add', 'path': '/keywords/-', 'value': 'z'}])
+    assert result is not doc and result['keywords'] is not doc['keywords']
+    # what the patch doesn't change is shared
+    assert result['distribution'] is doc['distribution']
+    assert json_patch.apply(doc, []) is doc
+
+
+def test_malformed():
+    for patch in (
+        {'op': 'add', 'path': '/title', 'value': 1},
+        ['add'],
+        [{'op': 'append', 'path': '/title', 'value': 1}],
+        [{'path': '/title', 'value': 1}],
+        [{'op': 'add', 'value': 1}],
+        [{'op': 'add', 'path': 'title', 'value': 1}],
+        [{'op': 'add', 'path': '/title'}],
+        [{'op': 'move', 'path': '/title'}],
+        [{'op': 'copy', 'from': 1, 'path': '/title'}],
+    ):
+        with pytest.raises(json_patch.PatchError):
+            _apply(patch)
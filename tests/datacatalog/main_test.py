@@ -0,0 +1,75 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from os import path
+
+from click.testing import CliRunner
+
+from datacatalog import application, main
+
+
+_WORKING_PATH = path.dirname(path.abspath(__file__))
+
+_IMPORT_DOC_IDS = ['import-test-1', 'import-test-2']
+
+
+class ImportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        os.environ['CONFIG_PATH'] = _WORKING_PATH + path.sep + 'integration_config.yml'
+        with open(_WORKING_PATH + path.sep + 'test.json') as definition:
+            doc = json.load(definition)
+        lines = []
+        for docid in _IMPORT_DOC_IDS + _IMPORT_DOC_IDS[:1]:
+            doc['dct:identifier'] = docid
+            lines.append(json.dumps(doc))
+        lines.insert(1, 'invalid json')
+        self.file = tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False)
+        self.file.write('\n'.join(lines) + '\n')
+        self.file.close()
+
+    def tearDown(self):
+        os.unlink(self.file.name)
+        # the command runs on uvloop
+        asyncio.set_event_loop_policy(None)
+
+        async def cleanup():
+            app = application.Application()
+            await app.hooks.initialize(app=app)
+            try:
+                for docid in _IMPORT_DOC_IDS:
+                    try:
+                        _, etag = await app.hooks.storage_retrieve(app=app, docid=docid, etags=None)
+                    except KeyError:
+                        continue
+                    await app.hooks.storage_delete(app=app, docid=docid, etags={etag})
+            finally:
+                await app.hooks.deinitialize(app=app)
+
+        asyncio.run(cleanup())
+
+    def _import(self, *args):
+        result = CliRunner().invoke(main.main, ['import', self.file.name, *args])
+        return result.exit_code, [
+            json.loads(line) for line in result.output.splitlines() if line.startswith('{')
+        ]
+
+    def test_import(self):
+        # one dataset per transaction, so the duplicate is in another batch
+        exit_code, results = self._import('--batch-size', '1')
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(
+            [(r['line'], r['status'], r.get('id')) for r in results],
+            [(1, 201, 'import-test-1'), (2, 400, None), (3, 201, 'import-test-2'),
+             (4, 400, 'import-test-1')])
+        self.assertIn('already exists', results[3]['error'])
+
+        # all datasets exist now
+        exit_code, results = self._import()
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(
+            [(r['line'], r['status']) for r in results],
+            [(1, 400), (2, 400), (3, 400), (4, 400)])
+        self.assertIn('already exists', results[0]['error'])
@@ -3,6 +3,7 @@
 import asyncio
 import base64
 import copy
+import json
 import os
 from os import path
 
@@ -11,6 +12,7 @@ import pytest
 
 from datacatalog import config, plugin_interfaces
 from datacatalog.plugins import postgres as postgres_plugin
+from datacatalog.plugins.postgres import migrations
 
 # set the config file location
 os.environ['CONFIG_PATH'] = os.path.dirname(
@@ -56,8 +58,19 @@ class MockApp(dict):
         super().__init__()
         self.loop = loop
         self.config = config
+        self.subscribers = []
         loop.run_until_complete(postgres_plugin.initialize(self))
 
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def notify_callback(self, conn, pid, channel, payload):
+        for callback in self.subscribers:
+            callback(json.loads(payload))
+
 
 @pytest.yield_fixture(scope='module')
 def event_loop():
@@ -116,6 +129,110 @@ def test_health_check(event_loop, app):
         postgres_plugin.health_check(app=app)) is None
 
 
+def test_migrations(event_loop, app):
+    all_migrations = migrations.migrations()
+    assert [m.version for m in all_migrations] == list(range(1, len(all_migrations) + 1))
+
+    async def schema_version():
+        async with app['pool'].acquire() as con:
+            return await migrations.schema_version(con)
+
+    # applied by initialize()
+    assert event_loop.run_until_complete(schema_version()) == all_migrations[-1].version
+    assert event_loop.run_until_complete(migrations.migrate(app['pool'])) == 0
+
+    migration = migrations.Migration(
+        3, 'test', '-- no transaction\nDROP INDEX CONCURRENTLY a;\nCREATE INDEX CONCURRENTLY a ON b (c);\n')
+    assert not migration.transactional
+    assert [statement.strip() for statement in migration.statements()] == [
+        '-- no transaction\nDROP INDEX CONCURRENTLY a', 'CREATE INDEX CONCURRENTLY a ON b (c)']
+    migration = migrations.Migration(
+        3, 'test', '-- no transaction\nDO $$\nBEGIN\n    COMMIT;\nEND\n$$;\nSELECT 1;\n')
+    assert [statement.strip() for statement in migration.statements()] == [
+        '-- no transaction\nDO $$\nBEGIN\n    COMMIT;\nEND\n$$', 'SELECT 1']
+
+
+
+def test_backfill_migration(event_loop, corpus, app):
+    # the columns and facets that 0004 fills are the ones written by the plugin
+    docs = {
+        'dutch_dataset1': {
+            'ams:sort_modified': '2018-03-01T12:00:00', 'dct:title': 'Titel',
+            'foaf:isPrimaryTopicOf': {'dct:issued': '2018-02-30', 'dct:modified': '2018-03-01'},
+            'ams:status': 'beschikbaar', 'ams:owner': True, 'dct:language': 'lang1:nl',
+            'dct:temporal': {'time:hasBeginning': '2017-01-01', 'time:hasEnd': 'invalid'},
+            'dcat:distribution': [
+                {'dcat:byteSize': 10, 'dcat:mediaType': 'text/csv', 'ams:resourceType': ['data']},
+                {'dcat:byteSize': ' 1000 ', 'dcat:mediaType': 'text/csv'},
+                {'dcat:byteSize': True},
+                'distribution',
+            ],
+            'dcat:keyword': ['foo', 'bar', 'foo', 1],
+            'dcat:theme': 'theme:energie',
+        },
+        'english_dataset1': {
+            'dct:title': ['Title'],
+            'dcat:distribution': {'dcat:byteSize': 10},
+            'dcat:theme': ['theme:energie'],
+        },
+    }
+    columns = ('sort_modified, sort_title, sort_issued, filter_status, filter_owner, filter_language, '
+               'range_modified, range_beginning, range_end, range_byte_size_min, range_byte_size_max, '
+               'searchable_text_stemmed')
+    migration = migrations.migrations()[3]
+    assert migration.name == 'backfill_dataset_columns'
+
+    async def update():
+        for doc_id, doc in docs.items():
+            record = corpus[doc_id]
+            record['doc'].update(doc)
+            record['etag'] = await postgres_plugin.storage_update(
+                app=app, docid=doc_id, doc=record['doc'],
+                searchable_text=record['searchable_text'],
+                etags={record['etag']}, iso_639_1_code=record['iso_639_1_code'])
+
+    async def stored():
+        async with app['pool'].acquire() as con:
+            return (
+                await con.fetch(f'SELECT id, {columns} FROM dataset WHERE id = ANY($1) ORDER BY id',
+                                list(corpus)),
+                await con.fetch('SELECT * FROM dataset_facet WHERE dataset_id = ANY($1) '
+                                'ORDER BY dataset_id, facet, value', list(corpus)),
+            )
+
+    async def backfill():
+        async with app['pool'].acquire() as con:
+            await con.execute(
+                "UPDATE dataset SET sort_modified='-infinity', sort_title='', sort_issued='-infinity', "
+                "filter_status=NULL, filter_owner=NULL, filter_language=NULL, range_modified=NULL, "
+                "range_beginning=NULL, range_end=NULL, range_byte_size_min=NULL, range_byte_size_max=NULL, "
+                "searchable_text_stemmed=NULL WHERE id = ANY($1)", list(corpus))
+            await con.execute('DELETE FROM dataset_facet WHERE dataset_id = ANY($1)', list(corpus))
+            for statement in migration.statements():
+                await con.execute(statement)
+
+    event_loop.run_until_complete(update())
+    expected = event_loop.run_until_complete(stored())
+    assert len(expected[1]) > 0
+    event_loop.run_until_complete(backfill())
+    assert event_loop.run_until_complete(stored()) == expected
+
+def test_lock_startup_actions(event_loop, app):
+    async def locked_elsewhere():
+        async with app['pool'].acquire() as con:
+            if await con.fetchval(postgres_plugin._Q_TRY_LOCK, postgres_plugin._STARTUP_ACTIONS_LOCK_KEY):
+                await con.fetchval(postgres_plugin._Q_UNLOCK, postgres_plugin._STARTUP_ACTIONS_LOCK_KEY)
+                return False
+            return True
+
+    assert event_loop.run_until_complete(postgres_plugin.lock_startup_actions(app=app))
+    try:
+        assert event_loop.run_until_complete(locked_elsewhere())
+    finally:
+        event_loop.run_until_complete(postgres_plugin.unlock_startup_actions(app=app))
+    assert not event_loop.run_until_complete(locked_elsewhere())
+
+
 def test_storage_create(corpus):
     # if the corpus fixture includes all doc ids from _corpus and has etags,
     # then uploading works.
@@ -125,6 +242,66 @@ def test_storage_create(corpus):
         assert record['etag'] is not None
 
 
+@pytest.mark.parametrize('codec', sorted(postgres_plugin.JSONB_CODECS))
+def test_jsonb_codecs(codec):
+    encoder, decoder = postgres_plugin.JSONB_CODECS[codec]
+    doc = {'dct:title': 'Parkeervakken in de Jordaan – “actueel”', 'size': 12345678901, 'a': [1.5, None, True]}
+    assert decoder(encoder(doc)) == doc
+
+
+def test_storage_etag(event_loop, app):
+    doc = {'id': 'etag_dataset', 'dct:title': 'Café ‘t Smalle', 'b': [1, {'d': 2, 'c': None}]}
+    etag = event_loop.run_until_complete(postgres_plugin.storage_create(
+        app=app, docid='etag_dataset', doc=doc, searchable_text={}, iso_639_1_code=None))
+    try:
+        # etags don't depend on the jsonb codec
+        assert etag == postgres_plugin._etag_from_str(json.dumps(doc, ensure_ascii=False, sort_keys=True))
+        assert event_loop.run_until_complete(postgres_plugin.storage_retrieve(
+            app=app, docid='etag_dataset')) == (doc, etag)
+    finally:
+        event_loop.run_until_complete(postgres_plugin.storage_delete(
+            app=app, docid='etag_dataset', etags={etag}))
+
+
+def test_storage_create_many(event_loop, corpus, app):
+    docs = [
+        ('bulk_dataset1', {'id': 'bulk_dataset1', 'dcat:keyword': ['bulk', 'bulk']},
+         {'A': 'bulkimport'}, 'nl'),
+        ('dutch_dataset1', {'id': 'dutch_dataset1'}, {}, 'nl'),
+        ('bulk_dataset2', {'id': 'bulk_dataset2', 'ams:sort_modified': '2020-02-02'},
+         {'C': 'bulkimport'}, 'en'),
+        ('bulk_dataset1', {'id': 'bulk_dataset1'}, {}, 'nl'),
+    ]
+
+    async def search(facet):
+        result_info = {}
+        result = [r async for r in postgres_plugin.search_search(
+            app=app, q='bulkimport', sortpath=['@id'], result_info=result_info,
+            facets=[facet])]
+        return result, result_info[facet]
+
+    etags = event_loop.run_until_complete(postgres_plugin.storage_create_many(app=app, docs=docs))
+    try:
+        # existing and repeated ids aren't stored
+        assert etags[1] is None and etags[3] is None
+        assert event_loop.run_until_complete(postgres_plugin.storage_retrieve(
+            app=app, docid='dutch_dataset1')) == (corpus['dutch_dataset1']['doc'], corpus['dutch_dataset1']['etag'])
+        for (docid, doc, _text, _lang), etag in zip(docs[::2], etags[::2]):
+            assert event_loop.run_until_complete(postgres_plugin.storage_retrieve(
+                app=app, docid=docid)) == (doc, etag)
+        # documents created one by one get the same etag
+        assert etags[0] == postgres_plugin._etag_from_str(
+            json.dumps(docs[0][1], ensure_ascii=False, sort_keys=True))
+        facet = '/properties/dcat:keyword/items'
+        result, facet_counts = event_loop.run_until_complete(search(facet))
+        assert {docid for docid, _doc in result} == {'bulk_dataset1', 'bulk_dataset2'}
+        assert facet_counts == {'bulk': 2}
+    finally:
+        for (docid, _doc, _text, _lang), etag in zip(docs[::2], etags[::2]):
+            event_loop.run_until_complete(postgres_plugin.storage_delete(
+                app=app, docid=docid, etags={etag}))
+
+
 def test_storage_retrieve_no_etag(event_loop, corpus, app):
     for doc_id, record in corpus.items():
         doc, etag = event_loop.run_until_complete(
@@ -152,6 +329,68 @@ def test_storage_retrieve_with_old_etag(event_loop, corpus, app):
         assert etag == record['etag']
 
 
+def test_storage_rendered(event_loop, corpus, app):
+    record = corpus['dutch_dataset1']
+
+    async def retrieve(version):
+        return await postgres_plugin.storage_retrieve_rendered(
+            app=app, docid='dutch_dataset1', version=version)
+
+    async def store(etag, rendered):
+        await postgres_plugin.storage_store_rendered(
+            app=app, docid='dutch_dataset1', etag=etag, version='1',
+            rendered=rendered)
+
+    assert event_loop.run_until_complete(retrieve('1')) == (None, record['etag'])
+    event_loop.run_until_complete(store(record['etag'], b'{"v": 1}'))
+    assert event_loop.run_until_complete(retrieve('1')) == (b'{"v": 1}', record['etag'])
+    assert event_loop.run_until_complete(retrieve('2')) == (None, record['etag'])
+    # renderings of other versions of the document are ignored
+    event_loop.run_until_complete(store('oldetag', b'{"v": 0}'))
+    assert event_loop.run_until_complete(retrieve('1')) == (b'{"v": 1}', record['etag'])
+    record['etag'] = event_loop.run_until_complete(postgres_plugin.storage_update(
+        app=app, docid='dutch_dataset1', doc={'id': 'dutch_dataset1'},
+        searchable_text=record['searchable_text'], etags={record['etag']},
+        iso_639_1_code=record['iso_639_1_code']))
+    assert event_loop.run_until_complete(retrieve('1')) == (None, record['etag'])
+
+    with pytest.raises(KeyError):
+        event_loop.run_until_complete(postgres_plugin.storage_retrieve_rendered(
+            app=app, docid='nonexistent', version='1'))
+
+
+def test_search_search_summaries(event_loop, corpus, app):
+    async def search(summary_version, q=''):
+        return {r[0]: r[1:] async for r in postgres_plugin.search_search(
+            app=app, q=q, sortpath=['id'], result_info={},
+            summary_version=summary_version)}
+
+    record = corpus['dutch_dataset1']
+    event_loop.run_until_complete(postgres_plugin.storage_store_summary(
+        app=app, docid='dutch_dataset1', etag=record['etag'], version='1',
+        summary={'id': 'samenvatting'}))
+    for q in ('', record['searchable_text']['C']):
+        results = event_loop.run_until_complete(search('1', q))
+        assert results['dutch_dataset1'] == ({'id': 'samenvatting'}, None, record['etag'])
+        for docid, result in results.items():
+            if docid != 'dutch_dataset1':
+                assert result == (None, corpus[docid]['doc'], corpus[docid]['etag'])
+    # summaries of other versions are ignored
+    results = event_loop.run_until_complete(search('2'))
+    assert results['dutch_dataset1'] == (None, record['doc'], record['etag'])
+    # as are summaries of older versions of the document
+    record['doc'] = {'id': 'dutch_dataset1'}
+    record['etag'] = event_loop.run_until_complete(postgres_plugin.storage_update(
+        app=app, docid='dutch_dataset1', doc=record['doc'],
+        searchable_text=record['searchable_text'], etags={record['etag']},
+        iso_639_1_code=record['iso_639_1_code']))
+    results = event_loop.run_until_complete(search('1'))
+    assert results['dutch_dataset1'] == (None, record['doc'], record['etag'])
+    # without a summary version only documents are returned
+    results = event_loop.run_until_complete(search(None))
+    assert results['dutch_dataset1'] == (record['doc'],)
+
+
 def test_storage_extract(event_loop, corpus, app):
     # test ids
     async def retrieve_ids():
@@ -170,6 +409,102 @@ def test_storage_extract(event_loop, corpus, app):
     empty = event_loop.run_until_complete(retrieve_nothing())
     assert len(empty) == 0
 
+    # test array items, optionally distinct
+    async def retrieve_keywords(distinct):
+        return sorted([keyword async for keyword in postgres_plugin.storage_extract(
+            app=app, ptr='/properties/keywords/items', distinct=distinct)])
+
+    assert event_loop.run_until_complete(retrieve_keywords(False)) == ['bar', 'baz', 'foo', 'foo']
+    assert event_loop.run_until_complete(retrieve_keywords(True)) == ['bar', 'baz', 'foo']
+
+    async def extract(ptr, distinct=False):
+        return [value async for value in postgres_plugin.storage_extract(
+            app=app, ptr=ptr, distinct=distinct)]
+
+    # pointers that can't be translated to SQL are only invalid in documents
+    # that have a value there
+    assert event_loop.run_until_complete(extract('/properties/nonexisting/invalid')) == []
+    with pytest.raises(ValueError):
+        event_loop.run_until_complete(extract('/properties/keywords/invalid'))
+
+    # distinct values of materialized facets are the values in the documents
+    record = corpus['dutch_dataset1']
+    record['doc']['dcat:keyword'] = ['foo', 42, 'foo']
+    record['etag'] = event_loop.run_until_complete(postgres_plugin.storage_update(
+        app=app, docid='dutch_dataset1', doc=record['doc'],
+        searchable_text=record['searchable_text'], etags={record['etag']},
+        iso_639_1_code=record['iso_639_1_code']))
+    facet = '/properties/dcat:keyword/items'
+    assert facet in postgres_plugin.MATERIALIZED_FACETS
+    assert event_loop.run_until_complete(extract(facet)) == ['foo', 42, 'foo']
+    assert event_loop.run_until_complete(extract(facet, True)) == ['foo']
+
+
+def test_storage_changes(event_loop, corpus, app):
+    async def changes(since, limit=None, since_id=None):
+        return [change async for change in postgres_plugin.storage_changes(
+            app=app, since=since, limit=limit, since_id=since_id)]
+
+    all_changes = event_loop.run_until_complete(changes(0))
+    assert {docid for _seq, docid, _doc, _etag in all_changes} >= set(corpus)
+    since = all_changes[-1][0]
+    assert event_loop.run_until_complete(changes(since)) == []
+
+    record = corpus['dutch_dataset2']
+    new_etag = event_loop.run_until_complete(postgres_plugin.storage_update(
+        app=app, docid='dutch_dataset2', doc={'id': 'dutch_dataset2', 'version': 2},
+        searchable_text=record['searchable_text'], etags={record['etag']},
+        iso_639_1_code='nl'))
+    event_loop.run_until_complete(postgres_plugin.storage_delete(
+        app=app, docid='english_dataset2', etags={corpus.pop('english_dataset2')['etag']}))
+    (seq1, *update), (seq2, *delete) = event_loop.run_until_complete(changes(since))
+    assert since < seq1 < seq2
+    assert update == ['dutch_dataset2', {'id': 'dutch_dataset2', 'version': 2}, new_etag]
+    assert delete == ['english_dataset2', None, None]
+    assert len(event_loop.run_until_complete(changes(since, limit=1))) == 1
+    record['etag'] = new_etag
+
+    # changes made together have the same sequence number
+    etags = event_loop.run_until_complete(postgres_plugin.storage_create_many(app=app, docs=[
+        ('changes_dataset1', {'id': 'changes_dataset1'}, {'A': 'Changes 1'}, 'nl'),
+        ('changes_dataset2', {'id': 'changes_dataset2'}, {'A': 'Changes 2'}, 'nl'),
+    ]))
+    corpus.update({
+        docid: {'etag': etag} for docid, etag in zip(('changes_dataset1', 'changes_dataset2'), etags)
+    })
+    (seq1, docid1, *_), = event_loop.run_until_complete(changes(seq2, limit=1))
+    (seq2, docid2, *_), = event_loop.run_until_complete(changes(seq1, limit=1, since_id=docid1))
+    assert (seq1, docid1) == (seq2, 'changes_dataset1')
+    assert docid2 == 'changes_dataset2'
+    assert event_loop.run_until_complete(changes(seq2, since_id=docid2)) == []
+
+
+def test_storage_changes_concurrent(event_loop, corpus, app):
+    async def changes(since):
+        return [docid async for _seq, docid, _doc, _etag in postgres_plugin.storage_changes(
+            app=app, since=since)]
+
+    async def concurrent_changes():
+        since = [seq async for seq, *_ in postgres_plugin.storage_changes(app=app, since=0)][-1]
+        async with app['pool'].acquire() as con:
+            # a slow transaction changes a dataset...
+            transaction = con.transaction()
+            await transaction.start()
+            await con.execute(
+                "UPDATE dataset SET txid = txid_current() WHERE id = 'dutch_dataset1'")
+            # ...while another changes one later on
+            record = corpus['dutch_dataset2']
+            record['etag'] = await postgres_plugin.storage_update(
+                app=app, docid='dutch_dataset2', doc={'id': 'dutch_dataset2', 'version': 2},
+                searchable_text=record['searchable_text'], etags={record['etag']},
+                iso_639_1_code='nl')
+            # the later change only shows up once the earlier one is committed
+            assert await changes(since) == []
+            await transaction.commit()
+        return await changes(since)
+
+    assert event_loop.run_until_complete(concurrent_changes()) == ['dutch_dataset1', 'dutch_dataset2']
+
 
 def test_search_search(event_loop, corpus, app):
     # search on query
@@ -209,6 +544,7 @@ def test_search_search(event_loop, corpus, app):
             iso_639_1_code='nl')], result_info
 
     results, result_info = event_loop.run_until_complete(search())
+    assert result_info.pop('next') is not None
     assert result_info == {
         '/': 2,
         '/properties/keywords/items': {'foo': 2, 'bar': 1, 'baz': 1}
@@ -217,7 +553,503 @@ def test_search_search(event_loop, corpus, app):
     assert results[0][0] == 'dutch_dataset1'
 
 
+def test_search_search_paging(event_loop, corpus, app):
+    async def search(q, limit, offset):
+        filters = {'/properties/id': {'in': set(corpus.keys())}}
+        result_info = {}
+        return [r async for r in postgres_plugin.search_search(
+            app=app, q=q, sortpath=['@id'], result_info=result_info,
+            limit=limit, offset=offset, filters=filters)], result_info
+
+    # listing
+    pages = [event_loop.run_until_complete(search('', 2, offset))
+             for offset in range(0, len(corpus) + 2, 2)]
+    for results, result_info in pages:
+        result_info.pop('next', None)
+        assert result_info == {'/': len(corpus)}
+    ids = [docid for results, _ in pages for docid, doc in results]
+    assert sorted(ids) == sorted(corpus.keys())
+
+    # free-text search
+    results, result_info = event_loop.run_until_complete(search('dataset', 1, 1))
+    assert len(results) == 1
+    assert result_info == {'/': 4, 'next': result_info['next']}
+    results, result_info = event_loop.run_until_complete(search('dataset', None, 10))
+    assert len(results) == 0
+    assert result_info == {'/': 4}
+
+
+def test_search_search_stemmed(event_loop, corpus, app):
+    async def search(q, iso_639_1_code):
+        filters = {'/properties/id': {'in': set(corpus.keys())}}
+        result_info = {}
+        return {docid async for docid, doc in postgres_plugin.search_search(
+            app=app, q=q, sortpath=['@id'], result_info=result_info,
+            filters=filters, iso_639_1_code=iso_639_1_code)}, result_info['/']
+
+    # "nederlandse" is stemmed to "nederland", which is a prefix of "nederlands"
+    assert event_loop.run_until_complete(search('nederlands', 'nl')) == \
+        ({'dutch_dataset1', 'dutch_dataset2'}, 2)
+    # "datasets" only matches after stemming
+    assert event_loop.run_until_complete(search('datasets', 'en')) == \
+        ({'dutch_dataset1', 'dutch_dataset2', 'english_dataset1', 'english_dataset2'}, 4)
+    assert event_loop.run_until_complete(search('datasets', None)) == (set(), 0)
+
+
+def test_storage_update_partial_searchable_text(event_loop, corpus, app):
+    async def search(q):
+        filters = {'/properties/id': {'in': set(corpus.keys())}}
+        return {docid async for docid, doc in postgres_plugin.search_search(
+            app=app, q=q, sortpath=['@id'], result_info={},
+            filters=filters, iso_639_1_code='nl')}
+
+    # only weight A changes, the text of weight C is kept
+    record = corpus['dutch_dataset1']
+    record['etag'] = event_loop.run_until_complete(postgres_plugin.storage_update(
+        app=app, docid='dutch_dataset1', doc=record['doc'],
+        searchable_text={'A': 'Vernieuwd'}, etags={record['etag']},
+        iso_639_1_code='nl'))
+    assert event_loop.run_until_complete(search('vernieuwd')) == {'dutch_dataset1'}
+    assert event_loop.run_until_complete(search('eerste')) == {'dutch_dataset1'}
+    assert event_loop.run_until_complete(search('nederlands 1')) == set()
+
+
+def test_search_search_max_candidates(event_loop, corpus, app):
+    async def search(limit, max_candidates, cursor=None):
+        filters = {'/properties/id': {'in': set(corpus.keys())}}
+        result_info = {}
+        return [r async for r in postgres_plugin.search_search(
+            app=app, q='dataset', sortpath=['@id'], result_info=result_info,
+            limit=limit, filters=filters, max_candidates=max_candidates,
+            cursor=cursor)], result_info
+
+    # the total stays exact, whether or not all matches were ranked
+    for limit in (1, 3, 4, None):
+        results, result_info = event_loop.run_until_complete(search(limit, 1))
+        assert len(results) == min(limit or 4, 4)
+        assert result_info['/'] == 4
+
+    # pages would rank different candidates, so there's no next page
+    _results, result_info = event_loop.run_until_complete(search(1, 1))
+    assert 'next' not in result_info
+    _results, result_info = event_loop.run_until_complete(search(1, None))
+    with pytest.raises(ValueError):
+        event_loop.run_until_complete(search(1, 1, result_info['next']))
+
+    with pytest.raises(ValueError):
+        event_loop.run_until_complete(search(1, 0))
+
+
+def test_search_search_cursor(event_loop, corpus, app):
+    async def search(q, cursor, limit=2):
+        filters = {'/properties/id': {'in': set(corpus.keys())}}
+        result_info = {}
+        return [r async for r in postgres_plugin.search_search(
+            app=app, q=q, sortpath=['@id'], result_info=result_info,
+            limit=limit, filters=filters, cursor=cursor)], result_info
+
+    for q, expected in (('', set(corpus.keys())),
+                        ('dataset', set(corpus.keys()) - {'unspecified_language_dataset1'})):
+        ids, cursor = [], None
+        while True:
+            results, result_info = event_loop.run_until_complete(search(q, cursor))
+            assert result_info['/'] == len(expected)
+            ids.extend(docid for docid, doc in results)
+            cursor = result_info.get('next')
+            if cursor is None:
+                break
+        assert len(ids) == len(expected)
+        assert set(ids) == expected
+
+        # an empty page has no next page, but still counts the matches
+        results, result_info = event_loop.run_until_complete(search(q, None, limit=0))
+        assert results == []
+        assert 'next' not in result_info
+        assert result_info['/'] == len(expected)
+
+    with pytest.raises(ValueError):
+        event_loop.run_until_complete(search('dataset', 'invalid'))
+
+
+def test_search_search_sort_columns(event_loop, corpus, app):
+    sort_modified = {
+        'dutch_dataset1': '2018-03-01',
+        'dutch_dataset2': '2018-03-01',
+        'english_dataset1': '2019-01-31T12:00:00',
+        'english_dataset2': 'invalid',
+    }
+
+    async def update():
+        for doc_id, value in sort_modified.items():
+            record = corpus[doc_id]
+            record['doc']['ams:sort_modified'] = value
+            record['etag'] = await postgres_plugin.storage_update(
+                app=app, docid=doc_id, doc=record['doc'],
+                searchable_text=record['searchable_text'],
+                etags={record['etag']}, iso_639_1_code=record['iso_639_1_code'])
+
+    async def search(cursor):
+        filters = {'/properties/id': {'in': set(corpus.keys())}}
+        result_info = {}
+        return [docid async for docid, doc in postgres_plugin.search_search(
+            app=app, q='', sortpath=['ams:sort_modified'], result_info=result_info,
+            limit=2, filters=filters, cursor=cursor)], result_info.get('next')
+
+    event_loop.run_until_complete(update())
+    ids, cursor = event_loop.run_until_complete(search(None))
+    while cursor is not None:
+        page, cursor = event_loop.run_until_complete(search(cursor))
+        ids.extend(page)
+    # documents without a valid sort value are sorted last, ties by id
+    assert ids == ['english_dataset1', 'dutch_dataset1', 'dutch_dataset2',
+                   'english_dataset2', 'unspecified_language_dataset1']
+
+
+def test_search_search_filter_columns(event_loop, corpus, app):
+    status = {
+        'dutch_dataset1': 'beschikbaar',
+        'dutch_dataset2': 'in_onderzoek',
+        'english_dataset1': 'niet_beschikbaar',
+        'english_dataset2': True,
+    }
+
+    async def update():
+        for doc_id, value in status.items():
+            record = corpus[doc_id]
+            record['doc']['ams:status'] = value
+            record['etag'] = await postgres_plugin.storage_update(
+                app=app, docid=doc_id, doc=record['doc'],
+                searchable_text=record['searchable_text'],
+                etags={record['etag']}, iso_639_1_code=record['iso_639_1_code'])
+
+    async def search(q, filter):
+        filters = {'/properties/ams:status': filter}
+        result_info = {}
+        return {docid async for docid, doc in postgres_plugin.search_search(
+            app=app, q=q, sortpath=['ams:sort_modified'], result_info=result_info,
+            filters=filters)}
+
+    event_loop.run_until_complete(update())
+    for q in ('', 'dataset'):
+        assert event_loop.run_until_complete(
+            search(q, {'in': ['beschikbaar', 'in_onderzoek']})
+        ) == {'dutch_dataset1', 'dutch_dataset2'}
+        assert event_loop.run_until_complete(
+            search(q, {'eq': 'niet_beschikbaar'})
+        ) == {'english_dataset1'}
+        # non-string values are only found in the document
+        assert event_loop.run_until_complete(
+            search(q, {'eq': True})
+        ) == {'english_dataset2'}
+
+
+def test_search_search_range_filters(event_loop, corpus, app):
+    values = {
+        'dutch_dataset1': ('2018-03-01', [{'dcat:byteSize': 10}, {'dcat:byteSize': 1000}]),
+        'dutch_dataset2': ('2018-06-01', [{'dcat:byteSize': 100}]),
+        'english_dataset1': ('2019-01-31', []),
+        'english_dataset2': ('', [{}]),
+    }
+
+    async def update():
+        for doc_id, (beginning, distributions) in values.items():
+            record = corpus[doc_id]
+            record['doc']['dct:temporal'] = {'time:hasBeginning': beginning}
+            record['doc']['dcat:distribution'] = distributions
+            record['etag'] = await postgres_plugin.storage_update(
+                app=app, docid=doc_id, doc=record['doc'],
+                searchable_text=record['searchable_text'],
+                etags={record['etag']}, iso_639_1_code=record['iso_639_1_code'])
+
+    async def search(ptr, filter):
+        result_info = {}
+        return {docid async for docid, doc in postgres_plugin.search_search(
+            app=app, q='', sortpath=['ams:sort_modified'], result_info=result_info,
+            filters={ptr: filter})}
+
+    event_loop.run_until_complete(update())
+    beginning = '/properties/dct:temporal/properties/time:hasBeginning'
+    assert event_loop.run_until_complete(
+        search(beginning, {'ge': '2018-06-01'})) == {'dutch_dataset2', 'english_dataset1'}
+    assert event_loop.run_until_complete(
+        search(beginning, {'gt': '2018-03-01', 'lt': '2019-01-31'})) == {'dutch_dataset2'}
+    byte_size = '/properties/dcat:distribution/items/properties/dcat:byteSize'
+    assert event_loop.run_until_complete(
+        search(byte_size, {'gt': '100'})) == {'dutch_dataset1'}
+    assert event_loop.run_until_complete(
+        search(byte_size, {'le': '100'})) == {'dutch_dataset1', 'dutch_dataset2'}
+    # documents without a sort value don't match
+    assert event_loop.run_until_complete(
+        search('/properties/ams:sort_modified', {'lt': '2100-01-01'})) == set()
+
+    with pytest.raises(ValueError):
+        event_loop.run_until_complete(search(beginning, {'lt': 'yesterday'}))
+    with pytest.raises(ValueError):
+        event_loop.run_until_complete(search('/properties/id', {'lt': '1'}))
+
+
+def test_search_search_prepared_statements(event_loop, corpus, app):
+    async def search(keyword):
+        filters = {'/properties/keywords/items': {'eq': keyword}}
+        result_info = {}
+        return [docid async for docid, doc in postgres_plugin.search_search(
+            app=app, q='', sortpath=['@id'], result_info=result_info,
+            filters=filters)]
+
+    assert event_loop.run_until_complete(search('foo')) == ['dutch_dataset1', 'dutch_dataset2']
+    # filters with the same shape reuse the prepared statement, and values
+    # aren't spliced into the SQL
+    stats = dict(postgres_plugin.statement_cache_stats)
+    assert event_loop.run_until_complete(search("f'oo")) == []
+    assert postgres_plugin.statement_cache_stats['misses'] == stats['misses']
+    assert postgres_plugin.statement_cache_stats['hits'] > stats['hits']
+
+
+def test_search_search_materialized_facets(event_loop, corpus, app):
+    facet = '/properties/dcat:keyword/items'
+    assert facet in postgres_plugin.MATERIALIZED_FACETS
+
+    async def search():
+        filters = {'/properties/id': {'in': set(corpus.keys())}}
+        result_info = {}
+        async for _ in postgres_plugin.search_search(
+                app=app, q='', sortpath=['@id'], result_info=result_info,
+                facets=[facet], filters=filters):
+            pass
+        return result_info
+
+    async def update(doc_id, keywords):
+        record = corpus[doc_id]
+        record['doc']['dcat:keyword'] = keywords
+        record['etag'] = await postgres_plugin.storage_update(
+            app=app, docid=doc_id, doc=record['doc'],
+            searchable_text=record['searchable_text'],
+            etags={record['etag']}, iso_639_1_code=record['iso_639_1_code'])
+
+    event_loop.run_until_complete(update('dutch_dataset1', ['foo', 'bar', 'foo']))
+    event_loop.run_until_complete(update('english_dataset1', ['foo']))
+    assert event_loop.run_until_complete(search())[facet] == {'foo': 3, 'bar': 1}
+    event_loop.run_until_complete(update('dutch_dataset1', ['baz']))
+    assert event_loop.run_until_complete(search())[facet] == {'foo': 1, 'baz': 1}
+
+
+def test_storage_update_many(event_loop, corpus, app):
+    docids = ['dutch_dataset1', 'english_dataset1', 'nonexistent']
+    retrieved = event_loop.run_until_complete(postgres_plugin.storage_retrieve_many(app=app, docids=docids))
+    assert retrieved == {docid: (corpus[docid]['doc'], corpus[docid]['etag']) for docid in docids[:2]}
+
+    docs = [
+        ('dutch_dataset1', {'id': 'dutch_dataset1', 'dcat:keyword': ['batch']},
+         corpus['dutch_dataset1']['searchable_text'], {corpus['dutch_dataset1']['etag']}, 'nl'),
+        ('english_dataset1', {'id': 'english_dataset1', 'dcat:keyword': ['batch']},
+         corpus['english_dataset1']['searchable_text'], {'oldetag'}, 'en'),
+        ('nonexistent', {'id': 'nonexistent'}, {}, {'oldetag'}, 'nl'),
+    ]
+    etags = event_loop.run_until_complete(postgres_plugin.storage_update_many(app=app, docs=docs))
+    assert etags[1:] == [None, None]
+    corpus['dutch_dataset1']['etag'] = etags[0]
+    retrieved = event_loop.run_until_complete(postgres_plugin.storage_retrieve_many(app=app, docids=docids))
+    assert retrieved['dutch_dataset1'] == (docs[0][1], etags[0])
+    assert retrieved['english_dataset1'] == (corpus['english_dataset1']['doc'], corpus['english_dataset1']['etag'])
+
+    async def facet_counts():
+        facet = '/properties/dcat:keyword/items'
+        result_info = {}
+        async for _ in postgres_plugin.search_search(
+                app=app, q='', sortpath=['@id'], result_info=result_info, facets=[facet]):
+            pass
+        return result_info[facet]
+
+    assert event_loop.run_until_complete(facet_counts()) == {'batch': 1}
+
+
+def test_search_search_closed_early(event_loop, corpus, app):
+    pool = app['pool']
+
+    async def first_result():
+        results = postgres_plugin.search_search(
+            app=app, q='', sortpath=['id'], result_info={})
+        first = await results.__anext__()
+        assert pool.get_idle_size() < pool.get_size()
+        await results.aclose()
+        return first
+
+    assert event_loop.run_until_complete(first_result())[0] in corpus
+    # the connection is released when the caller stops iterating
+    assert pool.get_idle_size() == pool.get_size()
+
+
+def test_search_search_statement_timeout(event_loop, corpus, app, monkeypatch):
+    monkeypatch.setattr(postgres_plugin, '_statement_timeout', 0.2)
+
+    async def search():
+        return [docid async for docid, _doc in postgres_plugin.search_search(
+            app=app, q='', sortpath=['id'], result_info={})]
+
+    async def search_while_locked():
+        # the search has to wait for the lock
+        async with app['pool'].acquire() as con:
+            async with con.transaction():
+                await con.execute('LOCK TABLE "dataset" IN ACCESS EXCLUSIVE MODE')
+                await search()
+
+    with pytest.raises(asyncio.TimeoutError):
+        event_loop.run_until_complete(search_while_locked())
+    assert set(event_loop.run_until_complete(search())) >= set(corpus)
+
+
+def test_notify(event_loop, app):
+    async def notifications():
+        received = asyncio.Queue()
+        async with app['pool'].acquire() as con:
+            await con.add_listener('channel', lambda *args: received.put_nowait(args[3]))
+            await postgres_plugin.notify(app=app, changes=[
+                ('update', 'a', '"1"', '"2"'), ('delete', 'b', '"3"', None)
+            ])
+            result = [json.loads(await asyncio.wait_for(received.get(), 5)) for _ in range(2)]
+            await con.reset()
+        return result
+
+    first, second = event_loop.run_until_complete(notifications())
+    assert second.pop('change_number') == first.pop('change_number') + 1
+    assert first == {'operation': 'update', 'id': 'a', 'old_etag': '"1"', 'new_etag': '"2"'}
+    assert second == {'operation': 'delete', 'id': 'b', 'old_etag': '"3"', 'new_etag': None}
+
+
+def test_etag_index(event_loop, corpus, app, monkeypatch):
+    for name in ('_listen_conn', '_listen_callback', '_etag_index'):
+        monkeypatch.setattr(postgres_plugin, name, None)
+    record = corpus['dutch_dataset1']
+
+    async def no_fetch(*args):
+        raise AssertionError('document fetched')
+
+    async def etag_index():
+        con = await postgres_plugin.listen_notifications(app=app, callback=app.notify_callback)
+        try:
+            with monkeypatch.context() as m:
+                m.setattr(postgres_plugin, '_fetch_current', no_fetch)
+                assert await postgres_plugin.storage_retrieve(
+                    app=app, docid='dutch_dataset1', etags={record['etag']}
+                ) == (None, record['etag'])
+            # other instances notify their changes
+            new_etag = await postgres_plugin.storage_update(
+                app=app, docid='dutch_dataset1', doc={'id': 'dutch_dataset1', 'version': 2},
+                searchable_text=record['searchable_text'], etags={record['etag']},
+                iso_639_1_code='nl')
+            await postgres_plugin.notify(app=app, changes=[
+                ('update', 'dutch_dataset1', record['etag'], new_etag)])
+            for _ in range(50):
+                if postgres_plugin._etag_index.get('dutch_dataset1') == new_etag:
+                    break
+                await asyncio.sleep(0.1)
+            doc, etag = await postgres_plugin.storage_retrieve(
+                app=app, docid='dutch_dataset1', etags={record['etag']})
+            assert doc == {'id': 'dutch_dataset1', 'version': 2} and etag == new_etag
+            record['etag'] = new_etag
+            # the index is reloaded if we may have missed a change
+            for callback in app.subscribers:
+                callback(None)
+            assert postgres_plugin._etag_index.get('dutch_dataset1') is None
+            await asyncio.sleep(0.5)
+            assert postgres_plugin._etag_index.get('dutch_dataset1') == new_etag
+        finally:
+            postgres_plugin._etag_index.close()
+            app.unsubscribe(postgres_plugin._on_change)
+            await con.remove_listener('channel', app.notify_callback)
+            await app['pool'].release(con)
+
+    event_loop.run_until_complete(etag_index())
+
+
+class _StaleReplica:
+    """A replica that hasn't received any documents yet."""
+    def get_size(self):
+        return 0
+
+    def get_idle_size(self):
+        return 0
+
+    async def fetchrow(self, query, *args):
+        return None
+
+
+class _LaggingReplica(_StaleReplica):
+    """A replica that has an older version of every document."""
+    async def fetchrow(self, query, *args):
+        return {'doc': {}, 'etag': '"old"'}
+
+
+def test_replicas(event_loop, corpus):
+    replica_config = copy.deepcopy(config.load())
+    dbconf = replica_config['storage_postgres']
+    dbconf['replicas'] = [{'host': dbconf['host']}, {'host': dbconf['host']}]
+    replica_app = MockApp(loop=event_loop, config=replica_config)
+    try:
+        replicas = replica_app['replica_pools']
+        assert len(replicas) == 2
+        # idle replicas are taken in turn
+        assert {postgres_plugin._read_pool(replica_app) for _ in range(2)} == set(replicas)
+
+        async def search():
+            return [docid async for docid, _doc in postgres_plugin.search_search(
+                app=replica_app, q='', sortpath=['id'], result_info={})]
+
+        assert set(event_loop.run_until_complete(search())) >= set(corpus)
+        record = corpus['dutch_dataset1']
+        assert event_loop.run_until_complete(postgres_plugin.storage_retrieve(
+            app=replica_app, docid='dutch_dataset1')) == (record['doc'], record['etag'])
+        # documents a replica doesn't have yet are read from the primary
+        replica_app['replica_pools'] = [_StaleReplica()]
+        assert event_loop.run_until_complete(postgres_plugin.storage_retrieve(
+            app=replica_app, docid='dutch_dataset1')) == (record['doc'], record['etag'])
+        # documents about to be changed are read from the primary
+        replica_app['replica_pools'] = [_LaggingReplica()]
+        assert event_loop.run_until_complete(postgres_plugin.storage_retrieve(
+            app=replica_app, docid='dutch_dataset1')) == ({}, '"old"')
+        assert event_loop.run_until_complete(postgres_plugin.storage_retrieve(
+            app=replica_app, docid='dutch_dataset1', primary=True)) == (record['doc'], record['etag'])
+        replica_app['replica_pools'] = replicas
+        assert event_loop.run_until_complete(postgres_plugin.health_check(app=replica_app)) is None
+    finally:
+        event_loop.run_until_complete(postgres_plugin.deinitialize(replica_app, False))
+
+
+def test_storage_update(event_loop, corpus, app):
+    record = corpus['dutch_dataset1']
+
+    async def update(docid, doc, etags):
+        return await postgres_plugin.storage_update(
+            app=app, docid=docid, doc=doc, searchable_text=record['searchable_text'],
+            etags=etags, iso_639_1_code='nl')
+
+    async def keyword_facet():
+        facet = '/properties/dcat:keyword/items'
+        result_info = {}
+        async for _ in postgres_plugin.search_search(
+                app=app, q='', sortpath=['@id'], result_info=result_info, facets=[facet]):
+            pass
+        return result_info[facet]
+
+    with pytest.raises(KeyError):
+        event_loop.run_until_complete(update('nonexistent', record['doc'], {record['etag']}))
+    with pytest.raises(ValueError):
+        event_loop.run_until_complete(update('dutch_dataset1', record['doc'], {'oldetag'}))
+
+    # the facet values are replaced by the same statement
+    for keywords, expected in ((['a', 'b'], {'a': 1, 'b': 1}), (['b', 'c', 'c'], {'b': 1, 'c': 2}), ([], {})):
+        doc = dict(record['doc'], **{'dcat:keyword': keywords})
+        record['etag'] = event_loop.run_until_complete(update('dutch_dataset1', doc, {record['etag']}))
+        assert event_loop.run_until_complete(keyword_facet()) == expected
+
+
 def test_storage_delete(event_loop, corpus, app):
+    with pytest.raises(KeyError):
+        event_loop.run_until_complete(
+            postgres_plugin.storage_delete(app=app, docid='nonexistent', etags={'oldetag'}))
+    with pytest.raises(ValueError):
+        event_loop.run_until_complete(
+            postgres_plugin.storage_delete(app=app, docid='dutch_dataset1', etags={'oldetag'}))
     for doc_id, record in corpus.items():
         event_loop.run_until_complete(
             postgres_plugin.storage_delete(
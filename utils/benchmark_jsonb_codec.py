@@ -0,0 +1,63 @@
+"""Compare the throughput of the jsonb codecs of the postgres plugin.
+
+Decodes all documents in the catalog with every available codec, both from
+text already in memory and while fetching them from the database.
+
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import asyncpg
+
+from datacatalog.plugins.postgres import JSONB_CODECS
+
+
+async def _fetch_texts(con):
+    return [row['doc'] for row in await con.fetch('SELECT doc::text AS doc FROM "dataset"')]
+
+
+async def _fetch_docs(con, encoder, decoder):
+    await con.set_type_codec('jsonb', encoder=encoder, decoder=decoder,
+                             schema='pg_catalog')
+    start = time.perf_counter()
+    async with con.transaction():
+        async for _ in con.cursor('SELECT doc FROM "dataset"'):
+            pass
+    return time.perf_counter() - start
+
+
+async def benchmark(rounds):
+    con = await asyncpg.connect(
+        user=os.getenv('DB_USER', 'dcatd'),
+        password=os.getenv('DB_PASS', 'dcatd'),
+        database=os.getenv('DB_DATABASE', 'dcatd'),
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', 5433)
+    )
+    try:
+        texts = await _fetch_texts(con)
+        megabytes = sum(len(t.encode()) for t in texts) / 1e6
+        print(f"{len(texts)} documents, {megabytes:.1f} MB, {rounds} rounds\n")
+        print(f"{'codec':10}{'decode docs/s':>16}{'decode MB/s':>14}{'fetch docs/s':>16}")
+        for name, (encoder, decoder) in sorted(JSONB_CODECS.items()):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                for text in texts:
+                    decoder(text)
+            decoding = (time.perf_counter() - start) / rounds
+            fetching = min([await _fetch_docs(con, encoder, decoder) for _ in range(rounds)])
+            print(f"{name:10}{len(texts) / decoding:16.0f}{megabytes / decoding:14.1f}"
+                  f"{len(texts) / fetching:16.0f}")
+    finally:
+        await con.close()
+
+
+parser = argparse.ArgumentParser(description='Benchmark the jsonb codecs.')
+parser.add_argument('--rounds', type=int, default=5, help='number of times to decode the catalog')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(benchmark(args.rounds))